@@ -10,12 +10,18 @@ Data: 2026-02-09
 
 import streamlit as st
 import pandas as pd
-import io
 import os
-from io import BytesIO
+import hashlib
+from collections import OrderedDict
 from datetime import datetime
-import openpyxl
-import openpyxl.styles
+
+from apurador_core import (
+    processar_dados, resumo_itens_fora_preco, somar_reais, validar_colunas_orcamento, validar_colunas_preco_final
+)
+from apurador_historico import HistoricoApuracoes
+from apurador_instrumentacao import INSTRUMENTACAO_DESATIVADA, Instrumentacao, configurar_log_json
+from apurador_leitura import ler_orcamento, ler_orcamentos_em_paralelo, ler_preco_final, motor_excel
+from apurador_relatorio import converter_df_para_excel
 
 
 # Configuração da página
@@ -71,411 +77,209 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-def validar_colunas_preco_final(df):
-    """Valida se a planilha de preço final tem as colunas necessárias"""
-    # Aceita tanto "EAN" quanto "COD BARRAS"
-    tem_identificador = 'EAN' in df.columns or 'COD BARRAS' in df.columns
-    
-    if not tem_identificador:
-        return False, "A planilha deve conter a coluna 'EAN' ou 'COD BARRAS'"
-    
-    # Padronizar coluna para EAN
-    if 'COD BARRAS' in df.columns and 'EAN' not in df.columns:
-        df.rename(columns={'COD BARRAS': 'EAN'}, inplace=True)
-    
-    return True, "Planilha válida"
+# Limite de memória do cache de planilhas lidas (por sessão)
+LIMITE_CACHE_LEITURAS_BYTES = 512 * 1024 * 1024
 
+# Grupo do Diagnóstico de desempenho de cada etapa principal: a leitura
+# acontece ao enviar os arquivos, o processamento e o Excel em outra execução
+GRUPOS_DESEMPENHO = {
+    'leitura_preco_final': 'Leitura',
+    'leitura_orcamentos': 'Leitura',
+    'processamento': 'Processamento',
+    'exportacao': 'Processamento',
+}
 
-def validar_colunas_orcamento(df):
-    """Valida se a planilha de orçamento tem as colunas necessárias"""
-    colunas_necessarias = ['EAN', 'VALOR SKU PAGO', 'QUANTIDADE']
-    colunas_faltando = [col for col in colunas_necessarias if col not in df.columns]
-    
-    if colunas_faltando:
-        return False, f"Colunas faltando: {', '.join(colunas_faltando)}"
-    
-    return True, "Planilha válida"
+# Log JSON de desempenho, se APURADOR_LOG_DESEMPENHO estiver definida
+configurar_log_json()
 
 
-def limpar_valor_monetario(valor):
+class CacheLeituras:
     """
-    Limpa valores monetários em formato brasileiro ou americano para conversão numérica
-    Exemplos: 
-    - 'R$ 1.234,56' -> 1234.56 (BR: ponto=milhar, vírgula=decimal)
-    - '1234,56' -> 1234.56 (BR: vírgula=decimal)
-    - '1234.56' -> 1234.56 (US: ponto=decimal)
-    - '20,68' -> 20.68 (BR: vírgula=decimal)
-    - '20.68' -> 20.68 (US: ponto=decimal, já está correto)
+    Cache LRU das planilhas já lidas, limitado pelo tamanho em memória.
+    A chave é o SHA-256 do arquivo mais as opções de leitura, então o mesmo
+    arquivo reenviado (ou mantido no uploader entre reruns) não é lido de novo.
     """
-    if pd.isna(valor):
-        return None
-    
-    # Converter para string
-    valor_str = str(valor).strip()
-    
-    # Remover símbolos de moeda e espaços
-    valor_str = valor_str.replace('R$', '').replace('r$', '').replace('$', '').strip()
-    
-    # Detectar formato:
-    # Se tem vírgula E ponto, verificar qual vem por último
-    tem_virgula = ',' in valor_str
-    tem_ponto = '.' in valor_str
-    
-    if tem_virgula and tem_ponto:
-        # Ambos presentes: o último é o separador decimal
-        pos_virgula = valor_str.rfind(',')
-        pos_ponto = valor_str.rfind('.')
-        
-        if pos_virgula > pos_ponto:
-            # Formato BR: 1.234,56 (ponto=milhar, vírgula=decimal)
-            valor_str = valor_str.replace('.', '').replace(',', '.')
-        else:
-            # Formato US: 1,234.56 (vírgula=milhar, ponto=decimal)
-            valor_str = valor_str.replace(',', '')
-    elif tem_virgula:
-        # Só vírgula: formato BR - vírgula é decimal
-        valor_str = valor_str.replace(',', '.')
-    # Se só tem ponto ou nenhum: já está no formato correto (US ou inteiro)
-    
-    # Converter para float
-    try:
-        return float(valor_str)
-    except:
+
+    def __init__(self, limite_bytes=LIMITE_CACHE_LEITURAS_BYTES):
+        self.limite_bytes = limite_bytes
+        self.entradas = OrderedDict()
+        self.tamanhos = {}
+        self.tamanho_total = 0
+        self.acertos = 0
+        self.falhas = 0
+
+    def obter(self, chave):
+        """Retorna a entrada em cache (ou None) e atualiza os contadores"""
+        if chave in self.entradas:
+            self.entradas.move_to_end(chave)
+            self.acertos += 1
+            return self.entradas[chave]
+        self.falhas += 1
         return None
 
+    def guardar(self, chave, valor, tamanho):
+        """Guarda a entrada e descarta as menos usadas recentemente se passar do limite"""
+        if tamanho > self.limite_bytes:
+            return
+        if chave in self.entradas:
+            self.tamanho_total -= self.tamanhos.pop(chave)
+            del self.entradas[chave]
 
+        self.entradas[chave] = valor
+        self.tamanhos[chave] = tamanho
+        self.tamanho_total += tamanho
 
-def processar_dados(df_preco_final, orcamentos_dict):
-    """Processa os dados e calcula investimentos"""
-    # Copiar dataframe de preço final
-    df_resultado = df_preco_final.copy()
-    
-    # Converter EAN para string e remover espaços
-    df_resultado['EAN'] = df_resultado['EAN'].astype(str).str.strip()
-    
-    # Verificar se existe coluna de valor negociado (case-insensitive)
-    coluna_valor_negociado = None
-    colunas_upper = {col.upper(): col for col in df_resultado.columns}
-    
-    for possivel_nome in ['VALOR NEGOCIADO REDE', 'VALOR NEGOCIADO', 'PRECO NEGOCIADO', 'PREÇO NEGOCIADO']:
-        if possivel_nome in colunas_upper:
-            coluna_valor_negociado = colunas_upper[possivel_nome]
-            break
-    
-    if coluna_valor_negociado is None:
-        st.error("❌ Não foi encontrada coluna de valor negociado na planilha de Preço Final")
-        st.info("💡 Colunas aceitas: 'VALOR NEGOCIADO REDE', 'VALOR NEGOCIADO', 'PRECO NEGOCIADO'")
-        return None, None
-    
-    # Converter valor negociado para numérico antes das comparações
-    df_resultado[coluna_valor_negociado] = df_resultado[coluna_valor_negociado].apply(limpar_valor_monetario)
-    
-    # Coletar todos os EANs presentes nos orçamentos
-    eans_orcamentos = set()
-    for df_orc in orcamentos_dict.values():
-        eans_str = df_orc['EAN'].astype(str).str.strip()
-        eans_orcamentos.update(eans_str.tolist())
-    
-    # Filtrar apenas produtos do Preço Final que estão em algum orçamento
-    eans_resultado = df_resultado['EAN'].astype(str).str.strip()
-    df_no_orcamento = df_resultado[eans_resultado.isin(eans_orcamentos)]
-    
-    # Detectar produtos sem preço entre os que estão nos orçamentos
-    sem_preco = df_no_orcamento[
-        df_no_orcamento[coluna_valor_negociado].isna() | (df_no_orcamento[coluna_valor_negociado] == 0)
+        while self.tamanho_total > self.limite_bytes:
+            chave_antiga, _ = self.entradas.popitem(last=False)
+            self.tamanho_total -= self.tamanhos.pop(chave_antiga)
+
+
+def chave_leitura(conteudo, leitor, opcoes_leitura):
+    """Chave do cache de leitura: SHA-256 do arquivo + leitor + opções de leitura"""
+    return (
+        hashlib.sha256(conteudo).hexdigest(),
+        leitor.__name__,
+        tuple(sorted(opcoes_leitura.items()))
+    )
+
+
+def ler_planilha_em_cache(cache, arquivo, leitor, validar, instrumentacao=INSTRUMENTACAO_DESATIVADA, **opcoes_leitura):
+    """
+    Lê a planilha enviada com o leitor informado (ler_preco_final / ler_orcamento)
+    reaproveitando o resultado do cache quando os bytes, o leitor e as opções de
+    leitura são os mesmos. A validação só roda quando a planilha é realmente lida.
+    Retorna (df, valido, mensagem).
+    """
+    conteudo = arquivo.getvalue()
+    opcoes_leitura.setdefault('motor', motor_excel())
+    chave = chave_leitura(conteudo, leitor, opcoes_leitura)
+
+    entrada = cache.obter(chave)
+    if entrada is None:
+        with instrumentacao.etapa(f"leitura_{leitor.__name__.removeprefix('ler_')}", bytes=len(conteudo)) as etapa:
+            df = leitor(conteudo, **opcoes_leitura)
+            etapa.contar('linhas', len(df))
+        with instrumentacao.etapa('validacao', linhas=len(df)):
+            valido, mensagem = validar(df)
+        entrada = (df, valido, mensagem)
+        cache.guardar(chave, entrada, int(df.memory_usage(deep=True).sum()))
+
+    df, valido, mensagem = entrada
+    # Cópia para que alterações feitas no processamento não contaminem o cache
+    return df.copy(), valido, mensagem
+
+
+def ler_orcamentos_em_cache(cache, arquivos, validar, instrumentacao=INSTRUMENTACAO_DESATIVADA, **opcoes_leitura):
+    """
+    Lê os orçamentos enviados: os que já estão no cache são reaproveitados e os
+    demais são lidos em paralelo (ler_orcamentos_em_paralelo) e validados.
+    Retorna uma lista na ordem de upload com (df, valido, mensagem) ou a
+    exceção levantada na leitura daquele arquivo.
+    """
+    opcoes_leitura.setdefault('motor', motor_excel())
+    conteudos = [arquivo.getvalue() for arquivo in arquivos]
+    chaves = [chave_leitura(conteudo, ler_orcamento, opcoes_leitura) for conteudo in conteudos]
+    
+    entradas = [cache.obter(chave) for chave in chaves]
+    pendentes = [i for i, entrada in enumerate(entradas) if entrada is None]
+    if not pendentes:
+        return [(entrada[0].copy(), entrada[1], entrada[2]) for entrada in entradas]
+    
+    with instrumentacao.etapa('leitura_orcamentos', arquivos=len(pendentes), bytes=sum(len(conteudos[i]) for i in pendentes)) as etapa:
+        lidos = ler_orcamentos_em_paralelo([conteudos[i] for i in pendentes], **opcoes_leitura)
+        etapa.contar('linhas', sum(len(df) for df in lidos if not isinstance(df, Exception)))
+    
+    with instrumentacao.etapa('validacao', arquivos=len(pendentes)):
+        for i, df in zip(pendentes, lidos):
+            if isinstance(df, Exception):
+                entradas[i] = df
+                continue
+            valido, mensagem = validar(df)
+            entradas[i] = (df, valido, mensagem)
+            cache.guardar(chaves[i], entradas[i], int(df.memory_usage(deep=True).sum()))
+    
+    # Cópias para que alterações feitas no processamento não contaminem o cache
+    return [
+        entrada if isinstance(entrada, Exception) else (entrada[0].copy(), entrada[1], entrada[2])
+        for entrada in entradas
     ]
-    
-    if not sem_preco.empty:
-        col_produto = next((c for c in df_resultado.columns if 'produto' in c.lower() or 'descri' in c.lower()), None)
-        col_ean = 'EAN' if 'EAN' in df_resultado.columns else None
-        
-        st.error(f"❌ **{len(sem_preco)} produto(s) presentes no orçamento estão sem preço negociado (zero ou vazio)**. Corrija antes de continuar.")
-        
-        with st.expander("📋 Ver lista de produtos sem preço", expanded=True):
-            colunas_exibir = []
-            if col_ean:
-                colunas_exibir.append(col_ean)
-            if col_produto:
-                colunas_exibir.append(col_produto)
-            colunas_exibir.append(coluna_valor_negociado)
-            
-            if colunas_exibir:
-                st.dataframe(sem_preco[colunas_exibir].reset_index(drop=True), use_container_width=True)
-            else:
-                st.dataframe(sem_preco.reset_index(drop=True), use_container_width=True)
-        
-        return None, None
-    
 
-    for nome, df_orc in orcamentos_dict.items():
-        # Converter EAN para string
-        df_orc['EAN'] = df_orc['EAN'].astype(str).str.strip()
-        
-        # Preparar dados do orçamento
-        df_orc_temp = df_orc[['EAN', 'VALOR SKU PAGO', 'QUANTIDADE']].copy()
-        
-        # Debug: mostrar alguns EANs do orçamento
-        st.caption(f"🔍 {nome} - Primeiros EANs: {df_orc_temp['EAN'].head(3).tolist()}")
-        
-        # Debug: mostrar valores originais antes da limpeza
-        st.caption(f"🔍 {nome} - Exemplo VALOR SKU PAGO original: {df_orc_temp['VALOR SKU PAGO'].head(3).tolist()}")
-        
-        # Limpar e converter valores para numérico
-        df_orc_temp['VALOR SKU PAGO'] = df_orc_temp['VALOR SKU PAGO'].apply(limpar_valor_monetario)
-        df_orc_temp['QUANTIDADE'] = pd.to_numeric(df_orc_temp['QUANTIDADE'], errors='coerce')
-        
-        # Debug: mostrar quantos valores válidos temos
-        valores_validos = df_orc_temp['VALOR SKU PAGO'].notna().sum()
-        qtd_validas = df_orc_temp['QUANTIDADE'].notna().sum()
-        st.caption(f"📊 {nome}: {valores_validos} valores SKU válidos, {qtd_validas} quantidades válidas (de {len(df_orc_temp)} linhas)")
-        
-        df_orc_temp = df_orc_temp.rename(columns={
-            'VALOR SKU PAGO': f'{nome}_VALOR_SKU_PAGO',
-            'QUANTIDADE': f'{nome}_QUANTIDADE'
-        })
-        
-        # Merge por EAN (LEFT JOIN)
-        antes_merge = len(df_resultado)
-        df_resultado = df_resultado.merge(
-            df_orc_temp,
-            on='EAN',
-            how='left'
-        )
-        
-        # Debug: verificar quantos matches foram feitos
-        matches = df_resultado[f'{nome}_QUANTIDADE'].notna().sum()
-        st.caption(f"✅ {nome}: {matches} produtos encontrados no Preço Final (de {antes_merge} produtos)")
-        
-        if matches == 0:
-            st.warning(f"⚠️ Nenhum produto de '{nome}' foi encontrado no Preço Final. Verifique se os EANs são iguais!")
-    
-    # Debug: mostrar alguns EANs do Preço Final
-    st.caption(f"🔍 Preço Final - Primeiros EANs: {df_resultado['EAN'].head(3).tolist()}")
-    
-    # Calcular investimentos e valores para cada orçamento
-    for nome in orcamentos_dict.keys():
-        
-        # Calcular Investimento Total e Valor de Pedido
-        df_resultado[f'{nome}_INVESTIMENTO_TOTAL'] = (
-            (df_resultado[f'{nome}_VALOR_SKU_PAGO'] - df_resultado[coluna_valor_negociado]) * 
-            df_resultado[f'{nome}_QUANTIDADE']
-        )
-        
-        df_resultado[f'{nome}_VALOR_PEDIDO_TOTAL'] = (
-            df_resultado[f'{nome}_VALOR_SKU_PAGO'] * df_resultado[f'{nome}_QUANTIDADE']
+
+def assinatura_dataframe(df):
+    """Gera uma impressão digital (SHA-256) do conteúdo e das colunas do DataFrame"""
+    hash_linhas = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    assinatura = hashlib.sha256(hash_linhas.tobytes())
+    assinatura.update(repr(list(df.columns)).encode('utf-8'))
+    return assinatura.hexdigest()
+
+
+def exibir_diagnosticos(diagnosticos):
+    """Exibe na página os diagnósticos gerados pela apuração"""
+    exibir = {
+        'erro': st.error,
+        'aviso': st.warning,
+        'info': st.info,
+    }
+    for diagnostico in diagnosticos:
+        exibir[diagnostico.nivel](diagnostico.texto)
+        if diagnostico.tabela is not None:
+            with st.expander(diagnostico.titulo_tabela, expanded=(diagnostico.nivel == 'erro')):
+                st.dataframe(diagnostico.tabela, use_container_width=True)
+
+
+def exibir_detalhes(resultado):
+    """Exibe os detalhes de conferência da apuração (modo detalhado) em uma única tabela recolhível"""
+    with st.expander(f"🔍 Detalhes do processamento ({len(resultado.detalhes)})", expanded=False):
+        st.dataframe(resultado.tabela_detalhes(), use_container_width=True, hide_index=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def listar_historico(pasta, formato, versao):
+    """
+    Apurações guardadas, em cache enquanto a versão da base não mudar: sem
+    isso, cada rerun (qualquer clique) leria o índice inteiro.
+    """
+    return HistoricoApuracoes(pasta, formato).listar()
+
+
+def exibir_itens_fora_preco(itens):
+    """Exibe, por orçamento, os itens com EAN fora do Preço Final e o valor de pedido que não entrou no TT.Pedido"""
+    st.subheader("🔎 Itens fora do Preço Final")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("EANs fora do Preço Final", itens['EAN'].nunique(), help="EANs dos orçamentos que não estão no Preço Final")
+    with col2:
+        st.metric(
+            "Pedido fora do TT.Pedido",
+            f"R$ {somar_reais(itens['Valor Pedido']):,.2f}",
+            help="VALOR SKU PAGO × QUANTIDADE desses itens, que não entra na apuração"
         )
-    
-    # Criar colunas totalizadoras (soma de todos os orçamentos)
-    colunas_investimento = [f'{nome}_INVESTIMENTO_TOTAL' for nome in orcamentos_dict.keys()]
-    colunas_valor_pedido = [f'{nome}_VALOR_PEDIDO_TOTAL' for nome in orcamentos_dict.keys()]
-    
-    # Somar todas as colunas de investimento (ignorando NaN)
-    df_resultado['INVESTIMENTO_TOTAL_GERAL'] = df_resultado[colunas_investimento].sum(axis=1, skipna=True)
-    
-    # Somar todas as colunas de valor de pedido (ignorando NaN)
-    df_resultado['VALOR_PEDIDO_TOTAL_GERAL'] = df_resultado[colunas_valor_pedido].sum(axis=1, skipna=True)
-    
-    # Coletar estatísticas ANTES de renomear/remover colunas (para exibir no Streamlit)
-    estatisticas = {}
-    for nome in orcamentos_dict.keys():
-        produtos_encontrados = df_resultado[f'{nome}_QUANTIDADE'].notna().sum()
-        total_produtos = len(df_resultado)
-        estatisticas[nome] = {
-            'encontrados': produtos_encontrados,
-            'total': total_produtos
-        }
-    
-    # Remover colunas individuais de investimento e valor de pedido (manter só os totais)
-    colunas_para_remover = colunas_investimento + colunas_valor_pedido
-    df_resultado = df_resultado.drop(columns=colunas_para_remover)
-    
-    # Renomear colunas para nomes mais amigáveis
-    renomeacoes = {}
-    
-    # Renomear colunas dos orçamentos dinamicamente
-    nomes_orcamentos = list(orcamentos_dict.keys())
-    for idx, nome in enumerate(nomes_orcamentos, 1):
-        renomeacoes[f'{nome}_VALOR_SKU_PAGO'] = f'Preço venda loja {idx}'
-        renomeacoes[f'{nome}_QUANTIDADE'] = f'Qtd venda loja {idx}'
-    
-    # Renomear colunas totais
-    renomeacoes['INVESTIMENTO_TOTAL_GERAL'] = 'Verba Total'
-    renomeacoes['VALOR_PEDIDO_TOTAL_GERAL'] = 'TT.Pedido'
-    
-    df_resultado = df_resultado.rename(columns=renomeacoes)
-    
-    # Calcular % Investimento (Verba Total / TT.Pedido * 100)
-    df_resultado['% Investimento'] = (
-        (df_resultado['Verba Total'] / df_resultado['TT.Pedido']) * 100
-    ).round(2)  # Arredondar para 2 casas decimais
-    
-    # Substituir inf e NaN por 0 (quando TT.Pedido = 0)
-    df_resultado['% Investimento'] = df_resultado['% Investimento'].replace([float('inf'), -float('inf')], 0).fillna(0)
-    
-    return df_resultado, estatisticas
-
-
-def converter_df_para_excel(df, nome_rede=""):
-    """Converte DataFrame para Excel em memória com formatação e resumo"""
-    output = io.BytesIO()
-    
-    # Calcular totais para o resumo
-    total_verba = df['Verba Total'].sum()
-    total_pedido = df['TT.Pedido'].sum()
-    percentual_investimento = (total_verba / total_pedido * 100) if total_pedido > 0 else 0
-    
-    # Criar título com nome da rede e data
-    data_atual = datetime.now().strftime('%d/%m/%Y')
-    titulo = f"RESUMO - {nome_rede} - {data_atual}" if nome_rede else f"RESUMO - {data_atual}"
-    
-    # Criar writer com engine openpyxl
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Criar DataFrame vazio para o resumo (linhas 1-4)
-        # Linha 1: Título
-        # Linha 2: Cabeçalhos do resumo
-        # Linha 3: Valores do resumo
-        # Linha 4: Vazia (separador)
-        # Linha 5+: Dados
-        
-        # Escrever dados principais a partir da linha 5 (startrow=4)
-        df.to_excel(writer, index=False, sheet_name='Apuração', startrow=4)
-        
-        # Obter worksheet para aplicar formatação
-        worksheet = writer.sheets['Apuração']
-        
-        # Adicionar título do resumo na linha 1
-        worksheet['A1'] = titulo
-        worksheet['A1'].font = openpyxl.styles.Font(size=11, bold=True)
-        
-        # Adicionar cabeçalhos do resumo na linha 2
-        worksheet['A2'] = 'Verba Total'
-        worksheet['B2'] = 'TT.Pedido'
-        worksheet['C2'] = '% Investimento'
-        
-        # Aplicar negrito nos cabeçalhos
-        for cell in ['A2', 'B2', 'C2']:
-            worksheet[cell].font = openpyxl.styles.Font(bold=True)
-        
-        # Adicionar valores do resumo na linha 3
-        worksheet['A3'] = total_verba
-        worksheet['B3'] = total_pedido
-        worksheet['C3'] = percentual_investimento
-        
-        # Formatar valores do resumo
-        worksheet['A3'].number_format = 'R$ #,##0.00'
-        worksheet['B3'].number_format = 'R$ #,##0.00'
-        worksheet['C3'].number_format = '0.00"%"'
-        
-        # Ajustar largura das colunas
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-        
-        # Aplicar formatação de moeda R$ e percentual nos dados principais
-        # Identificar colunas que precisam de formatação
-        colunas_moeda = ['Valor Negociado REDE', 'Verba Total', 'TT.Pedido']
-        colunas_moeda_dinamicas = [col for col in df.columns if 'Preço venda loja' in col]
-        todas_colunas_moeda = colunas_moeda + colunas_moeda_dinamicas
-        
-        coluna_percentual = '% Investimento'
-        
-        # Obter índices das colunas
-        indices_moeda = []
-        indice_percentual = None
-        
-        for idx, col in enumerate(df.columns, 1):  # Excel columns são 1-indexed
-            if col in todas_colunas_moeda:
-                indices_moeda.append(idx)
-            elif col == coluna_percentual:
-                indice_percentual = idx
-        
-        # Aplicar formatação (começar da linha 6 pois linha 5 é cabeçalho dos dados)
-        for row in range(6, len(df) + 6):
-            # Formatar colunas de moeda
-            for col_idx in indices_moeda:
-                cell = worksheet.cell(row=row, column=col_idx)
-                cell.number_format = 'R$ #,##0.00'
-            
-            # Formatar coluna de percentual
-            if indice_percentual:
-                cell = worksheet.cell(row=row, column=indice_percentual)
-                cell.number_format = '0.00"%"'
-        
-        # Aplicar cores de fundo nas células
-        from openpyxl.styles import PatternFill
-        
-        # Definir as cores
-        cor_cabecalho = PatternFill(start_color='1F3864', end_color='1F3864', fill_type='solid')  # Azul escuro
-        cor_dados_azul = PatternFill(start_color='D9E2F3', end_color='D9E2F3', fill_type='solid')  # Azul claro
-        cor_dados_verde = PatternFill(start_color='C6E0B4', end_color='C6E0B4', fill_type='solid')  # Verde claro
-        cor_orcamentos = PatternFill(start_color='FEF2CB', end_color='FEF2CB', fill_type='solid')  # Bege claro
-        cor_resumo_preto = PatternFill(start_color='000000', end_color='000000', fill_type='solid')  # Preto
-        cor_resumo_amarelo = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')  # Amarelo
-        cor_resumo_verde = PatternFill(start_color='92D050', end_color='92D050', fill_type='solid')  # Verde
-        
-        # Aplicar cores no resumo (A2:C2) - Fundo preto, fonte branca
-        for col in range(1, 4):  # Colunas A, B, C
-            cell = worksheet.cell(row=2, column=col)
-            cell.fill = cor_resumo_preto
-            cell.font = openpyxl.styles.Font(bold=True, color='FFFFFF')
-        
-        # Aplicar cores no resumo linha 3
-        # A3 - Amarelo
-        worksheet['A3'].fill = cor_resumo_amarelo
-        # B3 - Verde
-        worksheet['B3'].fill = cor_resumo_verde
-        # C3 - Amarelo
-        worksheet['C3'].fill = cor_resumo_amarelo
-        
-        # Aplicar cor no cabeçalho (A5:E5)
-        for col in range(1, 6):  # Colunas A até E (1 até 5)
-            cell = worksheet.cell(row=5, column=col)
-            cell.fill = cor_cabecalho
-            # Aplicar texto branco no cabeçalho para contraste
-            cell.font = openpyxl.styles.Font(bold=True, color='FFFFFF')
-        
-        # Aplicar cor azul claro nos dados (A6:E179)
-        for row in range(6, 222):  # Linhas 6 até 179
-            for col in range(1, 7):  # Colunas A até E
-                cell = worksheet.cell(row=row, column=col)
-                cell.fill = cor_dados_azul
-        
-        # Aplicar cor verde claro na coluna F (F5:F179)
-        for row in range(5, 222):  # Linhas 5 até 179
-            cell = worksheet.cell(row=row, column=7)  # Coluna F
-            cell.fill = cor_dados_verde
-            if row == 5:  # Aplicar negrito e branco no cabeçalho
-                cell.font = openpyxl.styles.Font(bold=True, color='FFFFFF')
-                cell.fill = cor_cabecalho
-        
-        # Identificar e aplicar cor nas colunas de orçamentos (qtd e preço venda)
-        # Buscar por colunas que contêm "Preço venda loja" ou "Qtd venda loja"
-        colunas_orcamento = []
-        for idx, col_name in enumerate(df.columns, 1):
-            col_lower = str(col_name).lower()
-            # Verificar se é coluna de orçamento (preço venda ou qtd venda)
-            if 'preço venda loja' in col_lower or 'qtd venda loja' in col_lower:
-                colunas_orcamento.append(idx)
-        
-        # Aplicar cor bege claro nas colunas de orçamentos
-        for col_idx in colunas_orcamento:
-            for row in range(6, 222):  # Linhas 5 até 179
-                cell = worksheet.cell(row=row, column=col_idx)
-                cell.fill = cor_orcamentos
-                if row == 5:  # Manter negrito e branco no cabeçalho
-                    cell.font = openpyxl.styles.Font(bold=True, color='FFFFFF')
-                    cell.fill = cor_cabecalho
-    
-    output.seek(0)
-    return output.getvalue()
+    st.dataframe(resumo_itens_fora_preco(itens), use_container_width=True, hide_index=True)
+    with st.expander("📋 Ver itens por orçamento"):
+        st.dataframe(itens, use_container_width=True, hide_index=True)
+
+
+def guardar_desempenho(instrumentacao):
+    """Guarda na sessão a execução medida como a mais recente de cada grupo em que teve etapas"""
+    desempenho = st.session_state.setdefault('desempenho', {})
+    for registro in instrumentacao.registros:
+        grupo = GRUPOS_DESEMPENHO.get(registro['etapa'])
+        if grupo and registro['nivel'] == 0:
+            desempenho[grupo] = instrumentacao
+
+
+def exibir_desempenho(desempenho):
+    """Exibe as tabelas de etapas medidas (tempo, linhas, memória) em um expander"""
+    with st.expander("⏱️ Diagnóstico de desempenho", expanded=False):
+        for grupo, instrumentacao in desempenho.items():
+            principais = [r for r in instrumentacao.registros if r['nivel'] == 0 and r.get('duracao_ms') is not None]
+            picos = [r['pico_rss_mb'] for r in principais if r.get('pico_rss_mb') is not None]
+            st.markdown(f"**{grupo}**")
+            st.caption(
+                f"Execução {instrumentacao.id_execucao}: {sum(r['duracao_ms'] for r in principais) / 1000:.2f}s "
+                f"em {len(principais)} etapa(s)" + (f" | pico de memória {max(picos):,.0f} MB" if picos else "")
+            )
+            st.dataframe(instrumentacao.tabela(), use_container_width=True, hide_index=True)
 
 
 def main():
@@ -561,7 +365,7 @@ def main():
         - VALOR SKU PAGO
         - QUANTIDADE
         
-        ⚠️ **Importante**: Especifique em qual linha estão os cabeçalhos (padrão: linha 10)
+        ⚠️ **Importante**: A linha dos cabeçalhos é localizada automaticamente (padrão: linha 10)
         
         3️⃣ **Processar**  
         Clique no botão para calcular
@@ -593,6 +397,64 @@ def main():
         st.session_state.orcamentos_dict = {}
     if 'df_resultado' not in st.session_state:
         st.session_state.df_resultado = None
+    if 'itens_fora_preco' not in st.session_state:
+        st.session_state.itens_fora_preco = None
+        st.session_state.assinatura_fora_preco = None
+    if 'cache_leituras' not in st.session_state:
+        st.session_state.cache_leituras = CacheLeituras()
+    if 'cache_orcamentos' not in st.session_state:
+        st.session_state.cache_orcamentos = {}
+    
+    historico = HistoricoApuracoes()
+    
+    # Medição de desempenho e modo detalhado (opcionais)
+    with st.sidebar:
+        medir_desempenho = st.checkbox(
+            "⏱️ Medir desempenho",
+            help="Mede tempo, linhas e memória de cada etapa e mostra no Diagnóstico de desempenho"
+        )
+        modo_detalhado = st.checkbox(
+            "🔍 Modo detalhado",
+            help="Guarda detalhes de conferência do processamento (primeiros EANs, valores válidos, memória) "
+                 "e mostra em uma tabela"
+        )
+        guardar_historico = st.checkbox(
+            "💾 Guardar no histórico",
+            help="Guarda a apuração processada no histórico do servidor, que é compartilhado: "
+                 "qualquer usuário deste endereço pode listá-la e reabri-la"
+        )
+    instrumentacao = (
+        Instrumentacao(rede=st.session_state.get('nome_rede')) if medir_desempenho else INSTRUMENTACAO_DESATIVADA
+    )
+    
+    # Histórico: reabrir uma apuração anterior sem reenviar as planilhas
+    with st.sidebar:
+        st.divider()
+        st.header("🗂️ Histórico")
+        apuracoes = listar_historico(historico.pasta, historico.formato, historico.versao())
+        if apuracoes.empty:
+            st.caption("Nenhuma apuração guardada ainda")
+        else:
+            rotulos = {
+                linha.id_apuracao: (
+                    f"{linha.rede} - {datetime.strptime(linha.data, '%Y-%m-%d').strftime('%d/%m/%Y')} - "
+                    f"{linha.lojas} loja(s) - {linha.percentual:.2f}%"
+                )
+                for linha in apuracoes.itertuples()
+            }
+            id_escolhido = st.selectbox(
+                "Apurações anteriores",
+                options=list(rotulos),
+                format_func=rotulos.get
+            )
+            if st.button("📂 Reabrir apuração", use_container_width=True):
+                df_historico, info = historico.carregar(id_escolhido)
+                st.session_state.df_resultado = df_historico
+                st.session_state.assinatura_resultado = assinatura_dataframe(df_historico)
+                st.session_state.itens_fora_preco = None
+                st.session_state.assinatura_fora_preco = None
+                st.session_state.nome_rede = info['rede']
+                st.success(f"✅ Apuração de {info['rede']} reaberta")
     
     # Container para upload de Preço Final
     st.subheader("1️⃣ Planilha de Preço Final")
@@ -616,9 +478,13 @@ def main():
     
     if arquivo_preco:
         try:
-            df_preco = pd.read_excel(arquivo_preco)
-            
-            valido, mensagem = validar_colunas_preco_final(df_preco)
+            df_preco, valido, mensagem = ler_planilha_em_cache(
+                st.session_state.cache_leituras,
+                arquivo_preco,
+                ler_preco_final,
+                validar_colunas_preco_final,
+                instrumentacao=instrumentacao
+            )
             
             if valido:
                 st.session_state.df_preco_final = df_preco
@@ -642,7 +508,7 @@ def main():
     # Container para upload de Orçamentos
     st.subheader("2️⃣ Planilhas de Orçamento")
     
-    st.info("💡 As planilhas de orçamento devem ter os cabeçalhos na **linha 10** e conter as colunas: EAN, VALOR SKU PAGO, QUANTIDADE")
+    st.info("💡 As planilhas de orçamento devem conter as colunas: EAN, VALOR SKU PAGO, QUANTIDADE. A linha dos cabeçalhos é localizada automaticamente (padrão: **linha 10**)")
     
     arquivos_orcamento = st.file_uploader(
         "Selecione uma ou mais planilhas de orçamento",
@@ -654,30 +520,36 @@ def main():
     if arquivos_orcamento:
         st.session_state.orcamentos_dict = {}
         
-        for arquivo in arquivos_orcamento:
-            try:
-                # Ler Excel com cabeçalho na linha 10 (header=9 porque é 0-indexed)
-                df_temp = pd.read_excel(arquivo, header=9)
-                
-                valido, mensagem = validar_colunas_orcamento(df_temp)
+        # Ler Excel localizando a linha do cabeçalho, só com as colunas usadas
+        # (arquivos novos são lidos em paralelo; resultado na ordem de upload)
+        leituras = ler_orcamentos_em_cache(
+            st.session_state.cache_leituras,
+            arquivos_orcamento,
+            validar_colunas_orcamento,
+            instrumentacao=instrumentacao
+        )
+        
+        for arquivo, leitura in zip(arquivos_orcamento, leituras):
+            if isinstance(leitura, Exception):
+                st.error(f"❌ Erro ao ler {arquivo.name}: {str(leitura)}")
+                continue
+            
+            df_temp, valido, mensagem = leitura
+            
+            if valido:
+                nome_orcamento = arquivo.name.replace('.xlsx', '').replace('.xls', '')
+                st.session_state.orcamentos_dict[nome_orcamento] = df_temp
                 
-                if valido:
-                    nome_orcamento = arquivo.name.replace('.xlsx', '').replace('.xls', '')
-                    st.session_state.orcamentos_dict[nome_orcamento] = df_temp
-                    
-                    col1, col2, col3 = st.columns([2, 1, 1])
-                    with col1:
-                        st.success(f"✅ {arquivo.name}")
-                    with col2:
-                        st.metric("📦 Produtos", len(df_temp))
-                    with col3:
-                        with st.expander("👁️ Ver"):
-                            st.dataframe(df_temp.head(5), use_container_width=True)
-                else:
-                    st.error(f"❌ {arquivo.name}: {mensagem}")
-                    
-            except Exception as e:
-                st.error(f"❌ Erro ao ler {arquivo.name}: {str(e)}")
+                col1, col2, col3 = st.columns([2, 1, 1])
+                with col1:
+                    st.success(f"✅ {arquivo.name} (cabeçalho na linha {df_temp.attrs.get('linha_cabecalho', 10)})")
+                with col2:
+                    st.metric("📦 Produtos", len(df_temp))
+                with col3:
+                    with st.expander("👁️ Ver"):
+                        st.dataframe(df_temp.head(5), use_container_width=True)
+            else:
+                st.error(f"❌ {arquivo.name}: {mensagem}")
     
     st.divider()
     
@@ -696,21 +568,47 @@ def main():
     
     if processar_btn:
         with st.spinner("⏳ Processando dados..."):
-            resultado = processar_dados(
-                st.session_state.df_preco_final,
-                st.session_state.orcamentos_dict
-            )
+            with instrumentacao.etapa(
+                'processamento',
+                linhas=len(st.session_state.df_preco_final),
+                lojas=len(st.session_state.orcamentos_dict)
+            ):
+                resultado = processar_dados(
+                    st.session_state.df_preco_final,
+                    st.session_state.orcamentos_dict,
+                    cache_orcamentos=st.session_state.cache_orcamentos,
+                    instrumentacao=instrumentacao,
+                    detalhado=modo_detalhado
+                )
             
-            if resultado is None or resultado[0] is None:
-                pass  # erros já exibidos dentro da função
-            else:
-                df_resultado, estatisticas = resultado
+            exibir_diagnosticos(resultado.diagnosticos)
+            if resultado.detalhes:
+                exibir_detalhes(resultado)
             
-            if resultado is not None and resultado[0] is not None:
+            if resultado.sucesso:
+                df_resultado = resultado.df_resultado
+                estatisticas = resultado.estatisticas
                 st.session_state.df_resultado = df_resultado
+                st.session_state.assinatura_resultado = assinatura_dataframe(df_resultado)
+                st.session_state.itens_fora_preco = resultado.itens_fora_preco
+                st.session_state.assinatura_fora_preco = assinatura_dataframe(resultado.itens_fora_preco)
                 
                 st.success("✅ Processamento concluído com sucesso!")
                 
+                # Guardar no histórico (só se pedido) para análises e para reabrir depois
+                if guardar_historico:
+                    try:
+                        with instrumentacao.etapa('historico', linhas=len(df_resultado)):
+                            historico.salvar(
+                                df_resultado,
+                                st.session_state.get('nome_rede', '[REDE]'),
+                                datetime.now().date(),
+                                list(st.session_state.orcamentos_dict)
+                            )
+                        listar_historico.clear()
+                    except Exception as e:
+                        st.warning(f"⚠️ Não foi possível guardar a apuração no histórico: {str(e)}")
+                
                 # Estatísticas
                 st.subheader("📈 Resumo do Processamento")
                 
@@ -730,6 +628,9 @@ def main():
                             f"{stats['encontrados']}/{stats['total']}",
                             help=f"Produtos encontrados neste orçamento"
                         )
+                
+                if not resultado.itens_fora_preco.empty:
+                    exibir_itens_fora_preco(resultado.itens_fora_preco)
     
     # Seção de download e visualização
     if st.session_state.df_resultado is not None:
@@ -740,29 +641,73 @@ def main():
         with st.expander("👁️ Visualizar Resultado Completo", expanded=False):
             st.dataframe(st.session_state.df_resultado, use_container_width=True)
         
-        # Download
+        # Download - o Excel só é gerado quando pedido e fica em cache enquanto
+        # resultado, rede e data do relatório forem os mesmos
         nome_arquivo = f"Apuracao_Investimentos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        excel_data = converter_df_para_excel(
-            st.session_state.df_resultado,
-            st.session_state.get('nome_rede', '')
+        nome_rede = st.session_state.get('nome_rede', '')
+        data_relatorio = datetime.now().date()
+        itens_fora_preco = st.session_state.itens_fora_preco
+        chave_excel = (
+            st.session_state.get('assinatura_resultado'),
+            st.session_state.get('assinatura_fora_preco'),
+            nome_rede,
+            data_relatorio
         )
         
+        excel_cache = st.session_state.get('excel_cache')
+        excel_data = excel_cache['dados'] if excel_cache and excel_cache['chave'] == chave_excel else None
+        
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
-            st.download_button(
-                label="📥 Download Resultado (Excel)",
-                data=excel_data,
-                file_name=nome_arquivo,
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                type="primary",
-                use_container_width=True
-            )
+            if excel_data is None:
+                gerar_btn = st.button(
+                    "📄 Gerar arquivo Excel",
+                    use_container_width=True,
+                    help="Monta o relatório formatado para download"
+                )
+                if gerar_btn:
+                    with st.spinner("⏳ Gerando arquivo Excel..."), \
+                            instrumentacao.etapa('exportacao', linhas=len(st.session_state.df_resultado)):
+                        excel_data = converter_df_para_excel(
+                            st.session_state.df_resultado,
+                            nome_rede,
+                            data_relatorio,
+                            instrumentacao=instrumentacao,
+                            itens_fora_preco=itens_fora_preco
+                        )
+                    st.session_state.excel_cache = {'chave': chave_excel, 'dados': excel_data}
+            
+            if excel_data is not None:
+                st.download_button(
+                    label="📥 Download Resultado (Excel)",
+                    data=excel_data,
+                    file_name=nome_arquivo,
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    type="primary",
+                    use_container_width=True
+                )
         
         st.info("💡 O arquivo Excel contém todos os dados do Preço Final mais as colunas:\n" +
                 "• Preço venda loja 1, 2, etc.\n" +
                 "• Qtd venda loja 1, 2, etc.\n" +
                 "• Verba Total (investimento total)\n" +
-                "• TT.Pedido (valor total de pedidos)")
+                "• TT.Pedido (valor total de pedidos)\n" +
+                "E, se houver, a aba 'Fora do Preço Final' com os itens de orçamento cujo EAN não está no Preço Final")
+    
+    # Diagnóstico de desempenho: última leitura e último processamento medidos
+    if medir_desempenho:
+        guardar_desempenho(instrumentacao)
+        if st.session_state.desempenho:
+            exibir_desempenho(st.session_state.desempenho)
+    
+    # Estatísticas do cache de leitura
+    cache = st.session_state.cache_leituras
+    with st.sidebar:
+        st.divider()
+        st.caption(
+            f"🗂️ Cache de leitura: {cache.acertos} acertos / {cache.falhas} falhas | "
+            f"{len(cache.entradas)} planilhas ({cache.tamanho_total / (1024 * 1024):.1f} MB)"
+        )
     
     # Rodapé
     st.divider()
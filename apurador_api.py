@@ -0,0 +1,435 @@
+"""
+Apurador de Investimentos - API HTTP
+
+Serviço HTTP (ASGI, Starlette) para integrações enviarem o Preço Final e os
+orçamentos Reppos e receberem o relatório Excel, sem a interface web. O
+cálculo (processar_dados e converter_df_para_excel) roda em um pool de
+processos limitado; os pedidos entram em uma fila assíncrona de tamanho
+fixo e, com a fila cheia, o envio é recusado (503 com Retry-After) em vez
+de acumular trabalho na memória.
+
+Rotas:
+    POST /apuracoes              envia (multipart: preco_final, orcamentos[], rede, data) -> 202 + id
+    GET  /apuracoes/{id}         situação, tempos por etapa, totais e avisos
+    GET  /apuracoes/{id}/excel   relatório Excel (quando concluída)
+    GET  /saude                  ocupação da fila e do pool
+
+Uso:
+    python apurador_api.py [--host 127.0.0.1] [--porta 8000] [--processos N] [--fila N]
+    (ou: uvicorn apurador_api:app)
+
+Dependências opcionais (requirements-api.txt): starlette e python-multipart,
+e uvicorn para servir.
+Em testes, criar_app() pode ser usada com starlette.testclient.TestClient
+(que requer httpx), dentro de `with` para iniciar a fila e o pool.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+from urllib.parse import quote
+
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from apurador_core import processar_dados, somar_reais, validar_colunas_orcamento, validar_colunas_preco_final
+from apurador_instrumentacao import Instrumentacao
+from apurador_leitura import ler_orcamento, ler_preco_final
+from apurador_relatorio import converter_df_para_excel
+
+
+# Processos do pool de cálculo e apurações que podem esperar na fila
+MAX_PROCESSOS = 4
+TAMANHO_FILA = 8
+
+# Apurações concluídas ficam disponíveis para download por este tempo (segundos)
+RETENCAO_S = 60 * 60
+
+# Intervalo máximo (segundos) entre as limpezas das apurações vencidas
+INTERVALO_LIMPEZA_S = 60
+
+# Sugestão de espera (segundos) devolvida quando a fila está cheia
+ESPERA_FILA_CHEIA_S = 5
+
+# Maior campo de formulário que não é arquivo (rede, data)
+MAX_BYTES_CAMPO = 64 * 1024
+
+TIPO_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+ETAPAS = ['leitura_preco_final', 'leitura_orcamentos', 'processamento', 'exportacao']
+
+
+class FilaCheia(Exception):
+    """A fila de apurações está no limite: o envio deve ser repetido mais tarde"""
+
+
+def executar_apuracao(preco_final, orcamentos, nome_rede, data_relatorio):
+    """
+    Apura a partir dos bytes das planilhas: lê, valida, calcula e gera o Excel.
+    Roda em um processo do pool; erros voltam em 'erro' em vez de levantar.
+    orcamentos: lista de (nome, bytes) na ordem das lojas.
+    Retorna dict com erro, avisos, excel (bytes), resumo (totais) e etapas medidas.
+    """
+    instrumentacao = Instrumentacao(emitir_log=False, rede=nome_rede)
+    saida = {'erro': None, 'avisos': [], 'excel': None, 'resumo': None}
+
+    try:
+        with instrumentacao.etapa('leitura_preco_final', bytes=len(preco_final)) as etapa:
+            df_preco = ler_preco_final(preco_final)
+            etapa.contar('linhas', len(df_preco))
+            valido, mensagem = validar_colunas_preco_final(df_preco)
+        if not valido:
+            raise ValueError(f"Preço Final: {mensagem}")
+
+        dfs_orcamento = {}
+        with instrumentacao.etapa('leitura_orcamentos', arquivos=len(orcamentos)) as etapa:
+            for nome, conteudo in orcamentos:
+                df_orc = ler_orcamento(conteudo)
+                etapa.contar('linhas', len(df_orc))
+                valido, mensagem = validar_colunas_orcamento(df_orc)
+                if not valido:
+                    raise ValueError(f"{nome}: {mensagem}")
+                dfs_orcamento[nome] = df_orc
+
+        with instrumentacao.etapa('processamento', linhas=len(df_preco), lojas=len(dfs_orcamento)):
+            resultado = processar_dados(df_preco, dfs_orcamento, instrumentacao=instrumentacao)
+        saida['avisos'] = [d.texto for d in resultado.diagnosticos if d.nivel == 'aviso']
+        if not resultado.sucesso:
+            erros = [d.texto for d in resultado.diagnosticos if d.nivel == 'erro']
+            raise ValueError(' | '.join(erros) or "apuração não concluída")
+
+        df_resultado = resultado.df_resultado
+        with instrumentacao.etapa('exportacao', linhas=len(df_resultado)):
+            saida['excel'] = converter_df_para_excel(
+                df_resultado, nome_rede, data_relatorio, instrumentacao=instrumentacao,
+                itens_fora_preco=resultado.itens_fora_preco
+            )
+
+        total_verba = somar_reais(df_resultado['Verba Total'])
+        total_pedido = somar_reais(df_resultado['TT.Pedido'])
+        saida['resumo'] = {
+            'produtos': len(df_resultado),
+            'lojas': len(dfs_orcamento),
+            'Verba Total': total_verba,
+            'TT.Pedido': total_pedido,
+            '% Investimento': round(total_verba / total_pedido * 100, 2) if total_pedido > 0 else 0,
+            'EANs fora do Preço Final': len(resultado.eans_fora_preco),
+            'Pedido fora do Preço Final': somar_reais(resultado.itens_fora_preco['Valor Pedido']),
+        }
+    except Exception as e:
+        saida['erro'] = str(e)
+
+    saida['etapas'] = instrumentacao.registros
+    return saida
+
+
+@dataclass
+class Trabalho:
+    """Apuração enviada à API e sua situação: na_fila, processando, concluida ou erro"""
+    id: str
+    rede: str
+    data_relatorio: datetime
+    lojas: int
+    estado: str = 'na_fila'
+    criado_em: float = field(default_factory=time.time)
+    iniciado_em: Optional[float] = None
+    concluido_em: Optional[float] = None
+    erro: Optional[str] = None
+    avisos: list = field(default_factory=list)
+    resumo: Optional[dict] = None
+    etapas: list = field(default_factory=list)
+    excel: Optional[bytes] = None
+
+    @property
+    def finalizado(self):
+        return self.estado in ('concluida', 'erro')
+
+    def tempos(self):
+        """Espera na fila, duração de cada etapa principal e total (segundos)"""
+        agora = time.time()
+        tempos = {'fila_s': round((self.iniciado_em or agora) - self.criado_em, 3)}
+        for registro in self.etapas:
+            if registro['nivel'] == 0 and registro['etapa'] in ETAPAS:
+                tempos[f"{registro['etapa']}_s"] = round(registro['duracao_ms'] / 1000, 3)
+        tempos['total_s'] = round((self.concluido_em or agora) - self.criado_em, 3)
+        return tempos
+
+    def como_dict(self):
+        """Situação da apuração para a resposta JSON (sem o Excel)"""
+        return {
+            'id': self.id,
+            'estado': self.estado,
+            'rede': self.rede,
+            'data': self.data_relatorio.strftime('%Y-%m-%d'),
+            'lojas': self.lojas,
+            'tempos': self.tempos(),
+            'resumo': self.resumo,
+            'avisos': self.avisos,
+            'erro': self.erro,
+            'excel': f'/apuracoes/{self.id}/excel' if self.estado == 'concluida' else None,
+        }
+
+
+class FilaApuracoes:
+    """
+    Fila assíncrona limitada de apurações e pool de processos que as executa.
+    Há um consumidor por processo: cada um tira uma apuração da fila e espera
+    o pool terminá-la, então no máximo `processos` apurações rodam ao mesmo
+    tempo e no máximo `tamanho_fila` esperam.
+    """
+
+    def __init__(self, processos=None, tamanho_fila=TAMANHO_FILA, retencao_s=RETENCAO_S):
+        self.processos = processos or min(os.cpu_count() or 1, MAX_PROCESSOS)
+        self.tamanho_fila = tamanho_fila
+        self.retencao_s = retencao_s
+        self.trabalhos = {}
+        self.fila = None
+        self.pool = None
+        self.consumidores = []
+        self.limpeza = None
+
+    def _criar_pool(self):
+        # spawn: como na leitura em paralelo, evita fork de um servidor com várias threads
+        return ProcessPoolExecutor(max_workers=self.processos, mp_context=multiprocessing.get_context('spawn'))
+
+    async def iniciar(self):
+        """Cria a fila, o pool e os consumidores (no início do servidor)"""
+        self.fila = asyncio.Queue(maxsize=self.tamanho_fila)
+        self.pool = self._criar_pool()
+        self.consumidores = [asyncio.create_task(self._consumir()) for _ in range(self.processos)]
+        self.limpeza = asyncio.create_task(self._limpar_periodicamente())
+
+    async def encerrar(self):
+        """Para os consumidores e a limpeza e encerra o pool (no fim do servidor)"""
+        tarefas = self.consumidores + ([self.limpeza] if self.limpeza is not None else [])
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        self.consumidores = []
+        self.limpeza = None
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def verificar_vaga(self):
+        """FilaCheia se a fila estiver cheia; permite recusar o pedido antes de receber os arquivos"""
+        if self.fila.full():
+            raise FilaCheia(f"fila cheia ({self.tamanho_fila} apurações aguardando)")
+
+    def enviar(self, preco_final, orcamentos, nome_rede, data_relatorio):
+        """Coloca a apuração na fila e devolve o Trabalho; FilaCheia se não houver vaga"""
+        self._descartar_antigos()
+        self.verificar_vaga()
+        trabalho = Trabalho(uuid.uuid4().hex, nome_rede, data_relatorio, len(orcamentos))
+        self.fila.put_nowait((trabalho, (preco_final, orcamentos, nome_rede, data_relatorio)))
+        self.trabalhos[trabalho.id] = trabalho
+        return trabalho
+
+    def obter(self, id_trabalho):
+        """Trabalho pelo id (ou None, também se já passou da retenção)"""
+        self._descartar_antigos()
+        return self.trabalhos.get(id_trabalho)
+
+    def situacao(self):
+        """Ocupação da fila e do pool"""
+        self._descartar_antigos()
+        estados = [trabalho.estado for trabalho in self.trabalhos.values()]
+        return {
+            'processos': self.processos,
+            'na_fila': self.fila.qsize() if self.fila is not None else 0,
+            'capacidade_fila': self.tamanho_fila,
+            'processando': estados.count('processando'),
+            'concluidas': estados.count('concluida'),
+            'com_erro': estados.count('erro'),
+        }
+
+    def _descartar_antigos(self):
+        """Remove as apurações finalizadas há mais de retencao_s (e o Excel delas)"""
+        limite = time.time() - self.retencao_s
+        for id_trabalho in [
+            id_trabalho for id_trabalho, trabalho in self.trabalhos.items()
+            if trabalho.finalizado and trabalho.concluido_em < limite
+        ]:
+            del self.trabalhos[id_trabalho]
+
+    async def _limpar_periodicamente(self):
+        # Sem envios nem consultas, o Excel das apurações antigas ainda sai da memória
+        while True:
+            await asyncio.sleep(min(max(self.retencao_s, 1), INTERVALO_LIMPEZA_S))
+            self._descartar_antigos()
+
+    async def _consumir(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            trabalho, argumentos = await self.fila.get()
+            trabalho.estado = 'processando'
+            trabalho.iniciado_em = time.time()
+            pool = self.pool
+            try:
+                saida = await loop.run_in_executor(pool, executar_apuracao, *argumentos)
+            except BrokenProcessPool:
+                # Um processo morreu (ex.: falta de memória): o pool é recriado para as próximas,
+                # só se outro consumidor ainda não o trocou
+                if self.pool is pool:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self.pool = self._criar_pool()
+                saida = {'erro': "o processo de cálculo foi interrompido", 'etapas': []}
+            except Exception as e:
+                saida = {'erro': str(e), 'etapas': []}
+            finally:
+                del argumentos
+                self.fila.task_done()
+
+            trabalho.erro = saida['erro']
+            trabalho.avisos = saida.get('avisos', [])
+            trabalho.resumo = saida.get('resumo')
+            trabalho.etapas = saida['etapas']
+            trabalho.excel = saida.get('excel')
+            trabalho.estado = 'erro' if trabalho.erro else 'concluida'
+            trabalho.concluido_em = time.time()
+
+
+def _erro(mensagem, status_code, headers=None):
+    return JSONResponse({'erro': mensagem}, status_code=status_code, headers=headers)
+
+
+def _fila_cheia(erro):
+    return _erro(str(erro), 503, headers={'Retry-After': str(ESPERA_FILA_CHEIA_S)})
+
+
+def _nomes_unicos(nomes):
+    """Nome de cada orçamento sem extensão; repetidos ganham sufixo (2), (3)..."""
+    vistos = {}
+    unicos = []
+    for nome in nomes:
+        base = os.path.splitext(os.path.basename(nome or 'orcamento'))[0]
+        vistos[base] = vistos.get(base, 0) + 1
+        unicos.append(base if vistos[base] == 1 else f"{base} ({vistos[base]})")
+    return unicos
+
+
+async def enviar_apuracao(request):
+    """POST /apuracoes: recebe as planilhas e coloca a apuração na fila"""
+    fila = request.app.state.fila
+    # Fila cheia: recusa antes de ler o upload (a checagem se repete ao enfileirar)
+    try:
+        fila.verificar_vaga()
+    except FilaCheia as e:
+        return _fila_cheia(e)
+
+    async with request.form(max_part_size=MAX_BYTES_CAMPO) as formulario:
+        preco_final = formulario.get('preco_final')
+        arquivos_orcamento = [
+            arquivo for arquivo in formulario.getlist('orcamentos') if isinstance(arquivo, UploadFile)
+        ]
+        nome_rede = str(formulario.get('rede') or '').strip()
+        data_texto = str(formulario.get('data') or '').strip()
+
+        if not isinstance(preco_final, UploadFile):
+            return _erro("envie a planilha de Preço Final no campo 'preco_final'", 400)
+        if not arquivos_orcamento:
+            return _erro("envie ao menos uma planilha de orçamento no campo 'orcamentos'", 400)
+        try:
+            data_relatorio = datetime.strptime(data_texto, '%Y-%m-%d') if data_texto else datetime.now()
+        except ValueError:
+            return _erro(f"data inválida '{data_texto}' (use AAAA-MM-DD)", 400)
+
+        conteudo_preco = await preco_final.read()
+        orcamentos = list(zip(
+            _nomes_unicos([arquivo.filename for arquivo in arquivos_orcamento]),
+            [await arquivo.read() for arquivo in arquivos_orcamento]
+        ))
+
+    try:
+        trabalho = fila.enviar(conteudo_preco, orcamentos, nome_rede, data_relatorio)
+    except FilaCheia as e:
+        return _fila_cheia(e)
+
+    return JSONResponse(trabalho.como_dict(), status_code=202, headers={'Location': f'/apuracoes/{trabalho.id}'})
+
+
+async def consultar_apuracao(request):
+    """GET /apuracoes/{id}: situação da apuração"""
+    trabalho = request.app.state.fila.obter(request.path_params['id'])
+    if trabalho is None:
+        return _erro("apuração não encontrada", 404)
+    return JSONResponse(trabalho.como_dict())
+
+
+async def baixar_excel(request):
+    """GET /apuracoes/{id}/excel: relatório Excel da apuração concluída"""
+    trabalho = request.app.state.fila.obter(request.path_params['id'])
+    if trabalho is None:
+        return _erro("apuração não encontrada", 404)
+    if trabalho.estado == 'erro':
+        return _erro(f"apuração com erro: {trabalho.erro}", 409)
+    if trabalho.estado != 'concluida':
+        return _erro(f"apuração ainda não concluída ({trabalho.estado})", 409)
+
+    nome_arquivo = f"Apuracao_Investimentos_{trabalho.rede or 'REDE'}_{trabalho.data_relatorio:%Y%m%d}.xlsx"
+    return Response(
+        trabalho.excel,
+        media_type=TIPO_EXCEL,
+        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{quote(nome_arquivo)}"}
+    )
+
+
+async def saude(request):
+    """GET /saude: ocupação da fila e do pool"""
+    return JSONResponse(request.app.state.fila.situacao())
+
+
+def criar_app(processos=None, tamanho_fila=TAMANHO_FILA, retencao_s=RETENCAO_S):
+    """Cria a aplicação ASGI; o pool e a fila são iniciados com o servidor (lifespan)"""
+    fila = FilaApuracoes(processos, tamanho_fila, retencao_s)
+
+    @asynccontextmanager
+    async def ciclo_de_vida(app):
+        await fila.iniciar()
+        try:
+            yield
+        finally:
+            await fila.encerrar()
+
+    app = Starlette(
+        routes=[
+            Route('/apuracoes', enviar_apuracao, methods=['POST']),
+            Route('/apuracoes/{id}', consultar_apuracao, methods=['GET']),
+            Route('/apuracoes/{id}/excel', baixar_excel, methods=['GET']),
+            Route('/saude', saude, methods=['GET']),
+        ],
+        lifespan=ciclo_de_vida,
+    )
+    app.state.fila = fila
+    return app
+
+
+app = criar_app()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP do Apurador de Investimentos")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--porta', type=int, default=8000)
+    parser.add_argument('--processos', type=int, default=None, help="processos do pool de cálculo")
+    parser.add_argument('--fila', type=int, default=TAMANHO_FILA, help="apurações que podem aguardar na fila")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    uvicorn.run(criar_app(args.processos, args.fila), host=args.host, port=args.porta)
+
+
+if __name__ == '__main__':
+    main()
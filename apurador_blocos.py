@@ -0,0 +1,346 @@
+"""
+Apurador de Investimentos - Apuração em Blocos
+
+Modo para Preços Finais grandes demais para a memória (centenas de milhares
+de EANs): o Preço Final é lido, apurado e exportado em blocos de linhas, sem
+montar o DataFrame de resultado inteiro.
+
+1. Os orçamentos são limpos e consolidados uma única vez e indexados pelos
+   seus EANs (IndiceOrcamentos): preço e quantidade de cada loja por EAN.
+2. Primeira passada: cada bloco do Preço Final é apurado contra o índice
+   (mesmas contas de processar_dados) e guardado em um arquivo temporário;
+   acumulam-se os totais do resumo e o maior texto de cada coluna.
+3. Segunda passada: o relatório é escrito bloco a bloco a partir do arquivo
+   temporário. São duas passadas porque, no Excel write-only, larguras e
+   resumo vêm antes das linhas.
+
+A memória depende do tamanho do bloco e dos orçamentos, não do Preço Final.
+"""
+
+import pickle
+import tempfile
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from apurador_core import (
+    IndiceEans, ResultadoApuracao, calcular_investimento, calcular_totais, consolidar_eans_duplicados,
+    limpar_valores_monetarios, localizar_coluna_negociado, para_centavos, registrar_fora_preco,
+    tabela_itens_fora_preco, validar_colunas_preco_final
+)
+from apurador_instrumentacao import INSTRUMENTACAO_DESATIVADA
+from apurador_leitura import TAMANHO_BLOCO, ler_preco_final_em_blocos
+from apurador_relatorio import escrever_relatorio_em_blocos, maiores_textos_colunas
+
+
+# Máximo de produtos sem preço listados no diagnóstico
+MAX_EXEMPLOS_SEM_PRECO = 1000
+
+
+@dataclass
+class IndiceOrcamentos:
+    """
+    Orçamentos limpos e consolidados, indexados pela união dos seus EANs:
+    precos/quantidades/presencas têm uma linha por loja e uma coluna por EAN
+    de `eans` (NaN / False = loja sem o produto). pedidos/qtd_validas são os
+    totais de calcular_totais das linhas originais de cada loja (Valor de
+    Pedido em centavos e quantidade válida; NaN = nenhuma linha válida).
+    ordens: posições em `eans` dos EANs de cada loja, na ordem do orçamento.
+    """
+    eans: pd.Index
+    precos: np.ndarray
+    quantidades: np.ndarray
+    presencas: np.ndarray
+    pedidos: np.ndarray
+    qtd_validas: np.ndarray
+    ordens: list
+    nomes: list
+    eans_repetidos: list
+    linhas_removidas: list
+
+
+def indexar_orcamentos(orcamentos_dict):
+    """Limpa, consolida e indexa os orçamentos {nome: DataFrame}, na ordem das lojas"""
+    nomes = list(orcamentos_dict.keys())
+    consolidados = []
+    totais = []
+    eans_repetidos = []
+    linhas_removidas = []
+    for df_orc in orcamentos_dict.values():
+        df_longo = pd.DataFrame({
+            # Célula de EAN vazia continua vazia (NaN), qualquer que seja a versão do pandas
+            'EAN': df_orc['EAN'].astype(str).str.strip().where(df_orc['EAN'].notna()),
+            'VALOR SKU PAGO': limpar_valores_monetarios(df_orc['VALOR SKU PAGO']),
+            'QUANTIDADE': pd.to_numeric(df_orc['QUANTIDADE'], errors='coerce'),
+            'loja': 1
+        })
+        totais.append(calcular_totais(df_longo))
+        df_longo, relatorio = consolidar_eans_duplicados(df_longo)
+        repetidos, removidas = relatorio.get(1, (0, 0))
+        consolidados.append(df_longo)
+        eans_repetidos.append(repetidos)
+        linhas_removidas.append(removidas)
+
+    eans = pd.Index(
+        pd.concat([df['EAN'] for df in consolidados], ignore_index=True) if consolidados else [], dtype=object
+    ).unique()
+    precos = np.full((len(nomes), len(eans)), np.nan)
+    quantidades = np.full((len(nomes), len(eans)), np.nan)
+    presencas = np.zeros((len(nomes), len(eans)), dtype=bool)
+    pedidos = np.full((len(nomes), len(eans)), np.nan)
+    qtd_validas = np.full((len(nomes), len(eans)), np.nan)
+    ordens = []
+    for loja, (df_longo, totais_loja) in enumerate(zip(consolidados, totais)):
+        posicoes = eans.get_indexer(df_longo['EAN'])
+        precos[loja, posicoes] = df_longo['VALOR SKU PAGO'].to_numpy(dtype=np.float64)
+        quantidades[loja, posicoes] = df_longo['QUANTIDADE'].to_numpy(dtype=np.float64)
+        presencas[loja, posicoes] = True
+        ordens.append(posicoes)
+        posicoes = eans.get_indexer(totais_loja.index)
+        pedidos[loja, posicoes] = totais_loja['VALOR_PEDIDO'].to_numpy(dtype=np.float64)
+        qtd_validas[loja, posicoes] = totais_loja['QTD_VALIDA'].to_numpy(dtype=np.float64)
+
+    return IndiceOrcamentos(
+        eans, precos, quantidades, presencas, pedidos, qtd_validas, ordens, nomes, eans_repetidos, linhas_removidas
+    )
+
+
+def apurar_bloco(df_bloco, indice, coluna_negociado):
+    """
+    Apura um bloco do Preço Final (EAN já como texto limpo, sem repetidos e
+    valor negociado já numérico) contra o índice dos orçamentos. Retorna
+    (df_resultado do bloco, máscara dos produtos sem preço negociado,
+    investimento e pedido por produto em centavos, encontrados por loja).
+    """
+    negociado = df_bloco[coluna_negociado].to_numpy(dtype=np.float64)
+    posicoes = indice.eans.get_indexer(df_bloco['EAN'])
+    presente = posicoes >= 0
+
+    n_lojas = len(indice.nomes)
+    precos = np.full((n_lojas, len(df_bloco)), np.nan)
+    quantidades = np.full((n_lojas, len(df_bloco)), np.nan)
+    precos[:, presente] = indice.precos[:, posicoes[presente]]
+    quantidades[:, presente] = indice.quantidades[:, posicoes[presente]]
+
+    # Produto em algum orçamento (o índice só tem EANs de orçamentos) exige valor negociado
+    sem_preco = presente & (np.isnan(negociado) | (negociado == 0))
+
+    # Contribuição de cada loja em centavos, somada na mesma ordem de processar_dados
+    pedidos = np.zeros((n_lojas, len(df_bloco)))
+    qtd_validas = np.zeros((n_lojas, len(df_bloco)))
+    pedidos[:, presente] = np.nan_to_num(indice.pedidos[:, posicoes[presente]])
+    qtd_validas[:, presente] = np.nan_to_num(indice.qtd_validas[:, posicoes[presente]])
+    investimento_centavos = sum(calcular_investimento(pedidos[loja], qtd_validas[loja], negociado) for loja in range(n_lojas))
+    pedido_centavos = sum(pedidos[loja] for loja in range(n_lojas))
+    verba_total = np.broadcast_to(np.asarray(investimento_centavos, dtype=np.float64) / 100, len(df_bloco))
+    tt_pedido = np.broadcast_to(np.asarray(pedido_centavos, dtype=np.float64) / 100, len(df_bloco))
+
+    # Por produto, arredondados ao centavo como somar_reais faz no resumo
+    investimento = para_centavos(verba_total)
+    pedido = para_centavos(tt_pedido)
+
+    colunas_lojas = {}
+    for loja in range(n_lojas):
+        quantidade = quantidades[loja]
+        preenchidas = quantidade[~np.isnan(quantidade)]
+        colunas_lojas[f'Preço venda loja {loja + 1}'] = precos[loja]
+        # Quantidades inteiras saem como inteiros, como no resultado compactado
+        colunas_lojas[f'Qtd venda loja {loja + 1}'] = (
+            pd.array(quantidade, dtype='Int64') if np.array_equal(preenchidas, np.trunc(preenchidas)) else quantidade
+        )
+    colunas_lojas['Verba Total'] = verba_total
+    colunas_lojas['TT.Pedido'] = tt_pedido
+    df_resultado = pd.concat(
+        [df_bloco, pd.DataFrame(colunas_lojas, index=df_bloco.index)], axis=1
+    )
+
+    percentual = ((df_resultado['Verba Total'] / df_resultado['TT.Pedido']) * 100).round(2)
+    df_resultado['% Investimento'] = percentual.replace([float('inf'), -float('inf')], 0).fillna(0)
+
+    encontrados = indice.presencas[:, posicoes[presente]].sum(axis=1)
+    return df_resultado, sem_preco, investimento, pedido, encontrados
+
+
+@dataclass
+class ResultadoBlocos(ResultadoApuracao):
+    """
+    Resultado de apurar_em_blocos: o relatório vai direto para o destino, então
+    df_resultado fica vazio; concluido indica que o arquivo foi gravado.
+    """
+    concluido: bool = False
+    total_verba: float = 0.0
+    total_pedido: float = 0.0
+    produtos: int = 0
+    blocos: int = 0
+    lojas: list = field(default_factory=list)
+
+    @property
+    def sucesso(self):
+        return self.concluido
+
+
+def _hashes_eans(eans):
+    """Hash de 64 bits de cada EAN (texto), para guardar os já vistos em um array compacto"""
+    return pd.util.hash_array(np.asarray(eans, dtype=object))
+
+
+def _ja_vistos(hashes, vistos):
+    """Máscara dos `hashes` presentes em `vistos` (array ordenado), por busca binária"""
+    if not len(vistos):
+        return np.zeros(len(hashes), dtype=bool)
+    posicoes = np.minimum(np.searchsorted(vistos, hashes), len(vistos) - 1)
+    return vistos[posicoes] == hashes
+
+
+def _blocos_gravados(arquivo, quantidade):
+    """Lê de volta os `quantidade` blocos gravados com pickle em `arquivo`"""
+    arquivo.seek(0)
+    for _ in range(quantidade):
+        yield pickle.load(arquivo)
+
+
+def apurar_em_blocos(conteudo_preco, orcamentos_dict, destino, nome_rede="", data_relatorio=None,
+                     tamanho_bloco=TAMANHO_BLOCO, motor=None, instrumentacao=INSTRUMENTACAO_DESATIVADA):
+    """
+    Apura o Preço Final (bytes da planilha) contra os orçamentos {nome:
+    DataFrame} em blocos de `tamanho_bloco` linhas e grava o relatório Excel em
+    `destino` (caminho ou arquivo binário). Mesmas regras de processar_dados:
+    EAN repetido mantém a primeira linha e produto de orçamento sem preço
+    negociado é erro (nada é gravado). Retorna um ResultadoBlocos.
+    """
+    resultado = ResultadoBlocos()
+
+    with instrumentacao.etapa('indice_orcamentos', lojas=len(orcamentos_dict)) as etapa:
+        indice = indexar_orcamentos(orcamentos_dict)
+        etapa.contar('eans', len(indice.eans))
+
+    coluna_negociado = None
+    cabecalhos = None
+    maiores = None
+    # Hashes (uint64, ordenados) dos EANs do Preço Final já lidos: 8 bytes por EAN
+    vistos = np.empty(0, dtype=np.uint64)
+    linhas_descartadas = 0
+    total_investimento = 0
+    total_pedido = 0
+    encontrados = np.zeros(len(indice.nomes), dtype=np.int64)
+    sem_preco = []
+    total_sem_preco = 0
+
+    with tempfile.TemporaryFile() as temporario:
+        with instrumentacao.etapa('apuracao_blocos', tamanho_bloco=tamanho_bloco) as etapa:
+            for df_bloco in ler_preco_final_em_blocos(conteudo_preco, tamanho_bloco, motor=motor):
+                if coluna_negociado is None:
+                    valido, mensagem = validar_colunas_preco_final(df_bloco)
+                    if not valido:
+                        resultado.registrar('erro', f"❌ Preço Final: {mensagem}")
+                        return resultado
+                    coluna_negociado = localizar_coluna_negociado(df_bloco.columns)
+                    if coluna_negociado is None:
+                        resultado.registrar('erro', "❌ Não foi encontrada coluna de valor negociado na planilha de Preço Final")
+                        resultado.registrar('info', "💡 Colunas aceitas: 'VALOR NEGOCIADO REDE', 'VALOR NEGOCIADO', 'PRECO NEGOCIADO'")
+                        return resultado
+                else:
+                    validar_colunas_preco_final(df_bloco)
+
+                df_bloco['EAN'] = df_bloco['EAN'].astype(str).str.strip()
+                df_bloco[coluna_negociado] = limpar_valores_monetarios(df_bloco[coluna_negociado])
+
+                # EAN repetido (no bloco ou em blocos anteriores): mantém a primeira ocorrência
+                hashes = _hashes_eans(df_bloco['EAN'])
+                repetidos = df_bloco['EAN'].duplicated().to_numpy() | _ja_vistos(hashes, vistos)
+                # Os dois trechos já estão ordenados: a ordenação estável (timsort) só os intercala
+                vistos = np.sort(np.concatenate([vistos, np.sort(hashes[~repetidos])]), kind='stable')
+                if repetidos.any():
+                    linhas_descartadas += int(repetidos.sum())
+                    df_bloco = df_bloco[~repetidos]
+                df_bloco = df_bloco.reset_index(drop=True)
+
+                df_resultado, sem_preco_bloco, investimento, pedido, encontrados_bloco = apurar_bloco(
+                    df_bloco, indice, coluna_negociado
+                )
+                if sem_preco_bloco.any():
+                    total_sem_preco += int(sem_preco_bloco.sum())
+                    if sum(len(df) for df in sem_preco) < MAX_EXEMPLOS_SEM_PRECO:
+                        sem_preco.append(df_bloco[sem_preco_bloco])
+                if total_sem_preco:
+                    # Com produtos sem preço o relatório não sai: só termina a verificação
+                    continue
+
+                total_investimento += int(investimento.sum())
+                total_pedido += int(pedido.sum())
+                encontrados += encontrados_bloco
+                maiores_bloco = maiores_textos_colunas(df_resultado, linhas_amostra=0)
+                maiores = maiores_bloco if maiores is None else list(map(max, maiores, maiores_bloco))
+                cabecalhos = list(df_resultado.columns)
+                pickle.dump(df_resultado, temporario, protocol=pickle.HIGHEST_PROTOCOL)
+
+                resultado.produtos += len(df_resultado)
+                resultado.blocos += 1
+                etapa.contar('linhas', len(df_resultado))
+                etapa.contar('blocos')
+
+        if coluna_negociado is None:
+            resultado.registrar('erro', "❌ A planilha de Preço Final está vazia")
+            return resultado
+
+        if linhas_descartadas:
+            resultado.registrar(
+                'aviso',
+                f"⚠️ Preço Final: EAN(s) repetido(s) - mantida a primeira linha de cada "
+                f"({linhas_descartadas} linha(s) descartada(s))"
+            )
+
+        if total_sem_preco:
+            df_sem_preco = pd.concat(sem_preco, ignore_index=True)
+            col_produto = next((c for c in df_sem_preco.columns if 'produto' in str(c).lower() or 'descri' in str(c).lower()), None)
+            colunas_exibir = ['EAN'] + ([col_produto] if col_produto else []) + [coluna_negociado]
+            resultado.registrar(
+                'erro',
+                f"❌ **{total_sem_preco} produto(s) presentes no orçamento estão sem preço negociado (zero ou vazio)**. Corrija antes de continuar.",
+                tabela=df_sem_preco[colunas_exibir].head(MAX_EXEMPLOS_SEM_PRECO),
+                titulo_tabela="📋 Ver lista de produtos sem preço"
+            )
+            return resultado
+
+        # Anti-join: EANs dos orçamentos que nenhum bloco do Preço Final trouxe (linhas sem EAN não contam)
+        com_ean = np.asarray(indice.eans.notna() & (indice.eans.str.len() > 0), dtype=bool)
+        fora = ~_ja_vistos(_hashes_eans(indice.eans), vistos) & com_ean
+        resultado.eans_fora_preco = IndiceEans(
+            eans=indice.eans[fora], presencas=indice.presencas[:, fora], produtos_preco=0
+        ).fora_do_preco(indice.nomes)
+        # Itens de cada loja na ordem do orçamento, como em processar_dados
+        posicoes_fora = [ordem[fora[ordem]] for ordem in indice.ordens]
+        lojas = np.repeat(np.arange(len(indice.nomes)), [len(p) for p in posicoes_fora])
+        posicoes = np.concatenate([np.empty(0, dtype=np.intp)] + posicoes_fora)
+        resultado.itens_fora_preco = tabela_itens_fora_preco(
+            np.asarray(indice.nomes, dtype=object)[lojas], indice.eans.to_numpy()[posicoes],
+            indice.precos[lojas, posicoes], indice.quantidades[lojas, posicoes], indice.pedidos[lojas, posicoes] / 100
+        )
+
+        resultado.total_verba = total_investimento / 100
+        resultado.total_pedido = total_pedido / 100
+        escrever_relatorio_em_blocos(
+            destino, _blocos_gravados(temporario, resultado.blocos), cabecalhos, maiores,
+            resultado.total_verba, resultado.total_pedido, nome_rede, data_relatorio, instrumentacao,
+            itens_fora_preco=resultado.itens_fora_preco
+        )
+
+    for loja, nome in enumerate(indice.nomes):
+        resultado.estatisticas[nome] = {
+            'encontrados': int(encontrados[loja]),
+            'total': resultado.produtos,
+            'eans_consolidados': indice.eans_repetidos[loja]
+        }
+        if indice.eans_repetidos[loja]:
+            resultado.registrar(
+                'aviso',
+                f"⚠️ {nome}: {indice.eans_repetidos[loja]} EAN(s) repetido(s) consolidado(s) "
+                f"({indice.linhas_removidas[loja]} linha(s) a menos - quantidades somadas e preço médio ponderado)"
+            )
+        if not encontrados[loja]:
+            resultado.registrar('aviso', f"⚠️ Nenhum produto de '{nome}' foi encontrado no Preço Final. Verifique se os EANs são iguais!")
+    registrar_fora_preco(resultado, resultado.eans_fora_preco, resultado.itens_fora_preco)
+    resultado.lojas = indice.nomes
+    resultado.concluido = True
+    return resultado
@@ -0,0 +1,310 @@
+"""
+Apurador de Investimentos - Apuração em Lote (linha de comando)
+
+Processa várias redes de uma vez, sem a interface web. A pasta de entrada
+deve ter uma subpasta por rede, cada uma com a planilha de Preço Final
+(nome começando com "preco" / "preço") e as planilhas de orçamento Reppos.
+
+Para cada rede é gerado um relatório Excel na pasta de saída, além de um
+resumo consolidado (resumo.csv) com Verba Total, TT.Pedido e % Investimento.
+As redes são processadas em paralelo, em um pool de processos. Com
+--desempenho, as etapas medidas de cada rede vão para desempenho.jsonl.
+Com --blocos N, Preços Finais muito grandes são apurados e exportados em
+blocos de N linhas (apurador_blocos.py), com memória limitada.
+
+Uso:
+    python apurador_cli.py ENTRADA SAIDA [--data AAAA-MM-DD] [--processos N] [--desempenho] [--blocos N]
+
+Exemplo de estrutura:
+    entrada/
+        REDE ABC/
+            preco_final.xlsx
+            loja 01.xlsx
+            loja 02.xlsx
+        REDE XYZ/
+            ...
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from apurador_blocos import apurar_em_blocos
+from apurador_core import processar_dados, somar_reais, validar_colunas_orcamento, validar_colunas_preco_final
+from apurador_instrumentacao import INSTRUMENTACAO_DESATIVADA, Instrumentacao
+from apurador_leitura import ler_orcamento, ler_preco_final
+from apurador_relatorio import converter_df_para_excel
+
+
+# Padrões (sem diferenciar maiúsculas) do nome da planilha de Preço Final
+PADROES_PRECO = ['preco*', 'preço*']
+
+EXTENSOES_EXCEL = ('.xlsx', '.xls')
+
+ETAPAS = ['leitura', 'calculo', 'exportacao']
+
+
+def localizar_arquivos(pasta_rede, padroes_preco=PADROES_PRECO):
+    """
+    Separa a planilha de Preço Final das planilhas de orçamento da pasta.
+    Os orçamentos são ordenados pelo nome, o que fixa a numeração das lojas.
+    Retorna (arquivo_preco, [arquivos_orcamento]).
+    """
+    arquivos = sorted(
+        nome for nome in os.listdir(pasta_rede)
+        if nome.lower().endswith(EXTENSOES_EXCEL) and not nome.startswith('~$')
+    )
+    precos = [
+        nome for nome in arquivos
+        if any(fnmatch.fnmatch(nome.lower(), padrao) for padrao in padroes_preco)
+    ]
+
+    if len(precos) != 1:
+        raise ValueError(
+            f"esperada 1 planilha de Preço Final ({', '.join(padroes_preco)}), encontradas {len(precos)}"
+        )
+
+    orcamentos = [nome for nome in arquivos if nome != precos[0]]
+    if not orcamentos:
+        raise ValueError("nenhuma planilha de orçamento encontrada")
+
+    return os.path.join(pasta_rede, precos[0]), [os.path.join(pasta_rede, nome) for nome in orcamentos]
+
+
+def _ler_arquivo(caminho):
+    with open(caminho, 'rb') as arquivo:
+        return arquivo.read()
+
+
+def _motivo_da_falha(resultado):
+    """Mensagens de erro dos diagnósticos de uma apuração não concluída (vão para o resumo e o console)"""
+    # Sem o negrito e o ❌ da interface: o console já marca a rede com ❌
+    erros = [
+        d.texto.replace('**', '').removeprefix('❌').strip()
+        for d in resultado.diagnosticos if d.nivel == 'erro'
+    ]
+    return ' | '.join(erros) or "apuração não concluída"
+
+
+def apurar_rede(pasta_rede, pasta_saida, data_relatorio, padroes_preco=PADROES_PRECO, medir_desempenho=False,
+                tamanho_bloco=None):
+    """
+    Apura uma rede: lê as planilhas, calcula e grava o relatório Excel.
+    Roda em um processo do pool; erros são devolvidos no resumo em vez de
+    interromper as demais redes. Com medir_desempenho, as etapas medidas
+    voltam em resumo['desempenho']. Com tamanho_bloco, o Preço Final é
+    apurado e exportado em blocos (cálculo e exportação numa só etapa).
+    """
+    rede = os.path.basename(os.path.normpath(pasta_rede))
+    resumo = {'rede': rede, 'erro': None, 'avisos': [], 'tempos': {}}
+    instrumentacao = Instrumentacao(emitir_log=False, rede=rede) if medir_desempenho else INSTRUMENTACAO_DESATIVADA
+
+    try:
+        # Leitura
+        inicio = time.perf_counter()
+        arquivo_preco, arquivos_orcamento = localizar_arquivos(pasta_rede, padroes_preco)
+
+        # Em blocos, o Preço Final só é lido (e validado) durante a apuração
+        if not tamanho_bloco:
+            with instrumentacao.etapa('leitura_preco_final') as etapa:
+                df_preco = ler_preco_final(_ler_arquivo(arquivo_preco))
+                etapa.contar('linhas', len(df_preco))
+            with instrumentacao.etapa('validacao', linhas=len(df_preco)):
+                valido, mensagem = validar_colunas_preco_final(df_preco)
+            if not valido:
+                raise ValueError(f"{os.path.basename(arquivo_preco)}: {mensagem}")
+
+        orcamentos = {}
+        with instrumentacao.etapa('leitura_orcamentos', arquivos=len(arquivos_orcamento)) as etapa:
+            for caminho in arquivos_orcamento:
+                df_orc = ler_orcamento(_ler_arquivo(caminho))
+                etapa.contar('linhas', len(df_orc))
+                valido, mensagem = validar_colunas_orcamento(df_orc)
+                if not valido:
+                    raise ValueError(f"{os.path.basename(caminho)}: {mensagem}")
+                nome_orcamento = os.path.splitext(os.path.basename(caminho))[0]
+                orcamentos[nome_orcamento] = df_orc
+        resumo['tempos']['leitura'] = time.perf_counter() - inicio
+        caminho_saida = os.path.join(pasta_saida, f"Apuracao_Investimentos_{rede}.xlsx")
+
+        if tamanho_bloco:
+            inicio = time.perf_counter()
+            with instrumentacao.etapa('processamento_blocos', lojas=len(orcamentos)):
+                resultado = apurar_em_blocos(
+                    _ler_arquivo(arquivo_preco), orcamentos, caminho_saida, rede, data_relatorio,
+                    tamanho_bloco=tamanho_bloco, instrumentacao=instrumentacao
+                )
+            resumo['tempos']['calculo'] = time.perf_counter() - inicio
+            resumo['avisos'] = [d.texto for d in resultado.diagnosticos if d.nivel == 'aviso']
+            if not resultado.sucesso:
+                raise ValueError(_motivo_da_falha(resultado))
+            resumo.update({
+                'arquivo': caminho_saida,
+                'lojas': len(orcamentos),
+                'produtos': resultado.produtos,
+                'Verba Total': resultado.total_verba,
+                'TT.Pedido': resultado.total_pedido,
+                '% Investimento': (
+                    resultado.total_verba / resultado.total_pedido * 100 if resultado.total_pedido > 0 else 0
+                ),
+            })
+            return _com_desempenho(resumo, instrumentacao)
+
+        # Cálculo
+        inicio = time.perf_counter()
+        with instrumentacao.etapa('processamento', linhas=len(df_preco), lojas=len(orcamentos)):
+            resultado = processar_dados(df_preco, orcamentos, instrumentacao=instrumentacao)
+        resumo['tempos']['calculo'] = time.perf_counter() - inicio
+        resumo['avisos'] = [d.texto for d in resultado.diagnosticos if d.nivel == 'aviso']
+        if not resultado.sucesso:
+            raise ValueError(_motivo_da_falha(resultado))
+
+        # Exportação
+        inicio = time.perf_counter()
+        df_resultado = resultado.df_resultado
+        with instrumentacao.etapa('exportacao', linhas=len(df_resultado)):
+            with open(caminho_saida, 'wb') as arquivo:
+                arquivo.write(converter_df_para_excel(
+                    df_resultado, rede, data_relatorio, instrumentacao=instrumentacao,
+                    itens_fora_preco=resultado.itens_fora_preco
+                ))
+        resumo['tempos']['exportacao'] = time.perf_counter() - inicio
+
+        total_verba = somar_reais(df_resultado['Verba Total'])
+        total_pedido = somar_reais(df_resultado['TT.Pedido'])
+        resumo.update({
+            'arquivo': caminho_saida,
+            'lojas': len(orcamentos),
+            'produtos': len(df_resultado),
+            'Verba Total': total_verba,
+            'TT.Pedido': total_pedido,
+            '% Investimento': (total_verba / total_pedido * 100) if total_pedido > 0 else 0,
+        })
+    except Exception as e:
+        resumo['erro'] = str(e)
+
+    return _com_desempenho(resumo, instrumentacao)
+
+
+def _com_desempenho(resumo, instrumentacao):
+    """Acrescenta ao resumo as etapas medidas (se a instrumentação estiver ligada)"""
+    if instrumentacao.ativa:
+        resumo['desempenho'] = [
+            {'execucao': instrumentacao.id_execucao, 'rede': resumo['rede'], **registro}
+            for registro in instrumentacao.registros
+        ]
+    return resumo
+
+
+def gravar_desempenho(resumos, pasta_saida):
+    """Grava as etapas medidas de todas as redes em desempenho.jsonl (uma linha JSON por etapa)"""
+    caminho = os.path.join(pasta_saida, 'desempenho.jsonl')
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        for r in resumos:
+            for registro in r.get('desempenho', []):
+                arquivo.write(json.dumps(registro, ensure_ascii=False, default=str) + '\n')
+    return caminho
+
+
+def gravar_resumo(resumos, pasta_saida):
+    """Grava o resumo consolidado por rede (resumo.csv, separador ';' e vírgula decimal)"""
+    df_resumo = pd.DataFrame([
+        {
+            'Rede': r['rede'],
+            'Lojas': r.get('lojas'),
+            'Produtos': r.get('produtos'),
+            'Verba Total': r.get('Verba Total'),
+            'TT.Pedido': r.get('TT.Pedido'),
+            '% Investimento': r.get('% Investimento'),
+            'Erro': r['erro'] or '',
+        }
+        for r in resumos
+    ])
+    df_resumo[['Lojas', 'Produtos']] = df_resumo[['Lojas', 'Produtos']].astype('Int64')
+    caminho = os.path.join(pasta_saida, 'resumo.csv')
+    df_resumo.to_csv(caminho, sep=';', decimal=',', float_format='%.2f', index=False, encoding='utf-8-sig')
+    return caminho
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apuração de investimentos em lote, uma subpasta por rede")
+    parser.add_argument('entrada', help="pasta com uma subpasta por rede")
+    parser.add_argument('saida', help="pasta onde os relatórios e o resumo serão gravados")
+    parser.add_argument('--data', help="data do relatório (AAAA-MM-DD); padrão: hoje")
+    parser.add_argument('--processos', type=int, default=None, help="máximo de redes processadas em paralelo")
+    parser.add_argument(
+        '--padrao-preco', action='append', dest='padroes_preco',
+        help="padrão do nome da planilha de Preço Final (pode repetir); padrão: preco* e preço*"
+    )
+    parser.add_argument(
+        '--desempenho', action='store_true',
+        help="mede as etapas de cada rede (tempo, linhas, memória) e grava desempenho.jsonl na saída"
+    )
+    parser.add_argument(
+        '--blocos', type=int, metavar='N', default=None,
+        help="apura e exporta o Preço Final em blocos de N linhas (planilhas muito grandes, memória limitada)"
+    )
+    args = parser.parse_args(argv)
+
+    data_relatorio = datetime.strptime(args.data, '%Y-%m-%d') if args.data else datetime.now()
+    padroes_preco = [p.lower() for p in args.padroes_preco] if args.padroes_preco else PADROES_PRECO
+
+    pastas = sorted(
+        os.path.join(args.entrada, nome) for nome in os.listdir(args.entrada)
+        if os.path.isdir(os.path.join(args.entrada, nome))
+    )
+    if not pastas:
+        print(f"❌ Nenhuma subpasta de rede encontrada em {args.entrada}")
+        return 1
+
+    os.makedirs(args.saida, exist_ok=True)
+    processos = min(args.processos or os.cpu_count() or 1, len(pastas))
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        resumos = list(executor.map(
+            apurar_rede,
+            pastas,
+            [args.saida] * len(pastas),
+            [data_relatorio] * len(pastas),
+            [padroes_preco] * len(pastas),
+            [args.desempenho] * len(pastas),
+            [args.blocos] * len(pastas)
+        ))
+    tempo_total = time.perf_counter() - inicio
+
+    # Relatório por rede (mesma ordem das pastas)
+    for r in resumos:
+        tempos = ' | '.join(f"{etapa} {r['tempos'][etapa]:.2f}s" for etapa in ETAPAS if etapa in r['tempos'])
+        if r['erro']:
+            print(f"❌ {r['rede']}: {r['erro']} ({tempos})" if tempos else f"❌ {r['rede']}: {r['erro']}")
+        else:
+            print(
+                f"✅ {r['rede']}: {r['lojas']} lojas, Verba Total R$ {r['Verba Total']:,.2f}, "
+                f"TT.Pedido R$ {r['TT.Pedido']:,.2f}, {r['% Investimento']:.2f}% ({tempos})"
+            )
+        for aviso in r['avisos']:
+            print(f"   {aviso}")
+
+    caminho_resumo = gravar_resumo(resumos, args.saida)
+
+    # Tempo somado por etapa (em todos os processos) e tempo total de parede
+    totais = {etapa: sum(r['tempos'].get(etapa, 0) for r in resumos) for etapa in ETAPAS}
+    print(f"\n📄 Resumo consolidado: {caminho_resumo}")
+    if args.desempenho:
+        print(f"📄 Desempenho por etapa: {gravar_desempenho(resumos, args.saida)}")
+    print("⏱️ " + ' | '.join(f"{etapa} {tempo:.2f}s" for etapa, tempo in totais.items())
+          + f" | total {tempo_total:.2f}s com {processos} processo(s)")
+
+    return 1 if any(r['erro'] for r in resumos) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
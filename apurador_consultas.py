@@ -0,0 +1,151 @@
+"""
+Apurador de Investimentos - Consultas sobre o Histórico
+
+Análises entre redes e meses sobre as apurações guardadas no histórico
+(apurador_historico): maiores investimentos por EAN, tendência do
+% Investimento e preços/lojas fora do padrão. Os filtros de rede, período e
+EAN são aplicados na leitura (pastas e filtros do Parquet, ou WHERE com
+índices no SQLite); no SQLite as somas também são feitas na própria base.
+
+Quando a mesma rede é apurada mais de uma vez para a mesma data, vale só a
+apuração mais recente.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# Escore robusto acima do qual um preço de loja é considerado atípico
+LIMITE_ESCORE_ATIPICO = 3.5
+
+# Mínimo de lojas com preço para comparar um EAN dentro de uma apuração
+MIN_LOJAS_COMPARACAO = 3
+
+
+def apuracoes_vigentes(historico, redes=None, inicio=None, fim=None):
+    """Apurações consideradas: a mais recente de cada rede e data dentro do filtro"""
+    apuracoes = historico.ler('apuracoes', redes=redes, inicio=inicio, fim=fim)
+    apuracoes = apuracoes.sort_values('criado_em', ascending=False, kind='stable')
+    return apuracoes.drop_duplicates(subset=['rede', 'data'], keep='first').reset_index(drop=True)
+
+
+def top_investimento_por_ean(historico, n=10, redes=None, inicio=None, fim=None):
+    """
+    Os `n` EANs com maior Verba Total somada nas apurações do filtro, com
+    TT.Pedido, % Investimento e em quantas redes e apurações foram pedidos.
+    """
+    ids = apuracoes_vigentes(historico, redes, inicio, fim)['id_apuracao'].tolist()
+    if not ids:
+        return pd.DataFrame(columns=['ean', 'verba_total', 'tt_pedido', 'percentual', 'redes', 'apuracoes'])
+
+    if historico.formato == 'sqlite':
+        where, parametros = historico.filtros_sql('produtos', redes, inicio, fim, ids=ids)
+        top = historico.consultar_sql(
+            "SELECT ean, SUM(verba_total) AS verba_total, SUM(tt_pedido) AS tt_pedido, "
+            "COUNT(DISTINCT rede) AS redes, COUNT(*) AS apuracoes "
+            f"FROM produtos{where} AND tt_pedido > 0 "
+            "GROUP BY ean ORDER BY verba_total DESC LIMIT ?",
+            parametros + [int(n)]
+        )
+    else:
+        produtos = historico.ler('produtos', ['ean', 'rede', 'verba_total', 'tt_pedido'], redes, inicio, fim, ids=ids)
+        produtos = produtos[produtos['tt_pedido'] > 0]
+        top = produtos.groupby('ean', sort=False).agg(
+            verba_total=('verba_total', 'sum'),
+            tt_pedido=('tt_pedido', 'sum'),
+            redes=('rede', 'nunique'),
+            apuracoes=('rede', 'size')
+        ).nlargest(n, 'verba_total').reset_index()
+
+    top.insert(3, 'percentual', (top['verba_total'] / top['tt_pedido'] * 100).round(2))
+    return top
+
+
+def tendencia_investimento(historico, redes=None, inicio=None, fim=None, eans=None):
+    """
+    Verba Total, TT.Pedido e % Investimento por rede e mês (AAAA-MM). Com
+    `eans`, considera só esses produtos.
+    """
+    vigentes = apuracoes_vigentes(historico, redes, inicio, fim)
+    if vigentes.empty:
+        return pd.DataFrame(columns=['rede', 'mes', 'verba_total', 'tt_pedido', 'percentual'])
+
+    if eans is None:
+        # Totais já guardados por apuração: não precisa ler os produtos
+        base = vigentes[['rede', 'data', 'verba_total', 'tt_pedido']]
+    elif historico.formato == 'sqlite':
+        where, parametros = historico.filtros_sql('produtos', redes, inicio, fim, eans, ids=vigentes['id_apuracao'])
+        base = historico.consultar_sql(
+            "SELECT rede, data, SUM(verba_total) AS verba_total, SUM(tt_pedido) AS tt_pedido "
+            f"FROM produtos{where} GROUP BY rede, data",
+            parametros
+        )
+    else:
+        base = historico.ler(
+            'produtos', ['rede', 'data', 'verba_total', 'tt_pedido'], redes, inicio, fim, eans, ids=vigentes['id_apuracao']
+        )
+
+    tendencia = base.assign(mes=base['data'].str[:7]).groupby(['rede', 'mes'], as_index=False)[
+        ['verba_total', 'tt_pedido']
+    ].sum()
+    tendencia['percentual'] = (
+        (tendencia['verba_total'] / tendencia['tt_pedido'].where(tendencia['tt_pedido'] > 0)) * 100
+    ).round(2).fillna(0)
+    return tendencia.sort_values(['rede', 'mes'], ignore_index=True)
+
+
+def precos_atipicos(historico, redes=None, inicio=None, fim=None, eans=None, limite=LIMITE_ESCORE_ATIPICO):
+    """
+    Preços de loja fora do padrão. Em cada apuração, o preço de cada loja
+    para um EAN é comparado com a mediana das lojas pelo escore robusto
+    0,6745 x (preço - mediana) / MAD. EANs com menos de MIN_LOJAS_COMPARACAO
+    lojas ou sem variação (MAD = 0) não entram. Retorna as linhas com
+    |escore| acima de `limite`, das mais atípicas para as menos.
+    """
+    vigentes = apuracoes_vigentes(historico, redes, inicio, fim)
+    colunas = ['rede', 'data', 'ean', 'loja', 'nome_loja', 'preco', 'mediana', 'escore']
+    if vigentes.empty:
+        return pd.DataFrame(columns=colunas)
+
+    itens = historico.ler(
+        'itens', ['id_apuracao', 'rede', 'data', 'ean', 'loja', 'nome_loja', 'preco'],
+        redes, inicio, fim, eans, ids=vigentes['id_apuracao']
+    )
+    itens = itens[itens['preco'].notna()]
+
+    # Um grupo por (apuração, EAN)
+    grupo = [itens['id_apuracao'], itens['ean']]
+    preco = itens['preco'].to_numpy()
+    mediana = itens['preco'].groupby(grupo, sort=False).transform('median').to_numpy()
+    desvio = pd.Series(np.abs(preco - mediana), index=itens.index)
+    mad = desvio.groupby(grupo, sort=False).transform('median').to_numpy()
+    tamanho = itens['preco'].groupby(grupo, sort=False).transform('size').to_numpy()
+
+    comparavel = (mad > 0) & (tamanho >= MIN_LOJAS_COMPARACAO)
+    escore = np.zeros(len(itens))
+    escore[comparavel] = 0.6745 * (preco[comparavel] - mediana[comparavel]) / mad[comparavel]
+
+    atipicos = itens.assign(mediana=mediana, escore=np.round(escore, 2))
+    atipicos = atipicos[np.abs(escore) > limite]
+    return atipicos.reindex(
+        atipicos['escore'].abs().sort_values(ascending=False, kind='stable').index
+    )[colunas].reset_index(drop=True)
+
+
+def lojas_atipicas(historico, redes=None, inicio=None, fim=None, limite=LIMITE_ESCORE_ATIPICO):
+    """
+    Resumo por loja dos preços fora do padrão (precos_atipicos): quantos
+    preços atípicos, quantos acima da mediana e o escore mediano, das lojas
+    com mais ocorrências para as com menos.
+    """
+    atipicos = precos_atipicos(historico, redes, inicio, fim, limite=limite)
+    if atipicos.empty:
+        return pd.DataFrame(columns=['rede', 'nome_loja', 'atipicos', 'acima_mediana', 'escore_mediano'])
+
+    resumo = atipicos.groupby(['rede', 'nome_loja'], as_index=False).agg(
+        atipicos=('escore', 'size'),
+        acima_mediana=('escore', lambda escores: int((escores > 0).sum())),
+        escore_mediano=('escore', 'median')
+    )
+    return resumo.sort_values(['atipicos', 'escore_mediano'], ascending=False, ignore_index=True)
+
@@ -0,0 +1,804 @@
+"""
+Apurador de Investimentos - Núcleo de Cálculo
+
+Validação das planilhas, limpeza de valores monetários e apuração dos
+investimentos, sem dependência do Streamlit: recebe DataFrames e devolve o
+DataFrame de resultado com estatísticas e diagnósticos estruturados.
+Pode ser usado pela interface web, por scripts em lote e por benchmarks.
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from apurador_instrumentacao import INSTRUMENTACAO_DESATIVADA
+
+
+# Nomes aceitos (sem diferenciar maiúsculas) para a coluna de valor negociado, em ordem de preferência
+COLUNAS_VALOR_NEGOCIADO = ['VALOR NEGOCIADO REDE', 'VALOR NEGOCIADO', 'PRECO NEGOCIADO', 'PREÇO NEGOCIADO']
+
+# Colunas de totais acrescentadas ao final do resultado
+COLUNAS_TOTAIS = ['Verba Total', 'TT.Pedido', '% Investimento']
+
+# Colunas do relatório de itens de orçamento com EAN fora do Preço Final
+COLUNAS_FORA_PRECO = ['Orçamento', 'EAN', 'VALOR SKU PAGO', 'QUANTIDADE', 'Valor Pedido']
+
+
+@dataclass
+class Diagnostico:
+    """
+    Mensagem gerada durante a apuração.
+    nivel: 'erro', 'aviso' ou 'info'; tabela opcional com detalhes.
+    """
+    nivel: str
+    texto: str
+    tabela: Optional[pd.DataFrame] = None
+    titulo_tabela: str = ''
+
+
+@dataclass
+class ResultadoApuracao:
+    """
+    Resultado de processar_dados: DataFrame final, estatísticas por orçamento e diagnósticos.
+    No modo detalhado, `detalhes` guarda fatos de conferência (origem, detalhe,
+    valor) para exibir sob demanda em uma única tabela; fora dele fica vazio.
+    """
+    df_resultado: Optional[pd.DataFrame] = None
+    estatisticas: dict = field(default_factory=dict)
+    diagnosticos: list = field(default_factory=list)
+    eans_fora_preco: Optional[pd.DataFrame] = None
+    itens_fora_preco: Optional[pd.DataFrame] = None
+    detalhado: bool = False
+    detalhes: list = field(default_factory=list)
+
+    @property
+    def sucesso(self):
+        return self.df_resultado is not None
+
+    def registrar(self, nivel, texto, tabela=None, titulo_tabela=''):
+        self.diagnosticos.append(Diagnostico(nivel, texto, tabela, titulo_tabela))
+
+    def detalhar(self, origem, detalhe, valor):
+        """Guarda um fato de conferência (só no modo detalhado)"""
+        if self.detalhado:
+            self.detalhes.append((origem, detalhe, valor))
+
+    def tabela_detalhes(self):
+        """Detalhes de conferência em uma tabela (Origem, Detalhe, Valor)"""
+        return pd.DataFrame(
+            [(origem, detalhe, str(valor)) for origem, detalhe, valor in self.detalhes],
+            columns=['Origem', 'Detalhe', 'Valor']
+        )
+
+
+def _fora_preco_vazio():
+    """OrcamentoPreparado.fora_preco de um orçamento sem EANs fora do Preço Final"""
+    return pd.DataFrame({'EAN': [], 'VALOR SKU PAGO': [], 'QUANTIDADE': [], 'Valor Pedido': []})
+
+
+@dataclass
+class OrcamentoPreparado:
+    """
+    Orçamento já limpo, consolidado e alinhado aos produtos do Preço Final
+    (posição i = i-ésimo EAN do Preço Final). Depende só do arquivo do
+    orçamento e do Preço Final, por isso pode ser guardado entre apurações.
+    investimento/pedido: contribuição da loja por produto, em centavos
+    (float64, ver valor_em_centavos). fora_preco: itens do orçamento com EAN
+    fora do Preço Final (EAN, VALOR SKU PAGO, QUANTIDADE, Valor Pedido), um
+    por EAN.
+    Os campos de conferência (valores_validos, qtd_validas, primeiros_eans,
+    exemplo_valores) só são calculados no modo detalhado; fora dele ficam None.
+    """
+    preco: np.ndarray
+    quantidade: np.ndarray
+    presente: np.ndarray
+    investimento: np.ndarray
+    pedido: np.ndarray
+    linhas: int
+    eans_repetidos: int = 0
+    linhas_removidas: int = 0
+    valores_validos: Optional[int] = None
+    qtd_validas: Optional[int] = None
+    primeiros_eans: Optional[list] = None
+    exemplo_valores: Optional[list] = None
+    fora_preco: pd.DataFrame = field(default_factory=_fora_preco_vazio)
+
+
+@dataclass
+class IndiceEans:
+    """
+    Índice único dos EANs de uma apuração, montado uma vez a partir dos
+    orçamentos preparados: `eans` traz primeiro os produtos do Preço Final
+    (na ordem do resultado) e depois os EANs de orçamento fora dele;
+    `presencas` é o mapa de presença (lojas x eans, bool) de cada EAN em cada
+    loja. Filtro de produtos sem preço, encontrados por loja e relatório de
+    EANs fora do Preço Final saem dele, sem novas varreduras dos orçamentos.
+    """
+    eans: pd.Index
+    presencas: np.ndarray
+    produtos_preco: int
+
+    def presentes_no_preco(self):
+        """Máscara dos produtos do Preço Final pedidos por alguma loja"""
+        return self.presencas[:, :self.produtos_preco].any(axis=0)
+
+    def encontrados_por_loja(self):
+        """Quantos produtos do Preço Final cada loja pediu"""
+        return self.presencas[:, :self.produtos_preco].sum(axis=1)
+
+    def fora_do_preco(self, nomes_lojas):
+        """EANs de orçamento que não estão no Preço Final, com quantas e quais lojas os pediram"""
+        presencas = self.presencas[:, self.produtos_preco:]
+        lojas_por_ean = [np.flatnonzero(coluna) for coluna in presencas.T]
+        return pd.DataFrame({
+            'EAN': self.eans[self.produtos_preco:].to_numpy(),
+            'Lojas': presencas.sum(axis=0),
+            'Orçamentos': [', '.join(nomes_lojas[loja] for loja in lojas) for lojas in lojas_por_ean],
+        })
+
+
+def validar_colunas_preco_final(df):
+    """Valida se a planilha de preço final tem as colunas necessárias"""
+    # Aceita tanto "EAN" quanto "COD BARRAS"
+    tem_identificador = 'EAN' in df.columns or 'COD BARRAS' in df.columns
+    
+    if not tem_identificador:
+        return False, "A planilha deve conter a coluna 'EAN' ou 'COD BARRAS'"
+    
+    # Padronizar coluna para EAN
+    if 'COD BARRAS' in df.columns and 'EAN' not in df.columns:
+        df.rename(columns={'COD BARRAS': 'EAN'}, inplace=True)
+    
+    return True, "Planilha válida"
+
+
+def validar_colunas_orcamento(df):
+    """Valida se a planilha de orçamento tem as colunas necessárias"""
+    colunas_necessarias = ['EAN', 'VALOR SKU PAGO', 'QUANTIDADE']
+    colunas_faltando = [col for col in colunas_necessarias if col not in df.columns]
+    
+    if colunas_faltando:
+        return False, f"Colunas faltando: {', '.join(colunas_faltando)}"
+    
+    return True, "Planilha válida"
+
+
+def localizar_coluna_negociado(colunas):
+    """Retorna o nome da coluna de valor negociado entre `colunas` (ou None)"""
+    colunas_upper = {str(col).upper(): col for col in colunas}
+    for possivel_nome in COLUNAS_VALOR_NEGOCIADO:
+        if possivel_nome in colunas_upper:
+            return colunas_upper[possivel_nome]
+    return None
+
+
+def limpar_valor_monetario(valor):
+    """
+    Limpa valores monetários em formato brasileiro ou americano para conversão numérica
+    Exemplos: 
+    - 'R$ 1.234,56' -> 1234.56 (BR: ponto=milhar, vírgula=decimal)
+    - '1234,56' -> 1234.56 (BR: vírgula=decimal)
+    - '1234.56' -> 1234.56 (US: ponto=decimal)
+    - '20,68' -> 20.68 (BR: vírgula=decimal)
+    - '20.68' -> 20.68 (US: ponto=decimal, já está correto)
+    """
+    if pd.isna(valor):
+        return None
+    
+    # Converter para string
+    valor_str = str(valor).strip()
+    
+    # Remover símbolos de moeda e espaços
+    valor_str = valor_str.replace('R$', '').replace('r$', '').replace('$', '').strip()
+    
+    # Detectar formato:
+    # Se tem vírgula E ponto, verificar qual vem por último
+    tem_virgula = ',' in valor_str
+    tem_ponto = '.' in valor_str
+    
+    if tem_virgula and tem_ponto:
+        # Ambos presentes: o último é o separador decimal
+        pos_virgula = valor_str.rfind(',')
+        pos_ponto = valor_str.rfind('.')
+        
+        if pos_virgula > pos_ponto:
+            # Formato BR: 1.234,56 (ponto=milhar, vírgula=decimal)
+            valor_str = valor_str.replace('.', '').replace(',', '.')
+        else:
+            # Formato US: 1,234.56 (vírgula=milhar, ponto=decimal)
+            valor_str = valor_str.replace(',', '')
+    elif tem_virgula:
+        # Só vírgula: formato BR - vírgula é decimal
+        valor_str = valor_str.replace(',', '.')
+    # Se só tem ponto ou nenhum: já está no formato correto (US ou inteiro)
+    
+    # Converter para float
+    try:
+        return float(valor_str)
+    except:
+        return None
+
+
+def limpar_valores_monetarios(serie):
+    """
+    Versão vetorizada de limpar_valor_monetario para uma coluna inteira.
+    Segue as mesmas regras (R$, milhar e o último separador entre ',' e '.'
+    como decimal), mas trata a coluna com operações de string do NumPy em vez
+    de célula por célula. Células já numéricas não passam pela limpeza. Retorna uma Series float64 com NaN nos valores inválidos.
+    """
+    # Coluna já numérica: nada a limpar
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return serie.astype('float64')
+
+    # Separar células de texto das que já são numéricas
+    tipo = pd.api.types.infer_dtype(serie, skipna=True)
+    if tipo in ('floating', 'integer', 'mixed-integer-float', 'decimal'):
+        return pd.to_numeric(serie, errors='coerce').astype('float64')
+
+    valores = pd.Series(float('nan'), index=serie.index, dtype='float64')
+    if tipo in ('string', 'empty'):
+        eh_texto = serie.notna()
+    else:
+        eh_texto = serie.map(lambda v: isinstance(v, str))
+        # Booleanos não são valores monetários (limpar_valor_monetario devolve None)
+        eh_booleano = serie.map(lambda v: isinstance(v, (bool, np.bool_)))
+        numericos = serie.notna() & ~eh_texto & ~eh_booleano
+        if numericos.any():
+            valores[numericos] = pd.to_numeric(serie[numericos], errors='coerce')
+
+    if not eh_texto.any():
+        return valores
+
+    # Remover símbolos de moeda e espaços (operações de string do NumPy, sem laço Python)
+    texto = np.char.strip(serie[eh_texto].to_numpy(dtype=object).astype(str))
+    if (np.char.find(texto, '$') >= 0).any():
+        for simbolo in ('R$', 'r$', '$'):
+            texto = np.char.replace(texto, simbolo, '')
+        texto = np.char.strip(texto)
+
+    # O último separador presente é o decimal
+    pos_virgula = np.char.rfind(texto, ',')
+    pos_ponto = np.char.rfind(texto, '.')
+
+    # Vírgula por último (ou só vírgula): formato BR - ponto=milhar, vírgula=decimal
+    decimal_virgula = pos_virgula > pos_ponto
+    if decimal_virgula.any():
+        texto[decimal_virgula] = np.char.replace(
+            np.char.replace(texto[decimal_virgula], '.', ''), ',', '.'
+        )
+
+    # Ponto por último com vírgula presente: formato US - vírgula=milhar
+    milhar_virgula = (pos_ponto > pos_virgula) & (pos_virgula >= 0)
+    if milhar_virgula.any():
+        texto[milhar_virgula] = np.char.replace(texto[milhar_virgula], ',', '')
+
+    # Conversão direta; só recorre à conversão tolerante se houver texto inválido
+    try:
+        convertidos = texto.astype(object).astype('float64')
+    except ValueError:
+        convertidos = pd.to_numeric(pd.Series(texto, dtype=object), errors='coerce')
+        convertidos = convertidos.to_numpy(dtype='float64', copy=True)
+        # O que pd.to_numeric recusa (ex.: '1_000', dígitos não ASCII) passa pela
+        # versão célula a célula, para dar o mesmo resultado de limpar_valor_monetario
+        falhas = np.isnan(convertidos)
+        if falhas.any():
+            originais = serie[eh_texto].to_numpy(dtype=object)[falhas]
+            convertidos[falhas] = [
+                np.nan if (valor := limpar_valor_monetario(celula)) is None else valor for celula in originais
+            ]
+
+    valores[eh_texto] = convertidos
+    return valores
+
+
+def consolidar_eans_duplicados(df_longo):
+    """
+    Consolida EANs repetidos dentro de um mesmo orçamento (mesma loja).
+    A quantidade é somada e o preço vira a média ponderada pela quantidade,
+    o que preserva o investimento e o valor de pedido das linhas com preço
+    e quantidade válidos. Só os grupos com mais de uma linha são recalculados:
+    EANs únicos mantêm o preço original, sem o ruído de p * q / q.
+    Usa um único groupby por hash (sem ordenação), custo O(n).
+    Retorna (df_consolidado, {loja: (eans_repetidos, linhas_removidas)}).
+    """
+    repetidos = df_longo.duplicated(subset=['loja', 'EAN'], keep=False)
+    if not repetidos.any():
+        return df_longo, {}
+    
+    # Relatório do que foi consolidado por loja
+    df_repetidos = df_longo.loc[repetidos, ['loja', 'EAN']]
+    linhas = df_repetidos.groupby('loja', sort=False).size()
+    eans = df_repetidos.drop_duplicates().groupby('loja', sort=False).size()
+    relatorio = {int(loja): (int(eans[loja]), int(linhas[loja] - eans[loja])) for loja in linhas.index}
+    
+    # Posição da primeira ocorrência, para manter a ordem original do orçamento
+    colunas = ['EAN', 'VALOR SKU PAGO', 'QUANTIDADE', 'loja']
+    df_aux = df_longo.loc[repetidos, colunas].assign(POSICAO=np.flatnonzero(repetidos.to_numpy()))
+    
+    # Peso do preço: só linhas com preço e quantidade válidos
+    preco_valido = df_aux['VALOR SKU PAGO'].notna() & df_aux['QUANTIDADE'].notna()
+    df_aux = df_aux.assign(
+        VALOR_X_QTD=(df_aux['VALOR SKU PAGO'] * df_aux['QUANTIDADE']).where(preco_valido),
+        QTD_PESO=df_aux['QUANTIDADE'].where(preco_valido)
+    )
+    
+    agrupado = df_aux.groupby(['loja', 'EAN'], sort=False).agg(
+        POSICAO=('POSICAO', 'first'),
+        VALOR_X_QTD=('VALOR_X_QTD', 'sum'),
+        QTD_PESO=('QTD_PESO', 'sum'),
+        PRECO_MEDIO=('VALOR SKU PAGO', 'mean'),
+        QUANTIDADE=('QUANTIDADE', 'sum'),
+        QTD_INFORMADAS=('QUANTIDADE', 'count')
+    )
+    
+    # Sem nenhuma quantidade informada, a quantidade continua vazia (não zero)
+    agrupado['QUANTIDADE'] = agrupado['QUANTIDADE'].where(agrupado['QTD_INFORMADAS'] > 0)
+    
+    # Média ponderada; sem quantidade para ponderar, usa a média simples dos preços
+    agrupado['VALOR SKU PAGO'] = (agrupado['VALOR_X_QTD'] / agrupado['QTD_PESO']).where(
+        agrupado['QTD_PESO'] != 0, agrupado['PRECO_MEDIO']
+    )
+    
+    df_unicos = df_longo.loc[~repetidos, colunas].assign(POSICAO=np.flatnonzero(~repetidos.to_numpy()))
+    df_consolidado = (
+        pd.concat([df_unicos, agrupado.reset_index()[colunas + ['POSICAO']]], ignore_index=True)
+        .sort_values('POSICAO', kind='stable')
+        .drop(columns='POSICAO')
+        .reset_index(drop=True)
+    )
+    return df_consolidado, relatorio
+
+
+def para_centavos(valores):
+    """
+    Converte valores em reais para centavos int64, arredondando meio centavo
+    para cima (1,005 -> 101). NaN vira 0: use a máscara de válidos de quem chama.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    # Arredonda antes em 6 casas para que 1.005 * 100 (= 100.49999...) conte como meio centavo
+    absolutos = np.floor(np.round(np.abs(np.nan_to_num(valores)) * 100, 6) + 0.5)
+    return (np.sign(np.nan_to_num(valores)) * absolutos).astype(np.int64)
+
+
+def somar_reais(valores):
+    """Soma exata de valores em reais (já com 2 casas): acumula em centavos int64, ignora NaN"""
+    return int(para_centavos(valores).sum()) / 100
+
+
+def valor_em_centavos(precos, quantidades):
+    """
+    Preço x quantidade em centavos (float64), sem arredondar o preço. Preço
+    em centavos inteiros (1,23) entra como o inteiro exato (123): com
+    quantidade inteira o resultado é um inteiro exato (até 2**53 centavos)
+    e as somas continuam exatas. Preço com mais casas (1,234) entra como
+    está, em ponto flutuante. NaN continua NaN.
+    """
+    precos = np.asarray(precos, dtype=np.float64)
+    centavos = np.round(precos * 100)
+    return np.where(centavos / 100 == precos, centavos * quantidades, precos * quantidades * 100)
+
+
+def calcular_totais(df_longo):
+    """
+    Soma por EAN do Valor de Pedido (VALOR SKU PAGO x QUANTIDADE, em centavos,
+    ver valor_em_centavos) e das quantidades, só das linhas com preço e
+    quantidade válidos. Recebe as linhas originais do orçamento, antes da
+    consolidação: EANs repetidos somam linha a linha, não pelo preço médio.
+    Retorna DataFrame indexado por EAN com VALOR_PEDIDO e QTD_VALIDA; EANs
+    sem nenhuma linha válida não aparecem.
+    """
+    pago = df_longo['VALOR SKU PAGO'].to_numpy(dtype=np.float64)
+    quantidade = df_longo['QUANTIDADE'].to_numpy(dtype=np.float64)
+    valido = ~np.isnan(pago) & ~np.isnan(quantidade)
+    totais = pd.DataFrame(
+        {'VALOR_PEDIDO': valor_em_centavos(pago[valido], quantidade[valido]), 'QTD_VALIDA': quantidade[valido]},
+        index=pd.Index(df_longo['EAN'].to_numpy()[valido], name='EAN')
+    )
+    # Sem EAN repetido não há o que somar
+    return totais if totais.index.is_unique else totais.groupby(level='EAN', sort=False).sum()
+
+
+def calcular_investimento(pedido, qtd_valida, negociado):
+    """
+    Investimento em centavos ((VALOR SKU PAGO - negociado) x QUANTIDADE) a
+    partir do Valor de Pedido e da quantidade válida de calcular_totais:
+    pedido - negociado x quantidade. Sem valor negociado, 0.
+    """
+    negociado = np.asarray(negociado, dtype=np.float64)
+    return np.where(np.isnan(negociado), 0.0, pedido - valor_em_centavos(negociado, qtd_valida))
+
+
+def preparar_orcamento(df_orc, eans_preco, valor_negociado, instrumentacao=INSTRUMENTACAO_DESATIVADA,
+                       detalhado=False):
+    """
+    Limpa um orçamento e o alinha aos EANs do Preço Final (`eans_preco`, um
+    pd.Index sem repetições; `valor_negociado` na mesma ordem): preço e
+    quantidade por produto, EANs repetidos consolidados e contribuição da loja
+    para Verba Total e TT.Pedido. Com detalhado, calcula também os campos de
+    conferência. Retorna um OrcamentoPreparado.
+    """
+    with instrumentacao.etapa('limpeza_valores', linhas=len(df_orc)):
+        df_orc_temp = pd.DataFrame({
+            'EAN': df_orc['EAN'].astype(str).str.strip(),
+            'VALOR SKU PAGO': df_orc['VALOR SKU PAGO'],
+            'QUANTIDADE': df_orc['QUANTIDADE']
+        })
+        conferencia = {}
+        if detalhado:
+            conferencia['primeiros_eans'] = df_orc_temp['EAN'].head(3).tolist()
+            conferencia['exemplo_valores'] = df_orc_temp['VALOR SKU PAGO'].head(3).tolist()
+        
+        # Limpar e converter valores para numérico
+        df_orc_temp['VALOR SKU PAGO'] = limpar_valores_monetarios(df_orc_temp['VALOR SKU PAGO'])
+        df_orc_temp['QUANTIDADE'] = pd.to_numeric(df_orc_temp['QUANTIDADE'], errors='coerce')
+        if detalhado:
+            conferencia['valores_validos'] = int(df_orc_temp['VALOR SKU PAGO'].notna().sum())
+            conferencia['qtd_validas'] = int(df_orc_temp['QUANTIDADE'].notna().sum())
+    
+    with instrumentacao.etapa('juncao', linhas=len(df_orc_temp)) as etapa:
+        # Posição de cada linha no Preço Final (-1 = EAN fora dele); só as encontradas
+        # entram na apuração (equivale ao LEFT JOIN)
+        posicoes_linhas = eans_preco.get_indexer(df_orc_temp['EAN'])
+        no_preco = posicoes_linhas >= 0
+        df_longo = df_orc_temp[no_preco].assign(loja=1)
+        etapa.contar('encontradas', int(no_preco.sum()))
+        
+        # Anti-join: linhas com EAN fora do Preço Final (sem EAN não contam), consolidadas como as demais;
+        # o Valor Pedido vem das linhas originais
+        com_ean = df_orc['EAN'].notna().to_numpy() & (df_orc_temp['EAN'] != '').to_numpy()
+        df_fora = df_orc_temp[~no_preco & com_ean].assign(loja=1)
+        fora_preco = _fora_preco_vazio()
+        if len(df_fora):
+            totais_fora = calcular_totais(df_fora)
+            df_fora, _ = consolidar_eans_duplicados(df_fora)
+            fora_preco = df_fora[['EAN', 'VALOR SKU PAGO', 'QUANTIDADE']].reset_index(drop=True)
+            fora_preco['Valor Pedido'] = fora_preco['EAN'].map(totais_fora['VALOR_PEDIDO']) / 100
+        
+        # Contribuição da loja por EAN, das linhas originais (antes de consolidar)
+        totais = calcular_totais(df_longo).reindex(eans_preco, fill_value=0)
+        pedido = totais['VALOR_PEDIDO'].to_numpy(dtype=np.float64)
+        investimento = calcular_investimento(pedido, totais['QTD_VALIDA'].to_numpy(dtype=np.float64), valor_negociado)
+        
+        # Um EAN aparece no máximo uma vez por loja: linhas repetidas são consolidadas
+        df_longo, consolidados = consolidar_eans_duplicados(df_longo)
+        eans_repetidos, linhas_removidas = consolidados.get(1, (0, 0))
+        
+        # Alinhar preço e quantidade às posições dos produtos no Preço Final
+        posicoes = eans_preco.get_indexer(df_longo['EAN'])
+        presente = np.zeros(len(eans_preco), dtype=bool)
+        presente[posicoes_linhas[no_preco]] = True
+        preco = np.full(len(eans_preco), np.nan)
+        quantidade = np.full(len(eans_preco), np.nan)
+        preco[posicoes] = df_longo['VALOR SKU PAGO'].to_numpy(dtype=np.float64)
+        quantidade[posicoes] = df_longo['QUANTIDADE'].to_numpy(dtype=np.float64)
+    
+    return OrcamentoPreparado(
+        preco=preco,
+        quantidade=quantidade,
+        presente=presente,
+        investimento=investimento,
+        pedido=pedido,
+        linhas=len(df_orc_temp),
+        eans_repetidos=eans_repetidos,
+        linhas_removidas=linhas_removidas,
+        fora_preco=fora_preco,
+        **conferencia
+    )
+
+
+def tabela_itens_fora_preco(orcamentos, eans, valores_pagos, quantidades, valores_pedido):
+    """
+    Relatório dos itens de orçamento fora do Preço Final (colunas
+    COLUNAS_FORA_PRECO), a partir de arrays alinhados. Valor Pedido é o que
+    o item somaria ao TT.Pedido (VALOR SKU PAGO x QUANTIDADE das linhas
+    originais, em reais); fica vazio sem nenhuma linha com preço e quantidade.
+    """
+    return pd.DataFrame({
+        'Orçamento': np.asarray(orcamentos, dtype=object),
+        'EAN': np.asarray(eans, dtype=object),
+        'VALOR SKU PAGO': np.asarray(valores_pagos, dtype=np.float64),
+        'QUANTIDADE': np.asarray(quantidades, dtype=np.float64),
+        'Valor Pedido': np.asarray(valores_pedido, dtype=np.float64),
+    }, columns=COLUNAS_FORA_PRECO)
+
+
+def resumo_itens_fora_preco(itens):
+    """Por orçamento: EANs fora do Preço Final, quantidade e Valor Pedido somados (em centavos)"""
+    centavos = pd.Series(para_centavos(itens['Valor Pedido']), index=itens.index)
+    agrupado = itens.assign(centavos=centavos).groupby('Orçamento', sort=False).agg(
+        EANs=('EAN', 'size'), QUANTIDADE=('QUANTIDADE', 'sum'), centavos=('centavos', 'sum')
+    )
+    agrupado['Valor Pedido'] = agrupado.pop('centavos') / 100
+    return agrupado.reset_index()
+
+
+def indexar_eans(eans_preco, preparados):
+    """Monta o IndiceEans da apuração a partir dos EANs do Preço Final e dos orçamentos preparados"""
+    eans_fora = [preparado.fora_preco['EAN'].to_numpy(dtype=object) for preparado in preparados]
+    fora = pd.Index(np.concatenate(eans_fora) if eans_fora else [], dtype=object).unique()
+    eans = eans_preco.append(fora)
+    
+    presencas = np.zeros((len(preparados), len(eans)), dtype=bool)
+    for loja, preparado in enumerate(preparados):
+        presencas[loja, :len(eans_preco)] = preparado.presente
+        presencas[loja, len(eans_preco) + fora.get_indexer(eans_fora[loja])] = True
+    return IndiceEans(eans=eans, presencas=presencas, produtos_preco=len(eans_preco))
+
+
+def assinatura_preco_final(eans_preco, valor_negociado):
+    """Impressão digital (SHA-256) dos EANs e valores negociados, parte da chave dos orçamentos preparados"""
+    assinatura = hashlib.sha256(pd.util.hash_pandas_object(pd.Series(eans_preco), index=False).to_numpy().tobytes())
+    assinatura.update(np.asarray(valor_negociado, dtype=np.float64).tobytes())
+    return assinatura.hexdigest()
+
+
+def processar_dados(df_preco_final, orcamentos_dict, cache_orcamentos=None, instrumentacao=INSTRUMENTACAO_DESATIVADA,
+                    detalhado=False):
+    """
+    Processa os dados e calcula investimentos.
+    Recebe o Preço Final (já validado) e o dicionário {nome: DataFrame} dos
+    orçamentos, na ordem das lojas. Retorna um ResultadoApuracao; em caso de
+    erro, df_resultado é None e o motivo está nos diagnósticos.
+    cache_orcamentos: dicionário opcional mantido entre chamadas (ex.: no
+    session_state) com os orçamentos preparados, por hash do arquivo
+    (df.attrs['hash_arquivo']) e Preço Final. Com ele, incluir, trocar ou
+    remover um orçamento só recalcula aquele arquivo.
+    instrumentacao: Instrumentacao opcional que mede limpeza, junção por loja,
+    totais e montagem do resultado.
+    detalhado: guarda em resultado.detalhes os fatos de conferência (primeiros
+    EANs, valores válidos, memória...); desligado, as contas extras nem são feitas.
+    """
+    resultado = ResultadoApuracao(detalhado=detalhado)
+    
+    # Copiar dataframe de preço final
+    df_resultado = df_preco_final.copy()
+    
+    # Converter EAN para string e remover espaços
+    df_resultado['EAN'] = df_resultado['EAN'].astype(str).str.strip()
+    
+    # Verificar se existe coluna de valor negociado (case-insensitive)
+    coluna_valor_negociado = localizar_coluna_negociado(df_resultado.columns)
+    
+    if coluna_valor_negociado is None:
+        resultado.registrar('erro', "❌ Não foi encontrada coluna de valor negociado na planilha de Preço Final")
+        resultado.registrar('info', "💡 Colunas aceitas: 'VALOR NEGOCIADO REDE', 'VALOR NEGOCIADO', 'PRECO NEGOCIADO'")
+        return resultado
+    
+    # Converter valor negociado para numérico antes das comparações
+    with instrumentacao.etapa('limpeza_preco_final', linhas=len(df_resultado)):
+        df_resultado[coluna_valor_negociado] = limpar_valores_monetarios(df_resultado[coluna_valor_negociado])
+    
+    # EAN repetido no Preço Final multiplicaria linhas no resultado: mantém a primeira ocorrência
+    duplicados_preco = df_resultado['EAN'].duplicated()
+    if duplicados_preco.any():
+        eans_repetidos = df_resultado.loc[duplicados_preco, 'EAN'].unique()
+        
+        # Destacar EANs repetidos com valores negociados diferentes
+        repetidos = df_resultado[df_resultado['EAN'].isin(eans_repetidos)]
+        conflitos = repetidos.groupby('EAN', sort=False)[coluna_valor_negociado].nunique(dropna=False)
+        conflitos = conflitos[conflitos > 1]
+        
+        resultado.registrar(
+            'aviso',
+            f"⚠️ Preço Final: {len(eans_repetidos)} EAN(s) repetido(s) - mantida a primeira linha de cada "
+            f"({int(duplicados_preco.sum())} linha(s) descartada(s))",
+            tabela=(
+                repetidos[repetidos['EAN'].isin(conflitos.index)][['EAN', coluna_valor_negociado]].reset_index(drop=True)
+                if not conflitos.empty else None
+            ),
+            titulo_tabela=f"📋 {len(conflitos)} EAN(s) repetido(s) com valor negociado diferente"
+        )
+        
+        df_resultado = df_resultado[~duplicados_preco].reset_index(drop=True)
+    
+    # Preparar cada orçamento alinhado aos produtos do Preço Final; com cache,
+    # só os orçamentos novos (ou com Preço Final diferente) são recalculados
+    eans_preco = pd.Index(df_resultado['EAN'])
+    valor_negociado = df_resultado[coluna_valor_negociado].to_numpy(dtype=np.float64)
+    assinatura_preco = assinatura_preco_final(eans_preco, valor_negociado) if cache_orcamentos is not None else None
+    
+    nomes_orcamentos = list(orcamentos_dict.keys())
+    preparados = []
+    usados = {}
+    reaproveitados = 0
+    for loja, nome in enumerate(nomes_orcamentos, 1):
+        df_orc = orcamentos_dict[nome]
+        hash_arquivo = df_orc.attrs.get('hash_arquivo')
+        chave = (hash_arquivo, assinatura_preco) if (cache_orcamentos is not None and hash_arquivo) else None
+        
+        with instrumentacao.etapa('orcamento', loja=loja, linhas=len(df_orc)) as etapa:
+            preparado = cache_orcamentos.get(chave) if chave is not None else None
+            # Preparado sem os campos de conferência não serve ao modo detalhado
+            if preparado is None or (detalhado and preparado.valores_validos is None):
+                preparado = preparar_orcamento(df_orc, eans_preco, valor_negociado, instrumentacao, detalhado)
+            else:
+                reaproveitados += 1
+                etapa.contar('reaproveitado')
+        if chave is not None:
+            usados[chave] = preparado
+        preparados.append(preparado)
+    
+    # O cache fica só com os orçamentos desta apuração (removidos saem dele)
+    if cache_orcamentos is not None:
+        cache_orcamentos.clear()
+        cache_orcamentos.update(usados)
+        resultado.detalhar('Apuração', "♻️ Orçamentos reaproveitados da apuração anterior", f"{reaproveitados} de {len(nomes_orcamentos)}")
+    
+    # Um só índice de EANs para produtos sem preço, encontrados por loja e EANs fora do Preço Final
+    indice_eans = indexar_eans(eans_preco, preparados)
+    
+    # Detectar produtos sem preço entre os que estão em algum orçamento
+    df_no_orcamento = df_resultado[indice_eans.presentes_no_preco()]
+    sem_preco = df_no_orcamento[
+        df_no_orcamento[coluna_valor_negociado].isna() | (df_no_orcamento[coluna_valor_negociado] == 0)
+    ]
+    
+    if not sem_preco.empty:
+        col_produto = next((c for c in df_resultado.columns if 'produto' in c.lower() or 'descri' in c.lower()), None)
+        col_ean = 'EAN' if 'EAN' in df_resultado.columns else None
+        
+        colunas_exibir = []
+        if col_ean:
+            colunas_exibir.append(col_ean)
+        if col_produto:
+            colunas_exibir.append(col_produto)
+        colunas_exibir.append(coluna_valor_negociado)
+        
+        resultado.registrar(
+            'erro',
+            f"❌ **{len(sem_preco)} produto(s) presentes no orçamento estão sem preço negociado (zero ou vazio)**. Corrija antes de continuar.",
+            tabela=sem_preco[colunas_exibir].reset_index(drop=True),
+            titulo_tabela="📋 Ver lista de produtos sem preço"
+        )
+        return resultado
+    
+    for nome, preparado in zip(nomes_orcamentos, preparados):
+        # Conferência: EANs e valores originais do orçamento, e quantos valores válidos temos
+        if detalhado:
+            resultado.detalhar(nome, "🔍 Primeiros EANs", preparado.primeiros_eans)
+            resultado.detalhar(nome, "🔍 Exemplo VALOR SKU PAGO original", preparado.exemplo_valores)
+            resultado.detalhar(
+                nome, "📊 Valores SKU / quantidades válidos",
+                f"{preparado.valores_validos} / {preparado.qtd_validas} (de {preparado.linhas} linhas)"
+            )
+        
+        if preparado.eans_repetidos:
+            resultado.registrar(
+                'aviso',
+                f"⚠️ {nome}: {preparado.eans_repetidos} EAN(s) repetido(s) consolidado(s) "
+                f"({preparado.linhas_removidas} linha(s) a menos - quantidades somadas e preço médio ponderado)"
+            )
+    
+    # Verba Total e TT.Pedido: soma das contribuições das lojas em centavos (exata com centavos
+    # inteiros e quantidades inteiras); os reais só aparecem aqui
+    with instrumentacao.etapa('totais', linhas=len(df_resultado), lojas=len(preparados)):
+        verba_total = sum(preparado.investimento for preparado in preparados) / 100
+        tt_pedido = sum(preparado.pedido for preparado in preparados) / 100
+    
+    # Layout final: Preço/Qtd venda loja N intercalados, depois os totais
+    with instrumentacao.etapa('montagem_resultado', linhas=len(df_resultado)) as etapa:
+        colunas_lojas = {}
+        for idx, preparado in enumerate(preparados, 1):
+            colunas_lojas[f'Preço venda loja {idx}'] = preparado.preco
+            colunas_lojas[f'Qtd venda loja {idx}'] = preparado.quantidade
+        colunas_lojas['Verba Total'] = verba_total
+        colunas_lojas['TT.Pedido'] = tt_pedido
+        df_resultado = pd.concat([df_resultado, pd.DataFrame(colunas_lojas, index=df_resultado.index)], axis=1)
+        etapa.contar('colunas', df_resultado.shape[1])
+    
+    # Estatísticas de produtos encontrados por orçamento (para exibir no Streamlit)
+    estatisticas = {}
+    total_produtos = len(df_resultado)
+    encontrados = indice_eans.encontrados_por_loja()
+    for nome, preparado, produtos_encontrados in zip(nomes_orcamentos, preparados, encontrados.tolist()):
+        estatisticas[nome] = {
+            'encontrados': produtos_encontrados,
+            'total': total_produtos,
+            'eans_consolidados': preparado.eans_repetidos
+        }
+        
+        resultado.detalhar(nome, "✅ Produtos encontrados no Preço Final", f"{produtos_encontrados} de {total_produtos}")
+        
+        if produtos_encontrados == 0:
+            resultado.registrar('aviso', f"⚠️ Nenhum produto de '{nome}' foi encontrado no Preço Final. Verifique se os EANs são iguais!")
+    
+    # EANs pedidos nos orçamentos que não estão no Preço Final ficam fora da apuração
+    eans_fora_preco = indice_eans.fora_do_preco(nomes_orcamentos)
+    fora = [preparado.fora_preco for preparado in preparados]
+    itens_fora_preco = tabela_itens_fora_preco(
+        np.repeat(np.asarray(nomes_orcamentos, dtype=object), [len(df) for df in fora]),
+        np.concatenate([np.empty(0, dtype=object)] + [df['EAN'].to_numpy(dtype=object) for df in fora]),
+        np.concatenate([np.empty(0)] + [df['VALOR SKU PAGO'].to_numpy(dtype=np.float64) for df in fora]),
+        np.concatenate([np.empty(0)] + [df['QUANTIDADE'].to_numpy(dtype=np.float64) for df in fora]),
+        np.concatenate([np.empty(0)] + [df['Valor Pedido'].to_numpy(dtype=np.float64) for df in fora])
+    )
+    registrar_fora_preco(resultado, eans_fora_preco, itens_fora_preco)
+    
+    if detalhado:
+        resultado.detalhar('Preço Final', "🔍 Primeiros EANs", df_resultado['EAN'].head(3).tolist())
+    
+    # Calcular % Investimento (Verba Total / TT.Pedido * 100)
+    df_resultado['% Investimento'] = (
+        (df_resultado['Verba Total'] / df_resultado['TT.Pedido']) * 100
+    ).round(2)  # Arredondar para 2 casas decimais
+    
+    # Substituir inf e NaN por 0 (quando TT.Pedido = 0)
+    df_resultado['% Investimento'] = df_resultado['% Investimento'].replace([float('inf'), -float('inf')], 0).fillna(0)
+    
+    # Tipos compactos: o resultado fica em memória (session_state) enquanto a sessão durar
+    with instrumentacao.etapa('compactacao', linhas=len(df_resultado)):
+        memoria_antes = df_resultado.memory_usage(deep=True).sum() if detalhado else None
+        df_resultado = compactar_resultado(df_resultado)
+    if detalhado:
+        memoria_depois = df_resultado.memory_usage(deep=True).sum()
+        resultado.detalhar(
+            'Resultado', "🗜️ Memória do resultado", f"{memoria_antes / 1024:,.0f} KB → {memoria_depois / 1024:,.0f} KB"
+        )
+    
+    resultado.df_resultado = df_resultado
+    resultado.estatisticas = estatisticas
+    resultado.eans_fora_preco = eans_fora_preco
+    resultado.itens_fora_preco = itens_fora_preco
+    return resultado
+
+
+def registrar_fora_preco(resultado, eans_fora_preco, itens_fora_preco):
+    """Aviso dos EANs de orçamento fora do Preço Final, com o valor de pedido que ficou fora do TT.Pedido"""
+    if eans_fora_preco.empty:
+        return
+    resultado.registrar(
+        'aviso',
+        f"⚠️ {len(eans_fora_preco)} EAN(s) dos orçamentos não estão no Preço Final e ficaram fora da apuração "
+        f"(R$ {somar_reais(itens_fora_preco['Valor Pedido']):,.2f} em pedidos fora do TT.Pedido)",
+        tabela=eans_fora_preco,
+        titulo_tabela="📋 Ver EANs fora do Preço Final"
+    )
+
+
+def _precos_cabem_em_float32(valores):
+    """True se os preços têm no máximo 2 casas e voltam idênticos de float32 (NaN permitido)"""
+    preenchidos = valores[~np.isnan(valores)]
+    if not np.array_equal(preenchidos, np.round(preenchidos, 2)):
+        return False
+    return np.array_equal(np.round(preenchidos.astype(np.float32).astype(np.float64), 2), preenchidos)
+
+
+def compactar_resultado(df):
+    """
+    Converte as colunas por loja para tipos menores: quantidades inteiras em
+    Int32 (nulo = loja sem o produto) e preços em float32 quando têm no máximo
+    2 casas e a conversão é exata. Colunas de texto repetitivas (ex.: categoria)
+    viram category. EAN e totais não mudam. Use restaurar_tipos_exportacao
+    antes de exportar.
+    """
+    df = df.copy()
+    for coluna in df.columns:
+        serie = df[coluna]
+        if str(coluna).startswith('Qtd venda loja') and serie.dtype == np.float64:
+            valores = serie.to_numpy()
+            preenchidos = valores[~np.isnan(valores)]
+            if (np.array_equal(preenchidos, np.trunc(preenchidos))
+                    and (len(preenchidos) == 0 or np.abs(preenchidos).max() <= np.iinfo(np.int32).max)):
+                df[coluna] = serie.astype('Int32')
+        elif str(coluna).startswith('Preço venda loja') and serie.dtype == np.float64:
+            if _precos_cabem_em_float32(serie.to_numpy()):
+                df[coluna] = serie.astype(np.float32)
+        elif coluna != 'EAN' and pd.api.types.is_string_dtype(serie) and len(serie):
+            if serie.nunique() <= len(serie) // 2:
+                df[coluna] = serie.astype('category')
+    return df
+
+
+def restaurar_tipos_exportacao(df):
+    """Volta as colunas compactadas para float64/objeto; preços float32 voltam com 2 casas exatas"""
+    df = df.copy()
+    for coluna in df.columns:
+        serie = df[coluna]
+        if serie.dtype == np.float32:
+            df[coluna] = serie.astype(np.float64).round(2)
+        elif isinstance(serie.dtype, pd.CategoricalDtype):
+            df[coluna] = serie.astype(serie.cat.categories.dtype)
+    return df
@@ -0,0 +1,426 @@
+"""
+Apurador de Investimentos - Histórico de Apurações
+
+Guarda cada apuração processada (rede, data, preço e quantidade por EAN e
+loja, totais) em uma base local, para análises entre meses e para reabrir uma
+apuração sem reenviar as planilhas. Usa Parquet particionado por rede e mês
+quando há um motor Parquet instalado (pyarrow ou fastparquet) e SQLite
+(biblioteca padrão) caso contrário. Não depende do Streamlit.
+
+Tabelas:
+- apuracoes: uma linha por apuração (rede, data, lojas, totais)
+- produtos: uma linha por EAN de cada apuração (valor negociado e totais)
+- itens: uma linha por EAN e loja com preço/quantidade informados
+- resultado de cada apuração no layout do relatório, para reabrir inteiro
+"""
+
+import importlib.util
+import json
+import os
+import re
+import sqlite3
+import sys
+import uuid
+from contextlib import closing
+from datetime import date, datetime
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+from apurador_core import compactar_resultado, localizar_coluna_negociado, restaurar_tipos_exportacao, somar_reais
+
+
+def pasta_dados_usuario():
+    """Pasta de dados do aplicativo no perfil do usuário (fora da pasta do código)"""
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), 'AppData', 'Local')
+    elif sys.platform == 'darwin':
+        base = os.path.join(os.path.expanduser('~'), 'Library', 'Application Support')
+    else:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(base, 'apurador_investimentos')
+
+
+# Pasta padrão da base (pode ser trocada pela variável de ambiente APURADOR_HISTORICO)
+PASTA_HISTORICO = os.environ.get('APURADOR_HISTORICO') or os.path.join(pasta_dados_usuario(), 'historico')
+
+ARQUIVO_SQLITE = 'historico.sqlite'
+
+TABELAS = ['apuracoes', 'produtos', 'itens']
+
+# Esquema das tabelas (mesmas colunas nos dois formatos)
+COLUNAS_TABELAS = {
+    'apuracoes': {
+        'id_apuracao': 'TEXT PRIMARY KEY',
+        'rede': 'TEXT',
+        'data': 'TEXT',
+        'criado_em': 'TEXT',
+        'lojas': 'INTEGER',
+        'produtos': 'INTEGER',
+        'verba_total': 'REAL',
+        'tt_pedido': 'REAL',
+        'percentual': 'REAL',
+        'nomes_lojas': 'TEXT',
+    },
+    'produtos': {
+        'id_apuracao': 'TEXT',
+        'rede': 'TEXT',
+        'data': 'TEXT',
+        'ean': 'TEXT',
+        'valor_negociado': 'REAL',
+        'verba_total': 'REAL',
+        'tt_pedido': 'REAL',
+    },
+    'itens': {
+        'id_apuracao': 'TEXT',
+        'rede': 'TEXT',
+        'data': 'TEXT',
+        'ean': 'TEXT',
+        'loja': 'INTEGER',
+        'nome_loja': 'TEXT',
+        'preco': 'REAL',
+        'quantidade': 'REAL',
+    },
+}
+
+# Índices do SQLite: consultas filtram por EAN e por rede/período
+INDICES_SQLITE = {
+    'produtos': [('ean',), ('rede', 'data')],
+    'itens': [('ean',), ('rede', 'data')],
+}
+
+PADRAO_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def formato_historico():
+    """Retorna 'parquet' se houver motor Parquet instalado (pyarrow/fastparquet), senão 'sqlite'"""
+    for modulo in ('pyarrow', 'fastparquet'):
+        if importlib.util.find_spec(modulo) is not None:
+            return 'parquet'
+    return 'sqlite'
+
+
+def _data_iso(valor):
+    """Data como texto AAAA-MM-DD (aceita date, datetime ou texto)"""
+    if isinstance(valor, (date, datetime)):
+        return valor.strftime('%Y-%m-%d')
+    return str(valor)[:10]
+
+
+def _normalizar_filtros(redes=None, inicio=None, fim=None, eans=None):
+    """Filtros em formato único: listas de redes/EANs (texto) e datas AAAA-MM-DD"""
+    redes = [redes] if isinstance(redes, str) else (list(redes) if redes is not None else None)
+    eans = [eans] if isinstance(eans, str) else ([str(ean) for ean in eans] if eans is not None else None)
+    inicio = _data_iso(inicio) if inicio else None
+    fim = _data_iso(fim) if fim else None
+    return redes, inicio, fim, eans
+
+
+def _ler_arquivos_parquet(arquivos, colunas, eans=None):
+    """
+    Lê as colunas dos arquivos Parquet em uma única tabela. Com pyarrow, a
+    leitura é um único scan (multithread) com o filtro de EAN aplicado nos
+    arquivos; com fastparquet, arquivo a arquivo.
+    """
+    if importlib.util.find_spec('pyarrow') is not None:
+        import pyarrow.dataset as ds
+
+        filtro = ds.field('ean').isin(eans) if eans is not None else None
+        return ds.dataset(arquivos, format='parquet').to_table(columns=colunas, filter=filtro).to_pandas()
+
+    filtros = [('ean', 'in', eans)] if eans is not None else None
+    return pd.concat(
+        [pd.read_parquet(arquivo, columns=colunas, filters=filtros) for arquivo in arquivos],
+        ignore_index=True
+    )
+
+
+def tabelas_apuracao(df_resultado, rede, data_apuracao, nomes_lojas=None, id_apuracao=None):
+    """
+    Decompõe o resultado de processar_dados nas linhas das tabelas do
+    histórico. Retorna {'apuracoes': df, 'produtos': df, 'itens': df}.
+    """
+    id_apuracao = id_apuracao or uuid.uuid4().hex
+    data_texto = _data_iso(data_apuracao)
+    df = restaurar_tipos_exportacao(df_resultado)
+
+    n_lojas = sum(1 for coluna in df.columns if str(coluna).startswith('Qtd venda loja '))
+    nomes_lojas = list(nomes_lojas) if nomes_lojas else [f'Loja {idx}' for idx in range(1, n_lojas + 1)]
+
+    eans = df['EAN'].astype(str).to_numpy()
+    coluna_negociado = localizar_coluna_negociado(df.columns)
+    produtos = pd.DataFrame({
+        'id_apuracao': id_apuracao,
+        'rede': rede,
+        'data': data_texto,
+        'ean': eans,
+        'valor_negociado': df[coluna_negociado].to_numpy(dtype=np.float64) if coluna_negociado else np.nan,
+        'verba_total': df['Verba Total'].to_numpy(dtype=np.float64),
+        'tt_pedido': df['TT.Pedido'].to_numpy(dtype=np.float64),
+    })
+
+    # Formato longo: só as lojas com preço ou quantidade informados para o EAN
+    partes = []
+    for idx in range(1, n_lojas + 1):
+        preco = df[f'Preço venda loja {idx}'].to_numpy(dtype=np.float64)
+        quantidade = df[f'Qtd venda loja {idx}'].to_numpy(dtype=np.float64, na_value=np.nan)
+        informados = ~np.isnan(preco) | ~np.isnan(quantidade)
+        partes.append(pd.DataFrame({
+            'ean': eans[informados],
+            'loja': idx,
+            'nome_loja': nomes_lojas[idx - 1],
+            'preco': preco[informados],
+            'quantidade': quantidade[informados],
+        }))
+    itens = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=['ean', 'loja', 'nome_loja', 'preco', 'quantidade'])
+    itens.insert(0, 'id_apuracao', id_apuracao)
+    itens.insert(1, 'rede', rede)
+    itens.insert(2, 'data', data_texto)
+    itens['loja'] = itens['loja'].astype(np.int64)
+
+    verba_total = somar_reais(df['Verba Total'])
+    tt_pedido = somar_reais(df['TT.Pedido'])
+    apuracoes = pd.DataFrame([{
+        'id_apuracao': id_apuracao,
+        'rede': rede,
+        'data': data_texto,
+        'criado_em': datetime.now().isoformat(timespec='seconds'),
+        'lojas': n_lojas,
+        'produtos': len(df),
+        'verba_total': verba_total,
+        'tt_pedido': tt_pedido,
+        'percentual': round(verba_total / tt_pedido * 100, 2) if tt_pedido > 0 else 0.0,
+        'nomes_lojas': json.dumps(nomes_lojas, ensure_ascii=False),
+    }])
+
+    return {'apuracoes': apuracoes, 'produtos': produtos, 'itens': itens}
+
+
+class HistoricoApuracoes:
+    """
+    Base local de apurações em `pasta`. formato: 'parquet' ou 'sqlite'
+    (padrão: formato_historico()).
+    """
+
+    def __init__(self, pasta=PASTA_HISTORICO, formato=None):
+        self.pasta = pasta
+        self.formato = formato or formato_historico()
+        os.makedirs(pasta, exist_ok=True)
+        if self.formato == 'sqlite':
+            self._criar_esquema_sqlite()
+
+    # ---- SQLite ----
+
+    @property
+    def caminho_sqlite(self):
+        return os.path.join(self.pasta, ARQUIVO_SQLITE)
+
+    def _conectar(self):
+        return closing(sqlite3.connect(self.caminho_sqlite, timeout=30))
+
+    def _criar_esquema_sqlite(self):
+        with self._conectar() as con, con:
+            for tabela, colunas in COLUNAS_TABELAS.items():
+                definicao = ', '.join(f'{coluna} {tipo}' for coluna, tipo in colunas.items())
+                con.execute(f'CREATE TABLE IF NOT EXISTS {tabela} ({definicao})')
+            for tabela, indices in INDICES_SQLITE.items():
+                for colunas in indices:
+                    nome = f"idx_{tabela}_{'_'.join(colunas)}"
+                    con.execute(f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela} ({', '.join(colunas)})")
+
+    # ---- Parquet ----
+
+    def _arquivo_particao(self, tabela, rede, data_texto, id_apuracao):
+        """Arquivo de uma apuração na partição rede=<rede>/ano_mes=<AAAA-MM> da tabela"""
+        return os.path.join(
+            self.pasta, tabela, f'rede={quote(rede, safe="")}', f'ano_mes={data_texto[:7]}', f'{id_apuracao}.parquet'
+        )
+
+    def _arquivos_parquet(self, tabela, redes=None, inicio=None, fim=None, ids=None):
+        """Arquivos da tabela que podem ter linhas do filtro (poda pelas pastas de rede e mês e pelo id no nome)"""
+        base = os.path.join(self.pasta, tabela)
+        if not os.path.isdir(base):
+            return []
+        arquivos = []
+        for pasta_rede in sorted(os.listdir(base)):
+            rede = unquote(pasta_rede.partition('=')[2])
+            if redes is not None and rede not in redes:
+                continue
+            for pasta_mes in sorted(os.listdir(os.path.join(base, pasta_rede))):
+                ano_mes = pasta_mes.partition('=')[2]
+                if (inicio and ano_mes < inicio[:7]) or (fim and ano_mes > fim[:7]):
+                    continue
+                pasta = os.path.join(base, pasta_rede, pasta_mes)
+                arquivos.extend(
+                    os.path.join(pasta, nome) for nome in sorted(os.listdir(pasta))
+                    if nome.endswith('.parquet') and (ids is None or nome[:-len('.parquet')] in ids)
+                )
+        return arquivos
+
+    # ---- API ----
+
+    def salvar(self, df_resultado, rede, data_apuracao, nomes_lojas=None):
+        """Acrescenta uma apuração (resultado de processar_dados) à base. Retorna o id_apuracao"""
+        tabelas = tabelas_apuracao(df_resultado, rede, data_apuracao, nomes_lojas)
+        info = tabelas['apuracoes'].iloc[0]
+        id_apuracao, data_texto = info['id_apuracao'], info['data']
+
+        # Resultado no layout do relatório, para reabrir sem recalcular
+        df_layout = restaurar_tipos_exportacao(df_resultado)
+        df_layout.columns = [str(coluna) for coluna in df_layout.columns]
+
+        if self.formato == 'sqlite':
+            with self._conectar() as con, con:
+                for tabela in TABELAS:
+                    tabelas[tabela].to_sql(tabela, con, if_exists='append', index=False)
+                df_layout.to_sql(f'resultado_{id_apuracao}', con, index=False)
+            return id_apuracao
+
+        for tabela in ('produtos', 'itens'):
+            caminho = self._arquivo_particao(tabela, rede, data_texto, id_apuracao)
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            tabelas[tabela].to_parquet(caminho, index=False)
+
+        caminho_resultado = os.path.join(self.pasta, 'resultados', f'{id_apuracao}.parquet')
+        os.makedirs(os.path.dirname(caminho_resultado), exist_ok=True)
+        df_layout.to_parquet(caminho_resultado, index=False)
+
+        # Índice das apurações: um arquivo pequeno por apuração, como nas outras tabelas, para que
+        # gravações simultâneas não se sobrescrevam. Vai por último e com troca atômica: a
+        # apuração só aparece em listar() quando já está completa.
+        caminho_indice = self._arquivo_particao('apuracoes', rede, data_texto, id_apuracao)
+        os.makedirs(os.path.dirname(caminho_indice), exist_ok=True)
+        temporario = f'{caminho_indice}.tmp'
+        tabelas['apuracoes'].to_parquet(temporario, index=False)
+        os.replace(temporario, caminho_indice)
+        return id_apuracao
+
+    def versao(self):
+        """
+        Marca que muda a cada apuração gravada, sem ler o índice: data de
+        modificação do arquivo SQLite ou das pastas do índice Parquet (cada
+        apuração entra com uma troca de nome na pasta da sua rede e mês).
+        Serve de chave para guardar o resultado de listar() em cache.
+        """
+        if self.formato == 'sqlite':
+            return os.stat(self.caminho_sqlite).st_mtime_ns
+        base = os.path.join(self.pasta, 'apuracoes')
+        if not os.path.isdir(base):
+            return 0
+        return max(os.stat(pasta).st_mtime_ns for pasta, _, _ in os.walk(base))
+
+    def listar(self, rede=None):
+        """Apurações guardadas (mais recentes primeiro), opcionalmente de uma rede"""
+        if self.formato == 'sqlite':
+            consulta = 'SELECT * FROM apuracoes'
+            parametros = []
+            if rede is not None:
+                consulta += ' WHERE rede = ?'
+                parametros.append(rede)
+            with self._conectar() as con:
+                apuracoes = pd.read_sql_query(consulta, con, params=parametros)
+        else:
+            arquivos = self._arquivos_parquet('apuracoes', redes=[rede] if rede is not None else None)
+            if not arquivos:
+                return pd.DataFrame(columns=list(COLUNAS_TABELAS['apuracoes']))
+            apuracoes = _ler_arquivos_parquet(arquivos, list(COLUNAS_TABELAS['apuracoes']))
+        return apuracoes.sort_values(['data', 'criado_em'], ascending=False, ignore_index=True)
+
+    def carregar(self, id_apuracao):
+        """
+        Reabre uma apuração guardada. Retorna (df_resultado, info), com o
+        resultado no mesmo formato de processar_dados e info = linha de apuracoes.
+        """
+        if not PADRAO_ID.match(str(id_apuracao)):
+            raise ValueError(f"id de apuração inválido: {id_apuracao}")
+
+        apuracoes = self.listar()
+        encontradas = apuracoes[apuracoes['id_apuracao'] == id_apuracao]
+        if encontradas.empty:
+            raise KeyError(f"apuração {id_apuracao} não encontrada no histórico")
+        info = encontradas.iloc[0].to_dict()
+        info['nomes_lojas'] = json.loads(info['nomes_lojas'])
+
+        if self.formato == 'sqlite':
+            with self._conectar() as con:
+                df_resultado = pd.read_sql_query(f'SELECT * FROM "resultado_{id_apuracao}"', con)
+        else:
+            df_resultado = pd.read_parquet(os.path.join(self.pasta, 'resultados', f'{id_apuracao}.parquet'))
+
+        df_resultado['EAN'] = df_resultado['EAN'].astype(str)
+        return compactar_resultado(df_resultado), info
+
+    def filtros_sql(self, tabela, redes=None, inicio=None, fim=None, eans=None, ids=None):
+        """
+        Cláusula WHERE (texto com placeholders, vazio sem filtros) e parâmetros
+        para filtrar a tabela por rede(s), período (AAAA-MM-DD, inclusive),
+        EAN(s) e apurações (ids).
+        """
+        redes, inicio, fim, eans = _normalizar_filtros(redes, inicio, fim, eans)
+        condicoes, parametros = [], []
+        if ids is not None:
+            ids = list(ids)
+            condicoes.append(f"id_apuracao IN ({', '.join('?' * len(ids))})")
+            parametros.extend(ids)
+        if redes is not None:
+            condicoes.append(f"rede IN ({', '.join('?' * len(redes))})")
+            parametros.extend(redes)
+        if inicio:
+            condicoes.append('data >= ?')
+            parametros.append(inicio)
+        if fim:
+            condicoes.append('data <= ?')
+            parametros.append(fim)
+        if eans is not None and tabela != 'apuracoes':
+            condicoes.append(f"ean IN ({', '.join('?' * len(eans))})")
+            parametros.extend(eans)
+        return (' WHERE ' + ' AND '.join(condicoes)) if condicoes else '', parametros
+
+    def consultar_sql(self, consulta, parametros=()):
+        """Executa uma consulta na base SQLite e devolve um DataFrame (só no formato 'sqlite')"""
+        if self.formato != 'sqlite':
+            raise ValueError("consultas SQL só estão disponíveis no formato 'sqlite'")
+        with self._conectar() as con:
+            return pd.read_sql_query(consulta, con, params=list(parametros))
+
+    def ler(self, tabela, colunas=None, redes=None, inicio=None, fim=None, eans=None, ids=None):
+        """
+        Lê linhas da tabela ('apuracoes', 'produtos' ou 'itens') aplicando os
+        filtros na origem: rede(s), período (inicio/fim como AAAA-MM-DD,
+        inclusive), EAN(s) e apurações (ids). colunas: só as colunas pedidas.
+        """
+        if tabela not in COLUNAS_TABELAS:
+            raise ValueError(f"tabela desconhecida: {tabela}")
+        colunas = list(colunas) if colunas else list(COLUNAS_TABELAS[tabela])
+        invalidas = [coluna for coluna in colunas if coluna not in COLUNAS_TABELAS[tabela]]
+        if invalidas:
+            raise ValueError(f"colunas desconhecidas em {tabela}: {', '.join(invalidas)}")
+        redes, inicio, fim, eans = _normalizar_filtros(redes, inicio, fim, eans)
+
+        if self.formato == 'sqlite':
+            where, parametros = self.filtros_sql(tabela, redes, inicio, fim, eans, ids)
+            return self.consultar_sql(f"SELECT {', '.join(colunas)} FROM {tabela}{where}", parametros)
+
+        # Parquet: poda por pasta (rede/mês) e leitura só das colunas necessárias
+        if tabela == 'apuracoes':
+            df = self.listar()
+        else:
+            arquivos = self._arquivos_parquet(tabela, redes, inicio, fim, set(ids) if ids is not None else None)
+            if not arquivos:
+                return pd.DataFrame(columns=colunas)
+            filtros = [coluna for coluna in ('rede', 'data', 'ean') if coluna not in colunas]
+            df = _ler_arquivos_parquet(arquivos, colunas + filtros, eans)
+
+        mascara = pd.Series(True, index=df.index)
+        if redes is not None:
+            mascara &= df['rede'].isin(redes)
+        if inicio:
+            mascara &= df['data'] >= inicio
+        if fim:
+            mascara &= df['data'] <= fim
+        if eans is not None and tabela != 'apuracoes':
+            mascara &= df['ean'].isin(eans)
+        if ids is not None and tabela == 'apuracoes':
+            mascara &= df['id_apuracao'].isin(list(ids))
+        return df.loc[mascara, colunas].reset_index(drop=True)
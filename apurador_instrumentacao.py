@@ -0,0 +1,192 @@
+"""
+Apurador de Investimentos - Instrumentação de Desempenho
+
+Medição leve das etapas da apuração (leitura, validação, limpeza dos
+valores, junção por loja, totais, exportação): cada etapa é um bloco `with`
+que registra duração, contadores (linhas, arquivos, células...) e o quanto o
+pico de memória residente (RSS) do processo cresceu durante a etapa. Etapas
+podem ser aninhadas. Cada etapa concluída vira uma linha de log JSON no
+logger 'apurador.desempenho'.
+
+Desligada (INSTRUMENTACAO_DESATIVADA, o padrão das funções que aceitam
+`instrumentacao`), cada etapa é só uma chamada que devolve um objeto
+compartilhado sem efeito. Não depende do Streamlit.
+
+Uso:
+    instrumentacao = Instrumentacao(rede='REDE ABC')
+    with instrumentacao.etapa('leitura', arquivos=3) as etapa:
+        ...
+        etapa.contar('linhas', len(df))
+    instrumentacao.tabela()
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+LOGGER = logging.getLogger('apurador.desempenho')
+
+# Arquivo de log JSON (uma linha por etapa) definido por variável de ambiente
+VARIAVEL_LOG = 'APURADOR_LOG_DESEMPENHO'
+
+
+def pico_rss_mb():
+    """Pico de memória residente do processo até agora (MB), ou None se indisponível"""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return pico / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def configurar_log_json(caminho=None):
+    """
+    Grava os logs de desempenho em `caminho` (padrão: variável
+    APURADOR_LOG_DESEMPENHO), uma linha JSON por etapa. Sem caminho não faz
+    nada; chamar de novo com o mesmo arquivo não duplica as linhas.
+    """
+    caminho = caminho or os.environ.get(VARIAVEL_LOG)
+    if not caminho:
+        return None
+    caminho = os.path.abspath(caminho)
+    for handler in LOGGER.handlers:
+        if isinstance(handler, logging.FileHandler) and handler.baseFilename == caminho:
+            return handler
+
+    handler = logging.FileHandler(caminho, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    LOGGER.addHandler(handler)
+    LOGGER.setLevel(logging.INFO)
+    return handler
+
+
+class Etapa:
+    """Etapa medida: bloco `with` que registra duração, contadores e crescimento do pico de RSS"""
+
+    __slots__ = ('instrumentacao', 'registro', '_inicio', '_pico_inicio')
+
+    def __init__(self, instrumentacao, nome, contadores):
+        self.instrumentacao = instrumentacao
+        self.registro = {'etapa': nome, 'contadores': dict(contadores)}
+
+    def contar(self, nome, valor=1):
+        """Soma `valor` ao contador `nome` da etapa"""
+        contadores = self.registro['contadores']
+        contadores[nome] = contadores.get(nome, 0) + valor
+
+    def __enter__(self):
+        instrumentacao = self.instrumentacao
+        pilha = instrumentacao.pilha
+        self.registro['pai'] = pilha[-1].registro['etapa'] if pilha else None
+        self.registro['nivel'] = len(pilha)
+        pilha.append(self)
+        # Registro entra na lista ao começar: a tabela fica na ordem de início
+        instrumentacao.registros.append(self.registro)
+        self._pico_inicio = pico_rss_mb()
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo_erro, erro, traceback):
+        fim = time.perf_counter()
+        pico_fim = pico_rss_mb()
+        instrumentacao = self.instrumentacao
+        instrumentacao.pilha.pop()
+
+        registro = self.registro
+        registro['inicio_ms'] = round((self._inicio - instrumentacao.inicio) * 1000, 2)
+        registro['duracao_ms'] = round((fim - self._inicio) * 1000, 2)
+        registro['pico_rss_mb'] = None if pico_fim is None else round(pico_fim, 1)
+        registro['delta_pico_rss_mb'] = None if pico_fim is None else round(pico_fim - self._pico_inicio, 1)
+        registro['erro'] = tipo_erro.__name__ if tipo_erro is not None else None
+        instrumentacao.emitir(registro)
+        return False
+
+
+class _EtapaInativa:
+    """Etapa sem efeito usada quando a instrumentação está desligada"""
+
+    __slots__ = ()
+
+    def contar(self, nome, valor=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_erro, erro, traceback):
+        return False
+
+
+_ETAPA_INATIVA = _EtapaInativa()
+
+
+class Instrumentacao:
+    """
+    Coleta as etapas de uma execução (uma apuração, uma exportação...).
+    `contexto` (ex.: rede=...) vai junto em cada linha de log, com o id da
+    execução, para agrupar as etapas de uma mesma apuração.
+    """
+
+    ativa = True
+
+    def __init__(self, emitir_log=True, **contexto):
+        self.id_execucao = uuid.uuid4().hex[:12]
+        self.contexto = contexto
+        self.emitir_log = emitir_log
+        self.registros = []
+        self.pilha = []
+        self.inicio = time.perf_counter()
+
+    def etapa(self, nome, **contadores):
+        """Bloco `with` medindo a etapa `nome`; contadores iniciais como argumentos nomeados"""
+        return Etapa(self, nome, contadores)
+
+    def emitir(self, registro):
+        """Escreve a etapa concluída no log JSON (se houver quem escute o logger)"""
+        if self.emitir_log and LOGGER.isEnabledFor(logging.INFO):
+            LOGGER.info(json.dumps(
+                {'execucao': self.id_execucao, **self.contexto, **registro},
+                ensure_ascii=False, default=str
+            ))
+
+    def tabela(self):
+        """Etapas em ordem de início, com recuo pelo aninhamento, para exibição"""
+        linhas = []
+        for registro in self.registros:
+            contadores = registro['contadores']
+            linhas.append({
+                'Etapa': '    ' * registro['nivel'] + registro['etapa'],
+                'Tempo (ms)': registro.get('duracao_ms'),
+                'Linhas': contadores.get('linhas'),
+                'Δ pico RSS (MB)': registro.get('delta_pico_rss_mb'),
+                'Contadores': ', '.join(
+                    f'{nome}={valor}' for nome, valor in contadores.items() if nome != 'linhas'
+                ),
+            })
+        df = pd.DataFrame(linhas, columns=['Etapa', 'Tempo (ms)', 'Linhas', 'Δ pico RSS (MB)', 'Contadores'])
+        df['Linhas'] = df['Linhas'].astype('Int64')
+        return df
+
+
+class _InstrumentacaoDesativada:
+    """Instrumentação desligada: etapas sem custo além da chamada"""
+
+    ativa = False
+    registros = ()
+
+    def etapa(self, nome, **contadores):
+        return _ETAPA_INATIVA
+
+
+INSTRUMENTACAO_DESATIVADA = _InstrumentacaoDesativada()
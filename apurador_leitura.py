@@ -0,0 +1,247 @@
+"""
+Apurador de Investimentos - Leitura de Planilhas
+
+Camada de leitura das planilhas Excel (Preço Final e orçamentos Reppos),
+independente do Streamlit. Usa o motor calamine quando o pacote
+python-calamine está instalado (bem mais rápido) e cai para o motor padrão
+do pandas (openpyxl/xlrd) caso contrário. Dos orçamentos são lidas apenas
+as colunas usadas na apuração, com o EAN já como texto, e a linha do
+cabeçalho é localizada automaticamente. Preços Finais muito grandes podem
+ser lidos em blocos de linhas (ler_preco_final_em_blocos), sem montar o
+DataFrame inteiro.
+"""
+
+import hashlib
+import importlib.util
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import openpyxl
+import pandas as pd
+
+
+# Colunas usadas dos orçamentos Reppos
+COLUNAS_ORCAMENTO = ['EAN', 'VALOR SKU PAGO', 'QUANTIDADE']
+
+# Cabeçalho dos orçamentos Reppos na linha 10 (header=9 porque é 0-indexed)
+# Usado quando a detecção automática não encontra o cabeçalho
+LINHA_CABECALHO_ORCAMENTO = 9
+
+# Quantas linhas do topo são examinadas na busca pelo cabeçalho
+MAX_LINHAS_BUSCA_CABECALHO = 50
+
+# Colunas de identificação lidas como texto (evita 7.89e+12 e zeros perdidos)
+COLUNAS_EAN = {'EAN': str, 'COD BARRAS': str}
+
+# Limite de processos para leitura paralela de orçamentos
+MAX_PROCESSOS_LEITURA = 8
+
+# Abaixo desse volume total o custo de subir os processos não compensa
+MIN_BYTES_LEITURA_PARALELA = 2 * 1024 * 1024
+
+# Linhas por bloco na leitura do Preço Final em blocos
+TAMANHO_BLOCO = 20_000
+
+
+def motor_excel():
+    """Retorna o motor do pd.read_excel: 'calamine' se instalado, senão None (padrão do pandas)"""
+    if importlib.util.find_spec('python_calamine') is not None:
+        return 'calamine'
+    return None
+
+
+def ler_preco_final(conteudo, header=0, sheet_name=0, motor=None):
+    """Lê a planilha de Preço Final completa (todas as colunas vão para o relatório)"""
+    return pd.read_excel(
+        BytesIO(conteudo),
+        header=header,
+        sheet_name=sheet_name,
+        dtype=COLUNAS_EAN,
+        engine=motor or motor_excel()
+    )
+
+
+def _linhas_planilha(conteudo, motor=None):
+    """Linhas (tuplas de valores) da primeira aba, uma a uma, sem carregar a planilha inteira"""
+    if (motor or motor_excel()) == 'calamine':
+        from python_calamine import CalamineWorkbook
+
+        planilha = CalamineWorkbook.from_filelike(BytesIO(conteudo)).get_sheet_by_index(0)
+        # calamine devolve '' nas células vazias
+        for linha in planilha.iter_rows():
+            yield tuple(None if valor == '' else valor for valor in linha)
+        return
+
+    wb = openpyxl.load_workbook(BytesIO(conteudo), read_only=True, data_only=True)
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _converter_celula(valor):
+    """Número inteiro guardado como float vira int, como no pd.read_excel"""
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def _nomes_colunas(cabecalho):
+    """Nomes das colunas como o pandas daria: vazias viram 'Unnamed: i', repetidas ganham '.1', '.2'..."""
+    nomes = []
+    vistos = {}
+    for i, valor in enumerate(cabecalho):
+        nome = f'Unnamed: {i}' if valor is None else valor
+        if nome in vistos:
+            vistos[nome] += 1
+            nome = f'{nome}.{vistos[nome]}'
+        else:
+            vistos[nome] = 0
+        nomes.append(nome)
+    return nomes
+
+
+def ler_preco_final_em_blocos(conteudo, tamanho_bloco=TAMANHO_BLOCO, header=0, motor=None):
+    """
+    Lê o Preço Final em blocos de até `tamanho_bloco` linhas, para planilhas
+    grandes demais para carregar de uma vez. Gera DataFrames com as mesmas
+    colunas e tipos de ler_preco_final (EAN/COD BARRAS como texto, linhas
+    vazias ignoradas); a memória usada depende do tamanho do bloco.
+    """
+    linhas = _linhas_planilha(conteudo, motor)
+    for _ in range(header):
+        next(linhas, None)
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        return
+    colunas = _nomes_colunas(cabecalho)
+    colunas_ean = [i for i, coluna in enumerate(colunas) if coluna in COLUNAS_EAN]
+
+    def montar_bloco(registros):
+        df = pd.DataFrame.from_records(registros, columns=colunas)
+        for i in colunas_ean:
+            df[colunas[i]] = pd.Series(
+                [None if valor is None else str(valor) for valor in df.iloc[:, i].tolist()], dtype=object
+            )
+        return df
+
+    registros = []
+    for linha in linhas:
+        if all(valor is None for valor in linha):
+            continue
+        registros.append([_converter_celula(valor) for valor in linha[:len(colunas)]])
+        if len(registros) >= tamanho_bloco:
+            yield montar_bloco(registros)
+            registros = []
+    if registros:
+        yield montar_bloco(registros)
+
+
+def _procurar_cabecalho(conteudo, colunas=COLUNAS_ORCAMENTO, max_linhas=MAX_LINHAS_BUSCA_CABECALHO,
+                        linha_cabecalho=None, aba=0):
+    """
+    Percorre em streaming as primeiras linhas da aba e devolve (índice,
+    valores) da linha `linha_cabecalho` ou, sem ela, da primeira entre as
+    `max_linhas` iniciais que contém todas as `colunas`. Os valores são os
+    textos originais do cabeçalho (ex.: 'EAN ' com espaço).
+    Devolve (None, None) se não achar ou se o formato não for suportado.
+    """
+    try:
+        wb = openpyxl.load_workbook(BytesIO(conteudo), read_only=True, data_only=True)
+    except Exception:
+        # Formato não suportado pelo openpyxl (ex.: .xls)
+        return None, None
+
+    try:
+        ws = wb.worksheets[aba] if isinstance(aba, int) else wb[aba]
+        limite = max_linhas if linha_cabecalho is None else linha_cabecalho + 1
+        for indice, linha in enumerate(ws.iter_rows(max_row=limite, values_only=True)):
+            if linha_cabecalho is not None:
+                if indice == linha_cabecalho:
+                    return indice, linha
+                continue
+            valores = {str(valor).strip() for valor in linha if valor is not None}
+            if all(coluna in valores for coluna in colunas):
+                return indice, linha
+        return None, None
+    except (IndexError, KeyError):
+        return None, None
+    finally:
+        wb.close()
+
+
+def detectar_linha_cabecalho(conteudo, colunas=COLUNAS_ORCAMENTO, max_linhas=MAX_LINHAS_BUSCA_CABECALHO):
+    """
+    Procura nas primeiras `max_linhas` da primeira aba a linha que contém todas
+    as `colunas`. O arquivo é aberto em modo somente leitura (streaming) e a
+    varredura para no limite, sem carregar a planilha inteira.
+    Retorna o índice da linha (0-indexed, como o header do pandas) ou None.
+    """
+    return _procurar_cabecalho(conteudo, colunas, max_linhas)[0]
+
+
+def ler_orcamento(conteudo, header='auto', sheet_name=0, motor=None):
+    """
+    Lê de um orçamento Reppos apenas as colunas EAN, VALOR SKU PAGO e QUANTIDADE.
+    Com header='auto' a linha do cabeçalho é detectada (padrão: linha 10);
+    a linha usada fica em df.attrs['linha_cabecalho'] (1-indexed, como no Excel)
+    e o SHA-256 do arquivo em df.attrs['hash_arquivo'].
+    """
+    cabecalho = None
+    if header == 'auto':
+        header, cabecalho = _procurar_cabecalho(conteudo, aba=sheet_name)
+        if header is None:
+            header = LINHA_CABECALHO_ORCAMENTO
+    if cabecalho is None:
+        _, cabecalho = _procurar_cabecalho(conteudo, linha_cabecalho=header, aba=sheet_name)
+
+    # O dtype casa com o texto exato do cabeçalho: com 'EAN ' (espaço) e dtype={'EAN': str}
+    # o EAN viria como número ('7890000000001.0')
+    colunas_ean = {coluna for coluna in cabecalho or () if coluna is not None and str(coluna).strip() == 'EAN'}
+
+    df = pd.read_excel(
+        BytesIO(conteudo),
+        header=header,
+        sheet_name=sheet_name,
+        usecols=lambda coluna: str(coluna).strip() in COLUNAS_ORCAMENTO,
+        dtype={coluna: str for coluna in colunas_ean | {'EAN'}},
+        engine=motor or motor_excel()
+    )
+    df.columns = [str(coluna).strip() for coluna in df.columns]
+    df.attrs['linha_cabecalho'] = header + 1
+    df.attrs['hash_arquivo'] = hashlib.sha256(conteudo).hexdigest()
+    return df
+
+
+def _ler_orcamento_protegido(conteudo, opcoes_leitura):
+    """Lê um orçamento devolvendo a exceção em vez de propagá-la (erro por arquivo)"""
+    try:
+        return ler_orcamento(conteudo, **opcoes_leitura)
+    except Exception as e:
+        return e
+
+
+def ler_orcamentos_em_paralelo(conteudos, max_processos=None, **opcoes_leitura):
+    """
+    Lê vários orçamentos em um pool de processos (a leitura de xlsx é limitada
+    por CPU). Retorna uma lista na mesma ordem de `conteudos`, com o DataFrame
+    lido ou a exceção levantada na leitura daquele arquivo.
+    """
+    if max_processos is None:
+        max_processos = min(os.cpu_count() or 1, MAX_PROCESSOS_LEITURA)
+    processos = min(max_processos, len(conteudos))
+
+    # Poucos arquivos ou arquivos pequenos: lê no próprio processo
+    if processos <= 1 or sum(len(c) for c in conteudos) < MIN_BYTES_LEITURA_PARALELA:
+        return [_ler_orcamento_protegido(conteudo, opcoes_leitura) for conteudo in conteudos]
+
+    # spawn: o servidor do Streamlit tem várias threads, fork não é seguro
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=processos, mp_context=contexto) as executor:
+        return list(executor.map(
+            _ler_orcamento_protegido,
+            conteudos,
+            [opcoes_leitura] * len(conteudos)
+        ))
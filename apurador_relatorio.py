@@ -0,0 +1,368 @@
+"""
+Apurador de Investimentos - Relatório Excel
+
+Geração do relatório Excel formatado (resumo, cores e formatos de moeda e
+percentual) a partir do DataFrame de resultado, com uma aba extra para os
+itens de orçamento fora do Preço Final. Não depende do Streamlit.
+
+A planilha é escrita em modo write-only do openpyxl: as linhas são geradas
+uma única vez, já com estilo, e vão direto para o arquivo. Formatos, cores e
+larguras são definidos antes a partir do DataFrame, sem reler a planilha.
+"""
+
+import io
+import math
+from datetime import datetime
+
+import numpy as np
+import openpyxl
+import openpyxl.styles
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import NamedStyle, PatternFill
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.utils import get_column_letter
+
+from apurador_core import COLUNAS_TOTAIS, localizar_coluna_negociado, restaurar_tipos_exportacao, somar_reais
+from apurador_instrumentacao import INSTRUMENTACAO_DESATIVADA
+
+
+# Layout: linhas 1-3 resumo, linha 4 vazia, linha 5 cabeçalho, dados a partir da linha 6
+LINHA_CABECALHO = 5
+
+ABA_FORA_PRECO = 'Fora do Preço Final'
+
+FORMATO_MOEDA = 'R$ #,##0.00'
+FORMATO_PERCENTUAL = '0.00"%"'
+
+LARGURA_MAXIMA = 50
+
+# Acima desse número de linhas a largura é estimada por amostra (quantil)
+LINHAS_AMOSTRA_LARGURA = 100_000
+QUANTIL_LARGURA = 0.99
+
+# Linhas convertidas para listas Python de cada vez ao escrever os dados
+LINHAS_POR_FATIA = 5_000
+
+# Cores
+COR_CABECALHO = PatternFill(start_color='1F3864', end_color='1F3864', fill_type='solid')  # Azul escuro
+COR_DADOS_AZUL = PatternFill(start_color='D9E2F3', end_color='D9E2F3', fill_type='solid')  # Azul claro
+COR_DADOS_VERDE = PatternFill(start_color='C6E0B4', end_color='C6E0B4', fill_type='solid')  # Verde claro
+COR_ORCAMENTOS = PatternFill(start_color='FEF2CB', end_color='FEF2CB', fill_type='solid')  # Bege claro
+COR_RESUMO_PRETO = PatternFill(start_color='000000', end_color='000000', fill_type='solid')  # Preto
+COR_RESUMO_AMARELO = PatternFill(start_color='FFFF00', end_color='FFFF00', fill_type='solid')  # Amarelo
+COR_RESUMO_VERDE = PatternFill(start_color='92D050', end_color='92D050', fill_type='solid')  # Verde
+
+FONTE_TITULO = openpyxl.styles.Font(size=11, bold=True)
+FONTE_DESTAQUE = openpyxl.styles.Font(bold=True, color='FFFFFF')
+
+# Cor das células de dados por papel da coluna (totais ficam sem cor)
+CORES_PAPEIS = {
+    'base': COR_DADOS_AZUL,
+    'negociado': COR_DADOS_VERDE,
+    'loja': COR_ORCAMENTOS,
+}
+
+
+def _celula(ws, valor=None, fonte=None, preenchimento=None, formato=None, estilo=None):
+    """Cria uma célula write-only com o estilo informado (estilo: nome de um NamedStyle)"""
+    celula = WriteOnlyCell(ws, value=valor)
+    if estilo is not None:
+        celula.style = estilo
+    if fonte is not None:
+        celula.font = fonte
+    if preenchimento is not None:
+        celula.fill = preenchimento
+    if formato is not None:
+        celula.number_format = formato
+    return celula
+
+
+def _valores_coluna(serie):
+    """Valores da coluna como objetos Python, com NaN como célula vazia (igual ao to_excel)"""
+    valores = serie.astype(object).where(serie.notna(), None).tolist()
+    for i, valor in enumerate(valores):
+        if isinstance(valor, float) and math.isinf(valor):
+            valores[i] = 'inf' if valor > 0 else '-inf'
+    return valores
+
+
+def _comprimentos_texto(serie):
+    """
+    Comprimentos distintos do texto das células da coluna e quantas células
+    têm cada um. Colunas numéricas são reduzidas aos valores distintos antes
+    de virar texto; células vazias contam como 'None' (4 caracteres).
+    """
+    valores = serie.to_numpy()
+    if valores.dtype.kind in 'biuf':
+        nulos = np.isnan(valores) if valores.dtype.kind == 'f' else np.zeros(len(valores), dtype=bool)
+        distintos, contagens = np.unique(valores[~nulos], return_counts=True)
+        comprimentos = np.array([len(str(valor)) for valor in distintos.tolist()], dtype=np.int64)
+        total_nulos = int(nulos.sum())
+    else:
+        textos = serie.astype(str).str.len()
+        total_nulos = int(textos.isna().sum())
+        comprimentos, contagens = np.unique(textos.dropna().to_numpy(dtype=np.int64), return_counts=True)
+
+    if total_nulos:
+        comprimentos = np.append(comprimentos, len('None'))
+        contagens = np.append(contagens, total_nulos)
+    return comprimentos, contagens
+
+
+def _quantil_ponderado(comprimentos, contagens, quantil):
+    """Quantil dos comprimentos considerando quantas células têm cada um (1.0 = máximo)"""
+    ordem = np.argsort(comprimentos, kind='stable')
+    acumulado = np.cumsum(contagens[ordem])
+    posicao = np.searchsorted(acumulado, quantil * acumulado[-1])
+    return int(comprimentos[ordem][min(posicao, len(ordem) - 1)])
+
+
+def maiores_textos_colunas(df, linhas_amostra=LINHAS_AMOSTRA_LARGURA):
+    """
+    Maior texto de cada coluna (cabeçalho e dados; célula vazia conta como
+    'None', como no ajuste original), calculado a partir do DataFrame, sem
+    percorrer células. Em resultados com mais de `linhas_amostra` linhas
+    usa-se uma amostra e o quantil QUANTIL_LARGURA, para que poucos textos
+    longos não alarguem a coluna (linhas_amostra=0: sempre o máximo exato).
+    """
+    amostrado = bool(linhas_amostra) and len(df) > linhas_amostra
+    if amostrado:
+        posicoes = np.random.default_rng(0).choice(len(df), size=linhas_amostra, replace=False)
+    quantil = QUANTIL_LARGURA if amostrado else 1.0
+
+    maiores = []
+    for idx, coluna in enumerate(df.columns):
+        maior = len(str(coluna))
+        if len(df):
+            serie = df.iloc[:, idx]
+            if amostrado:
+                serie = serie.iloc[posicoes]
+            maior = max(maior, _quantil_ponderado(*_comprimentos_texto(serie), quantil))
+        maiores.append(maior)
+    return maiores
+
+
+def _larguras_colunas(maiores, linhas_resumo):
+    """Largura de cada coluna: maior texto entre resumo, cabeçalho e dados (`maiores`) + 2, até 50"""
+    larguras = []
+    for idx in range(max(len(maiores), max(len(linha) for linha in linhas_resumo))):
+        maior = len('None')
+        for linha in linhas_resumo:
+            if idx < len(linha):
+                maior = max(maior, len(str(linha[idx])))
+        if idx < len(maiores):
+            maior = max(maior, maiores[idx])
+        larguras.append(min(maior + 2, LARGURA_MAXIMA))
+    return larguras
+
+
+def papeis_colunas(colunas):
+    """
+    Papel de cada coluna do resultado no relatório: 'negociado' (valor
+    negociado), 'loja' (preço/quantidade de um orçamento), 'total' (Verba
+    Total, TT.Pedido, % Investimento) ou 'base' (demais colunas do Preço Final).
+    """
+    coluna_negociado = localizar_coluna_negociado(colunas)
+    papeis = []
+    for coluna in colunas:
+        nome = str(coluna).lower()
+        if coluna == coluna_negociado:
+            papeis.append('negociado')
+        elif nome.startswith('preço venda loja') or nome.startswith('qtd venda loja'):
+            papeis.append('loja')
+        elif coluna in COLUNAS_TOTAIS:
+            papeis.append('total')
+        else:
+            papeis.append('base')
+    return papeis
+
+
+def _formato_coluna(coluna, papel):
+    """Formato numérico da coluna: moeda, percentual ou None"""
+    if papel == 'negociado' or coluna in ('Verba Total', 'TT.Pedido') or str(coluna).startswith('Preço venda loja'):
+        return FORMATO_MOEDA
+    if coluna == '% Investimento':
+        return FORMATO_PERCENTUAL
+    return None
+
+
+def _registrar_estilos(wb):
+    """Registra no workbook os estilos nomeados compartilhados pelas células do relatório"""
+    wb.add_named_style(NamedStyle(name='Apuração cabeçalho', font=FONTE_DESTAQUE, fill=COR_CABECALHO))
+    for papel, cor in CORES_PAPEIS.items():
+        wb.add_named_style(NamedStyle(name=f'Apuração {papel}', font=DEFAULT_FONT, fill=cor))
+
+
+def _titulo_resumo(nome_rede, data_relatorio):
+    data_atual = (data_relatorio or datetime.now()).strftime('%d/%m/%Y')
+    return f"RESUMO - {nome_rede} - {data_atual}" if nome_rede else f"RESUMO - {data_atual}"
+
+
+def _iniciar_planilha(cabecalhos, maiores, total_verba, total_pedido, nome_rede, data_relatorio):
+    """
+    Cria o workbook write-only com larguras, resumo (linhas 1-3) e cabeçalho
+    dos dados (linha 5). Retorna (wb, ws, modelos): um modelo de célula por
+    coluna para as linhas de dados (None = valor sem estilo).
+    """
+    percentual_investimento = (total_verba / total_pedido * 100) if total_pedido > 0 else 0
+    titulo = _titulo_resumo(nome_rede, data_relatorio)
+    
+    wb = openpyxl.Workbook(write_only=True)
+    _registrar_estilos(wb)
+    ws = wb.create_sheet('Apuração')
+    
+    rotulos_resumo = ['Verba Total', 'TT.Pedido', '% Investimento']
+    totais_resumo = [total_verba, total_pedido, percentual_investimento]
+    
+    # Larguras precisam ser definidas antes da primeira linha (modo write-only)
+    larguras = _larguras_colunas(maiores, [[titulo], rotulos_resumo, totais_resumo])
+    for idx, largura in enumerate(larguras, 1):
+        ws.column_dimensions[get_column_letter(idx)].width = largura
+    
+    # Linha 1: Título
+    ws.append([_celula(ws, titulo, fonte=FONTE_TITULO)])
+    
+    # Linha 2: Cabeçalhos do resumo (fundo preto, fonte branca)
+    ws.append([_celula(ws, rotulo, fonte=FONTE_DESTAQUE, preenchimento=COR_RESUMO_PRETO) for rotulo in rotulos_resumo])
+    
+    # Linha 3: Valores do resumo
+    ws.append([
+        _celula(ws, total_verba, preenchimento=COR_RESUMO_AMARELO, formato=FORMATO_MOEDA),
+        _celula(ws, total_pedido, preenchimento=COR_RESUMO_VERDE, formato=FORMATO_MOEDA),
+        _celula(ws, percentual_investimento, preenchimento=COR_RESUMO_AMARELO, formato=FORMATO_PERCENTUAL),
+    ])
+    
+    # Linha 4: Vazia (separador)
+    ws.append([])
+    
+    # Plano de estilos a partir das colunas: papel define cor, nome define formato
+    papeis = papeis_colunas(cabecalhos)
+    formatos = [_formato_coluna(coluna, papel) for coluna, papel in zip(cabecalhos, papeis)]
+    
+    # Linha 5: Cabeçalho dos dados (azul escuro nas colunas do Preço Final)
+    ws.append([
+        _celula(ws, coluna, estilo='Apuração cabeçalho') if papel in ('base', 'negociado') else coluna
+        for coluna, papel in zip(cabecalhos, papeis)
+    ])
+    
+    # Um modelo de célula por coluna, reaproveitado a cada linha (a linha é gravada no append)
+    modelos = [
+        _celula(ws, estilo=f'Apuração {papel}' if papel in CORES_PAPEIS else None, formato=formato)
+        if (papel in CORES_PAPEIS or formato) else None
+        for papel, formato in zip(papeis, formatos)
+    ]
+    return wb, ws, modelos
+
+
+def _escrever_linhas(ws, modelos, df):
+    """
+    Linhas de dados: cores e formatos só nas linhas e colunas do resultado.
+    Os valores viram listas Python em fatias de LINHAS_POR_FATIA linhas,
+    para não duplicar o DataFrame inteiro em objetos Python.
+    """
+    for inicio in range(0, len(df), LINHAS_POR_FATIA):
+        fatia = df.iloc[inicio:inicio + LINHAS_POR_FATIA]
+        valores_colunas = [_valores_coluna(fatia.iloc[:, idx]) for idx in range(fatia.shape[1])]
+        for valores in zip(*valores_colunas):
+            linha = []
+            for valor, modelo in zip(valores, modelos):
+                if modelo is None:
+                    linha.append(valor)
+                else:
+                    modelo.value = valor
+                    linha.append(modelo)
+            ws.append(linha)
+
+
+def _escrever_aba_fora_preco(wb, itens):
+    """
+    Aba com os itens de orçamento cujo EAN não está no Preço Final (colunas
+    COLUNAS_FORA_PRECO) e, na última linha, o Valor Pedido que ficou fora do TT.Pedido.
+    """
+    ws = wb.create_sheet(ABA_FORA_PRECO)
+    colunas = list(itens.columns)
+    linha_total = [None] * len(colunas)
+    linha_total[0] = 'Total fora do TT.Pedido'
+    linha_total[colunas.index('Valor Pedido')] = somar_reais(itens['Valor Pedido'])
+    
+    larguras = _larguras_colunas(maiores_textos_colunas(itens), [[valor or '' for valor in linha_total]])
+    for idx, largura in enumerate(larguras, 1):
+        ws.column_dimensions[get_column_letter(idx)].width = largura
+    
+    ws.append([_celula(ws, coluna, estilo='Apuração cabeçalho') for coluna in colunas])
+    modelos = [
+        _celula(ws, formato=FORMATO_MOEDA) if coluna in ('VALOR SKU PAGO', 'Valor Pedido') else None
+        for coluna in colunas
+    ]
+    _escrever_linhas(ws, modelos, itens)
+    ws.append([
+        None if valor is None else _celula(
+            ws, valor, fonte=FONTE_TITULO, formato=FORMATO_MOEDA if isinstance(valor, float) else None
+        )
+        for valor in linha_total
+    ])
+
+
+def converter_df_para_excel(df, nome_rede="", data_relatorio=None, instrumentacao=INSTRUMENTACAO_DESATIVADA,
+                            itens_fora_preco=None):
+    """
+    Converte DataFrame para Excel em memória com formatação e resumo.
+    instrumentacao: Instrumentacao opcional que mede preparo, escrita das linhas e gravação.
+    itens_fora_preco: itens de orçamento fora do Preço Final (ResultadoApuracao.itens_fora_preco);
+    se houver, vão para a aba 'Fora do Preço Final'.
+    """
+    output = io.BytesIO()
+    
+    with instrumentacao.etapa('preparo_planilha', linhas=len(df), colunas=df.shape[1]):
+        # Colunas compactadas (float32, category) voltam aos tipos originais
+        df = restaurar_tipos_exportacao(df)
+        
+        # Totais do resumo, somados em centavos
+        wb, ws, modelos = _iniciar_planilha(
+            list(df.columns),
+            maiores_textos_colunas(df),
+            somar_reais(df['Verba Total']),
+            somar_reais(df['TT.Pedido']),
+            nome_rede,
+            data_relatorio
+        )
+    
+    with instrumentacao.etapa('escrita_linhas', linhas=len(df), celulas=df.size):
+        _escrever_linhas(ws, modelos, df)
+    
+    if itens_fora_preco is not None and len(itens_fora_preco):
+        with instrumentacao.etapa('aba_fora_preco', linhas=len(itens_fora_preco)):
+            _escrever_aba_fora_preco(wb, itens_fora_preco)
+    
+    with instrumentacao.etapa('gravacao_arquivo') as etapa:
+        wb.save(output)
+        output.seek(0)
+        dados = output.getvalue()
+        etapa.contar('bytes', len(dados))
+    return dados
+
+
+def escrever_relatorio_em_blocos(destino, blocos, cabecalhos, maiores, total_verba, total_pedido,
+                                 nome_rede="", data_relatorio=None, instrumentacao=INSTRUMENTACAO_DESATIVADA,
+                                 itens_fora_preco=None):
+    """
+    Grava o relatório em `destino` (caminho ou arquivo binário) a partir de
+    blocos de linhas do resultado (iterável de DataFrames com as colunas
+    `cabecalhos`), sem juntar os blocos: cada bloco é escrito e descartado.
+    Totais do resumo e `maiores` (maior texto por coluna, para as larguras)
+    precisam ser conhecidos antes, pois o resumo vem antes dos dados.
+    """
+    wb, ws, modelos = _iniciar_planilha(cabecalhos, maiores, total_verba, total_pedido, nome_rede, data_relatorio)
+    
+    with instrumentacao.etapa('escrita_linhas') as etapa:
+        for bloco in blocos:
+            _escrever_linhas(ws, modelos, bloco)
+            etapa.contar('linhas', len(bloco))
+            etapa.contar('blocos')
+    
+    if itens_fora_preco is not None and len(itens_fora_preco):
+        with instrumentacao.etapa('aba_fora_preco', linhas=len(itens_fora_preco)):
+            _escrever_aba_fora_preco(wb, itens_fora_preco)
+    
+    with instrumentacao.etapa('gravacao_arquivo'):
+        wb.save(destino)
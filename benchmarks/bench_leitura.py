@@ -0,0 +1,69 @@
+"""
+Benchmark de leitura de orçamentos Reppos.
+
+Gera uma planilha sintética no layout Reppos (benchmarks/geradores.py:
+cabeçalho na linha 10, colunas extras além das usadas) e compara tempo e pico de memória entre:
+- leitura completa com o motor padrão (como era antes)
+- leitura seletiva (usecols + EAN como texto) com o motor padrão
+- leitura seletiva com calamine (se python-calamine estiver instalado)
+
+Uso:
+    python benchmarks/bench_leitura.py [--linhas 50000] [--repeticoes 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from apurador_leitura import ler_orcamento, motor_excel  # noqa: E402
+from geradores import gerar_orcamento  # noqa: E402
+
+
+def medir(funcao, repeticoes):
+    """Retorna (melhor tempo em s, pico de memória em MB) da função"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(tempos), pico / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=50000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    conteudo = gerar_orcamento(args.linhas, args.linhas)
+    print(f"Orçamento sintético: {args.linhas} linhas, {len(conteudo) / 1024:.0f} KB")
+
+    cenarios = [
+        ('completa (padrão)', lambda: pd.read_excel(BytesIO(conteudo), header=9)),
+        ('seletiva (padrão)', lambda: ler_orcamento(conteudo, motor='openpyxl')),
+    ]
+    if motor_excel() == 'calamine':
+        cenarios.append(('seletiva (calamine)', lambda: ler_orcamento(conteudo, motor='calamine')))
+    else:
+        print("python-calamine não instalado - cenário calamine ignorado")
+
+    print(f"{'leitura':<22} {'tempo (s)':>10} {'pico (MB)':>10}")
+    for nome, funcao in cenarios:
+        tempo, pico = medir(funcao, args.repeticoes)
+        print(f"{nome:<22} {tempo:>10.3f} {pico:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Benchmark de escala do processar_dados em função do número de orçamentos.
+
+Gera um Preço Final sintético e N orçamentos (lojas) com
+benchmarks/geradores.py e mede o tempo de processamento. Com o empilhamento
+em frame longo o tempo por loja deve se manter praticamente constante (escala
+quase linear).
+
+Uso:
+    python benchmarks/bench_processamento.py [--produtos 3000] [--lojas 25 50 100 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from apurador_core import processar_dados  # noqa: E402
+from geradores import tabelas_apuracao  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--produtos', type=int, default=3000)
+    parser.add_argument('--lojas', type=int, nargs='+', default=[25, 50, 100, 200])
+    args = parser.parse_args()
+
+    print(f"{'lojas':>6} {'tempo (s)':>10} {'ms/loja':>9}")
+    for n_lojas in args.lojas:
+        df_preco, orcamentos = tabelas_apuracao(args.produtos, n_lojas)
+        inicio = time.perf_counter()
+        processar_dados(df_preco, orcamentos)
+        decorrido = time.perf_counter() - inicio
+        print(f"{n_lojas:>6} {decorrido:>10.3f} {decorrido / n_lojas * 1000:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
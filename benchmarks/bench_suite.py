@@ -0,0 +1,229 @@
+"""
+Suíte de benchmarks da apuração, para acompanhar regressões entre commits.
+
+Para cada tamanho da grade (produtos x lojas) gera um Preço Final e os
+orçamentos Reppos sintéticos (benchmarks/geradores.py) e mede em separado:
+- leitura: ler_preco_final + ler_orcamento de todas as planilhas
+- limpeza: limpar_valor_monetario célula a célula nos valores dos orçamentos
+- limpeza_vetorizada: limpar_valores_monetarios na mesma coluna
+- calculo: processar_dados
+- exportacao: converter_df_para_excel
+
+De cada etapa registra o melhor tempo e a mediana das repetições e o pico de
+memória alocada (tracemalloc, em uma execução à parte). O resultado sai em
+JSON, com commit e versões, para comparar com uma execução anterior.
+
+Uso:
+    python benchmarks/bench_suite.py [--tamanhos 1000x5 3000x25 10000x50] [--repeticoes 3]
+                                     [--saida resultado.json] [--comparar anterior.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from apurador_core import (  # noqa: E402
+    limpar_valor_monetario, limpar_valores_monetarios, processar_dados, validar_colunas_preco_final
+)
+from apurador_leitura import ler_orcamento, ler_preco_final, motor_excel  # noqa: E402
+from apurador_relatorio import converter_df_para_excel  # noqa: E402
+from geradores import gerar_apuracao  # noqa: E402
+
+
+TAMANHOS_PADRAO = ['1000x5', '3000x25', '10000x50']
+
+ETAPAS = ['leitura', 'limpeza', 'limpeza_vetorizada', 'calculo', 'exportacao']
+
+# Variação (fração e segundos) a partir da qual a comparação destaca a etapa;
+# o mínimo em segundos evita destacar ruído de etapas de poucos milissegundos
+TOLERANCIA_COMPARACAO = 0.10
+DIFERENCA_MINIMA_S = 0.005
+
+
+def medir(funcao, repeticoes):
+    """Executa a função `repeticoes` vezes e uma vez com tracemalloc; retorna (métricas, último retorno)"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        retorno = funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    metricas = {
+        'tempo_s': round(min(tempos), 4),
+        'mediana_s': round(statistics.median(tempos), 4),
+        'pico_mb': round(pico / (1024 * 1024), 2),
+    }
+    return metricas, retorno
+
+
+def _ler_tudo(preco, orcamentos):
+    df_preco = ler_preco_final(preco)
+    validar_colunas_preco_final(df_preco)
+    return df_preco, {nome: ler_orcamento(conteudo) for nome, conteudo in orcamentos.items()}
+
+
+def rodar_tamanho(n_produtos, n_lojas, repeticoes, coluna_ean='EAN'):
+    """Mede todas as etapas para um tamanho da grade"""
+    inicio = time.perf_counter()
+    preco, orcamentos = gerar_apuracao(n_produtos, n_lojas, coluna_ean=coluna_ean)
+    tempo_geracao = time.perf_counter() - inicio
+
+    etapas = {}
+    etapas['leitura'], (df_preco, dfs_orcamento) = medir(lambda: _ler_tudo(preco, orcamentos), repeticoes)
+
+    valores = pd.concat([df['VALOR SKU PAGO'] for df in dfs_orcamento.values()], ignore_index=True)
+    etapas['limpeza'], _ = medir(lambda: valores.map(limpar_valor_monetario), repeticoes)
+    etapas['limpeza_vetorizada'], _ = medir(lambda: limpar_valores_monetarios(valores), repeticoes)
+
+    # Preço Final e orçamentos lidos podem ser alterados no cálculo: cada execução recebe cópias
+    etapas['calculo'], resultado = medir(
+        lambda: processar_dados(df_preco.copy(), {nome: df.copy() for nome, df in dfs_orcamento.items()}),
+        repeticoes
+    )
+    if not resultado.sucesso:
+        raise RuntimeError(f"apuração sintética {n_produtos}x{n_lojas} não concluída")
+
+    df_resultado = resultado.df_resultado
+    etapas['exportacao'], relatorio = medir(
+        lambda: converter_df_para_excel(df_resultado, 'REDE BENCHMARK', datetime(2026, 1, 1)),
+        repeticoes
+    )
+
+    return {
+        'tamanho': f'{n_produtos}x{n_lojas}',
+        'produtos': n_produtos,
+        'lojas': n_lojas,
+        'coluna_ean': coluna_ean,
+        'linhas_orcamentos': int(len(valores)),
+        'linhas_resultado': int(len(df_resultado)),
+        'colunas_resultado': int(df_resultado.shape[1]),
+        'bytes_entrada': len(preco) + sum(len(c) for c in orcamentos.values()),
+        'bytes_relatorio': len(relatorio),
+        'geracao_s': round(tempo_geracao, 3),
+        'etapas': etapas,
+    }
+
+
+def _commit_atual():
+    """Hash curto do commit do repositório (ou None fora de um repositório git)"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _pico_rss_mb():
+    """Pico de memória residente do processo (MB), quando disponível"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def comparar(atual, anterior):
+    """Imprime a razão atual/anterior de tempo e pico de memória por tamanho e etapa"""
+    anteriores = {r['tamanho']: r for r in anterior['resultados']}
+    print(f"\nComparação com {anterior['meta'].get('commit') or 'execução anterior'}")
+    print(f"{'tamanho':<10} {'etapa':<20} {'tempo':>8} {'memória':>8}")
+    for resultado in atual['resultados']:
+        base = anteriores.get(resultado['tamanho'])
+        if base is None:
+            continue
+        for etapa, metricas in resultado['etapas'].items():
+            if etapa not in base['etapas']:
+                continue
+            tempo_base = base['etapas'][etapa]['tempo_s']
+            razao_tempo = metricas['tempo_s'] / max(tempo_base, 1e-9)
+            razao_memoria = metricas['pico_mb'] / max(base['etapas'][etapa]['pico_mb'], 1e-9)
+            marca = ''
+            if abs(metricas['tempo_s'] - tempo_base) >= DIFERENCA_MINIMA_S:
+                if razao_tempo > 1 + TOLERANCIA_COMPARACAO:
+                    marca = ' ⚠️'
+                elif razao_tempo < 1 - TOLERANCIA_COMPARACAO:
+                    marca = ' ✅'
+            print(f"{resultado['tamanho']:<10} {etapa:<20} {razao_tempo:>7.2f}x {razao_memoria:>7.2f}x{marca}")
+
+
+def _tamanho(texto):
+    """'3000x25' -> (3000, 25)"""
+    try:
+        produtos, lojas = (int(parte) for parte in texto.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"tamanho inválido '{texto}' (use PRODUTOSxLOJAS, ex.: 3000x25)")
+    return produtos, lojas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tamanhos', type=_tamanho, nargs='+', default=[_tamanho(t) for t in TAMANHOS_PADRAO],
+                        help="grade de tamanhos PRODUTOSxLOJAS")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--saida', help="arquivo JSON de saída; padrão: só imprime")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args(argv)
+
+    meta = {
+        'commit': _commit_atual(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'motor_excel': motor_excel() or 'openpyxl',
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'repeticoes': args.repeticoes,
+    }
+
+    resultados = []
+    print(f"{'tamanho':<10} " + ' '.join(f"{etapa:>18}" for etapa in ETAPAS))
+    for indice, (n_produtos, n_lojas) in enumerate(args.tamanhos):
+        # Alterna a coluna de identificação do Preço Final entre os tamanhos
+        coluna_ean = 'COD BARRAS' if indice % 2 else 'EAN'
+        resultado = rodar_tamanho(n_produtos, n_lojas, args.repeticoes, coluna_ean)
+        resultados.append(resultado)
+        print(f"{resultado['tamanho']:<10} " + ' '.join(
+            f"{resultado['etapas'][etapa]['tempo_s']:>8.3f}s {resultado['etapas'][etapa]['pico_mb']:>6.1f}MB"
+            for etapa in ETAPAS
+        ))
+
+    saida = {'meta': {**meta, 'pico_rss_mb': _pico_rss_mb()}, 'resultados': resultados}
+    texto = json.dumps(saida, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto + '\n')
+        print(f"\n📄 Resultado: {args.saida}")
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as arquivo:
+            comparar(saida, json.load(arquivo))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
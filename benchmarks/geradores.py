@@ -0,0 +1,169 @@
+"""
+Geradores de planilhas sintéticas para os benchmarks.
+
+- Preço Final: coluna de identificação 'EAN' ou 'COD BARRAS', descrição e
+  valor negociado em texto no formato brasileiro ou americano (com e sem
+  R$ e separador de milhar) misturado com células numéricas.
+- Orçamentos Reppos: 9 linhas de capa, cabeçalho na linha 10 e colunas
+  extras além das usadas; parte dos EANs fora do Preço Final e alguns EANs
+  repetidos, como nos arquivos reais.
+
+As mesmas tabelas saem como DataFrames (tabela_preco_final,
+tabela_orcamento, tabelas_apuracao) para medir o processamento sem a leitura.
+Tudo é determinístico a partir da semente.
+"""
+
+from io import BytesIO
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+
+EAN_INICIAL = 7890000000000
+
+COLUNAS_EXTRAS_ORCAMENTO = [
+    'CODIGO', 'PRODUTO', 'MARCA', 'CATEGORIA', 'EMBALAGEM', 'UNIDADE',
+    'VALOR SKU', 'DESCONTO', 'VALOR TOTAL', 'OBSERVACAO'
+]
+
+# Fração dos itens de orçamento com EAN fora do Preço Final e com EAN repetido
+FRACAO_SEM_PRECO = 0.02
+FRACAO_REPETIDOS = 0.01
+
+
+def formatar_moeda(valor, formato):
+    """Valor como texto: 'br' (R$ 1.234,56), 'br_simples' (1234,56), 'us' (1,234.56), 'us_simples' (1234.56)"""
+    if formato == 'br':
+        return 'R$ ' + f"{valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+    if formato == 'br_simples':
+        return f"{valor:.2f}".replace('.', ',')
+    if formato == 'us':
+        return f"{valor:,.2f}"
+    return f"{valor:.2f}"
+
+
+FORMATOS_MOEDA = ['br', 'br_simples', 'us', 'us_simples', 'numero']
+
+
+def valores_monetarios(rng, n, minimo=1, maximo=2000):
+    """`n` valores com 2 casas, cada um em um formato sorteado (números ficam como float)"""
+    valores = rng.uniform(minimo, maximo, n).round(2)
+    formatos = rng.choice(len(FORMATOS_MOEDA), n)
+    return [
+        valor if FORMATOS_MOEDA[f] == 'numero' else formatar_moeda(valor, FORMATOS_MOEDA[f])
+        for valor, f in zip(valores.tolist(), formatos.tolist())
+    ]
+
+
+def _salvar(wb):
+    saida = BytesIO()
+    wb.save(saida)
+    return saida.getvalue()
+
+
+def eans_produtos(n_produtos):
+    """EANs (texto) do Preço Final sintético"""
+    return [str(ean) for ean in range(EAN_INICIAL, EAN_INICIAL + n_produtos)]
+
+
+def tabela_preco_final(n_produtos, coluna_ean='EAN', semente=0):
+    """DataFrame do Preço Final sintético, com os valores negociados como ficam na planilha"""
+    rng = np.random.default_rng(semente)
+    return pd.DataFrame({
+        coluna_ean: eans_produtos(n_produtos),
+        'DESCRIÇÃO': [f'PRODUTO {i}' for i in range(n_produtos)],
+        'VALOR NEGOCIADO REDE': pd.Series(valores_monetarios(rng, n_produtos, 5, 1500), dtype=object),
+    })
+
+
+def tabela_orcamento(n_produtos, n_linhas, semente=0):
+    """DataFrame de um orçamento Reppos com `n_linhas` itens (colunas usadas e extras)"""
+    rng = np.random.default_rng(semente)
+    n_linhas = min(n_linhas, n_produtos)
+    eans = rng.choice(n_produtos, n_linhas, replace=False) + EAN_INICIAL
+    sem_preco = rng.random(n_linhas) < FRACAO_SEM_PRECO
+    eans[sem_preco] += n_produtos
+    repetidos = rng.random(n_linhas) < FRACAO_REPETIDOS
+    eans[repetidos] = eans[0]
+
+    valores = valores_monetarios(rng, n_linhas, 5, 1800)
+    quantidades = rng.integers(1, 100, n_linhas)
+    return pd.DataFrame({
+        'EAN': [str(ean) for ean in eans.tolist()],
+        'VALOR SKU PAGO': pd.Series(valores, dtype=object),
+        'QUANTIDADE': quantidades,
+        'CODIGO': eans % 100000,
+        'PRODUTO': [f'PRODUTO {ean % 997}' for ean in eans.tolist()],
+        'MARCA': 'MARCA',
+        'CATEGORIA': 'CATEGORIA',
+        'EMBALAGEM': 'CX',
+        'UNIDADE': 'UN',
+        'VALOR SKU': pd.Series(valores, dtype=object),
+        'DESCONTO': 0.0,
+        'VALOR TOTAL': '',
+        'OBSERVACAO': '',
+    }, columns=['EAN', 'VALOR SKU PAGO', 'QUANTIDADE'] + COLUNAS_EXTRAS_ORCAMENTO)
+
+
+def _linhas(df):
+    """Linhas do DataFrame como listas de objetos Python, para o openpyxl"""
+    return zip(*(df[coluna].tolist() for coluna in df.columns))
+
+
+def gerar_preco_final(n_produtos, coluna_ean='EAN', semente=0):
+    """Gera os bytes de um Preço Final com `n_produtos` EANs"""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Preço Final')
+
+    df = tabela_preco_final(n_produtos, coluna_ean, semente)
+    ws.append(list(df.columns))
+    for linha in _linhas(df):
+        ws.append(list(linha))
+    return _salvar(wb)
+
+
+def gerar_orcamento(n_produtos, n_linhas, semente=0):
+    """Gera os bytes de um orçamento Reppos com `n_linhas` itens (cabeçalho na linha 10)"""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Orçamento')
+
+    for linha in range(9):
+        ws.append([f'Cabeçalho Reppos {linha + 1}'])
+    df = tabela_orcamento(n_produtos, n_linhas, semente)
+    ws.append(list(df.columns))
+    for linha in _linhas(df):
+        ws.append(list(linha))
+    return _salvar(wb)
+
+
+def _orcamentos(n_produtos, n_lojas, linhas_por_loja, semente, gerador):
+    linhas_por_loja = linhas_por_loja or max(1, n_produtos // 3)
+    return {
+        f'orcamento_{loja}': gerador(n_produtos, linhas_por_loja, semente + loja)
+        for loja in range(1, n_lojas + 1)
+    }
+
+
+def gerar_apuracao(n_produtos, n_lojas, linhas_por_loja=None, coluna_ean='EAN', semente=0):
+    """
+    Bytes de um Preço Final e de `n_lojas` orçamentos. Por padrão cada loja
+    pede um terço dos produtos. Retorna (preco_final, {nome: orcamento}).
+    """
+    preco = gerar_preco_final(n_produtos, coluna_ean, semente)
+    return preco, _orcamentos(n_produtos, n_lojas, linhas_por_loja, semente, gerar_orcamento)
+
+
+def tabelas_apuracao(n_produtos, n_lojas, linhas_por_loja=None, coluna_ean='EAN', semente=0):
+    """
+    Os mesmos dados de gerar_apuracao já como DataFrames, no formato que a
+    leitura entrega (orçamentos só com EAN, VALOR SKU PAGO e QUANTIDADE), para
+    medir o processamento sem a leitura das planilhas.
+    Retorna (df_preco, {nome: df_orcamento}).
+    """
+    df_preco = tabela_preco_final(n_produtos, coluna_ean, semente)
+    orcamentos = _orcamentos(
+        n_produtos, n_lojas, linhas_por_loja, semente,
+        lambda *args: tabela_orcamento(*args)[['EAN', 'VALOR SKU PAGO', 'QUANTIDADE']]
+    )
+    return df_preco, orcamentos
@@ -0,0 +1,207 @@
+"""
+API HTTP (apurador_api) em processo, sem servidor: envio das planilhas ->
+202 -> consulta até 'concluida' -> Excel; fila cheia -> 503 com Retry-After;
+apurações vencidas saem da memória sem depender de novos envios.
+
+As chamadas vão direto à aplicação ASGI (o TestClient do Starlette requer
+httpx, que não é dependência do projeto).
+"""
+
+import asyncio
+import json
+import time
+from io import BytesIO
+
+import openpyxl
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('python_multipart')
+
+from apurador_api import TIPO_EXCEL, criar_app  # noqa: E402
+
+
+FRONTEIRA = 'fronteira-apurador-teste'
+
+
+def _planilha(linhas):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for linha in linhas:
+        ws.append(linha)
+    saida = BytesIO()
+    wb.save(saida)
+    return saida.getvalue()
+
+
+def _preco_final():
+    return _planilha([
+        ['EAN', 'DESCRIÇÃO', 'VALOR NEGOCIADO'],
+        ['1001', 'PRODUTO 1', 10.0],
+        ['1002', 'PRODUTO 2', 20.0],
+    ])
+
+
+def _orcamento(preco_1001):
+    return _planilha(
+        [[f'Capa {i}'] for i in range(9)]
+        + [['EAN', 'VALOR SKU PAGO', 'QUANTIDADE'], ['1001', preco_1001, 2], ['1002', 25.0, 1]]
+    )
+
+
+def _multipart(campos, arquivos):
+    """Corpo multipart/form-data: campos [(nome, valor)] e arquivos [(campo, nome_arquivo, conteudo)]"""
+    partes = []
+    for nome, valor in campos:
+        partes.append(
+            f'--{FRONTEIRA}\r\nContent-Disposition: form-data; name="{nome}"\r\n\r\n{valor}\r\n'.encode()
+        )
+    for campo, nome_arquivo, conteudo in arquivos:
+        partes.append(
+            f'--{FRONTEIRA}\r\nContent-Disposition: form-data; name="{campo}"; filename="{nome_arquivo}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode() + conteudo + b'\r\n'
+        )
+    partes.append(f'--{FRONTEIRA}--\r\n'.encode())
+    return b''.join(partes)
+
+
+def _envio():
+    return _multipart(
+        [('rede', 'REDE TESTE'), ('data', '2026-01-02')],
+        [
+            ('preco_final', 'preco_final.xlsx', _preco_final()),
+            ('orcamentos', 'loja1.xlsx', _orcamento(12.0)),
+            ('orcamentos', 'loja2.xlsx', _orcamento(11.5)),
+        ],
+    )
+
+
+async def _chamar(app, metodo, caminho, corpo=b'', tipo=None):
+    """Uma requisição HTTP direto na aplicação ASGI: (status, cabeçalhos, corpo)"""
+    headers = [(b'content-length', str(len(corpo)).encode())]
+    if tipo:
+        headers.append((b'content-type', tipo.encode()))
+    escopo = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': metodo, 'scheme': 'http', 'path': caminho, 'raw_path': caminho.encode(),
+        'query_string': b'', 'root_path': '', 'headers': headers,
+        'client': ('127.0.0.1', 50000), 'server': ('127.0.0.1', 8000), 'app': app,
+    }
+    enviado = False
+    resposta = {'headers': {}, 'corpo': b''}
+
+    async def receber():
+        nonlocal enviado
+        if enviado:
+            await asyncio.Event().wait()
+        enviado = True
+        return {'type': 'http.request', 'body': corpo, 'more_body': False}
+
+    async def responder(mensagem):
+        if mensagem['type'] == 'http.response.start':
+            resposta['status'] = mensagem['status']
+            resposta['headers'] = {k.decode().lower(): v.decode() for k, v in mensagem['headers']}
+        elif mensagem['type'] == 'http.response.body':
+            resposta['corpo'] += mensagem.get('body', b'')
+
+    await app(escopo, receber, responder)
+    return resposta['status'], resposta['headers'], resposta['corpo']
+
+
+async def _enviar(app, corpo):
+    return await _chamar(app, 'POST', '/apuracoes', corpo, f'multipart/form-data; boundary={FRONTEIRA}')
+
+
+class _Servidor:
+    """Executa o lifespan da aplicação (inicia e encerra a fila e o pool)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __aenter__(self):
+        self.entrada = asyncio.Queue()
+        self.saida = asyncio.Queue()
+        escopo = {'type': 'lifespan', 'asgi': {'version': '3.0'}, 'app': self.app}
+        self.tarefa = asyncio.create_task(self.app(escopo, self.entrada.get, self.saida.put))
+        await self.entrada.put({'type': 'lifespan.startup'})
+        assert (await self.saida.get())['type'] == 'lifespan.startup.complete'
+        return self.app
+
+    async def __aexit__(self, *erro):
+        await self.entrada.put({'type': 'lifespan.shutdown'})
+        assert (await self.saida.get())['type'] == 'lifespan.shutdown.complete'
+        await self.tarefa
+
+
+async def _aguardar(app, id_apuracao, limite_s=120):
+    inicio = time.monotonic()
+    while time.monotonic() - inicio < limite_s:
+        status, _, corpo = await _chamar(app, 'GET', f'/apuracoes/{id_apuracao}')
+        assert status == 200
+        situacao = json.loads(corpo)
+        if situacao['estado'] not in ('na_fila', 'processando'):
+            return situacao
+        await asyncio.sleep(0.1)
+    pytest.fail("apuração não terminou no tempo limite")
+
+
+def test_envio_consulta_e_excel():
+    async def cenario():
+        async with _Servidor(criar_app(processos=1, tamanho_fila=2)) as app:
+            status, headers, corpo = await _enviar(app, _envio())
+            assert status == 202
+            id_apuracao = json.loads(corpo)['id']
+            assert headers['location'] == f'/apuracoes/{id_apuracao}'
+
+            situacao = await _aguardar(app, id_apuracao)
+            assert situacao['estado'] == 'concluida', situacao
+
+            status, headers, excel = await _chamar(app, 'GET', f'/apuracoes/{id_apuracao}/excel')
+            assert status == 200
+            assert headers['content-type'] == TIPO_EXCEL
+            wb = openpyxl.load_workbook(BytesIO(excel))
+            assert len(wb.worksheets) >= 1
+
+    asyncio.run(cenario())
+
+
+def test_fila_cheia_responde_503_com_retry_after():
+    async def cenario():
+        async with _Servidor(criar_app(processos=1, tamanho_fila=1)) as app:
+            fila = app.state.fila
+            # Sem consumidores, o primeiro envio ocupa a única vaga da fila
+            for consumidor in fila.consumidores:
+                consumidor.cancel()
+            await asyncio.gather(*fila.consumidores, return_exceptions=True)
+            fila.consumidores = []
+
+            status, _, _ = await _enviar(app, _envio())
+            assert status == 202
+
+            status, headers, corpo = await _enviar(app, _envio())
+            assert status == 503
+            assert int(headers['retry-after']) > 0
+            assert 'fila cheia' in json.loads(corpo)['erro']
+
+    asyncio.run(cenario())
+
+
+def test_apuracao_vencida_sai_da_memoria():
+    async def cenario():
+        async with _Servidor(criar_app(processos=1, tamanho_fila=2, retencao_s=0)) as app:
+            fila = app.state.fila
+            status, _, corpo = await _enviar(app, _envio())
+            assert status == 202
+            id_apuracao = json.loads(corpo)['id']
+
+            inicio = time.monotonic()
+            while not fila.trabalhos[id_apuracao].finalizado:
+                assert time.monotonic() - inicio < 120, "apuração não terminou no tempo limite"
+                await asyncio.sleep(0.1)
+
+            # Vencida: a própria consulta já descarta o resultado (e o Excel)
+            status, _, _ = await _chamar(app, 'GET', f'/apuracoes/{id_apuracao}/excel')
+            assert status == 404
+            assert fila.trabalhos == {}
+
+    asyncio.run(cenario())
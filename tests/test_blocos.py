@@ -0,0 +1,96 @@
+"""
+Paridade entre o modo em blocos (apurar_em_blocos) e o caminho normal
+(processar_dados + converter_df_para_excel): o relatório tem de sair igual
+célula a célula, inclusive com EANs repetidos, preços com mais de duas casas,
+quantidades fracionárias e EANs fora do Preço Final.
+"""
+
+from datetime import datetime
+from io import BytesIO
+
+import numpy as np
+import openpyxl
+import pytest
+
+from apurador_blocos import apurar_em_blocos
+from apurador_core import processar_dados, validar_colunas_preco_final
+from apurador_leitura import ler_orcamento, ler_preco_final
+from apurador_relatorio import converter_df_para_excel
+
+
+DATA = datetime(2026, 1, 2)
+
+
+def _planilha(linhas):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for linha in linhas:
+        ws.append(linha)
+    saida = BytesIO()
+    wb.save(saida)
+    return saida.getvalue()
+
+
+def _preco_final(n_produtos, rng):
+    linhas = [['EAN', 'DESCRIÇÃO', 'VALOR NEGOCIADO']]
+    linhas += [[str(1000 + i), f'PRODUTO {i}', float(v)] for i, v in enumerate(rng.uniform(1, 900, n_produtos).round(2))]
+    # EANs repetidos no Preço Final, em blocos diferentes: vale a primeira linha
+    linhas += [['1003', 'REPETIDO', 1.0], [' 1010 ', 'REPETIDO', 2.0]]
+    return _planilha(linhas)
+
+
+def _orcamento(n_produtos, n_linhas, rng, fracionario=False):
+    eans = rng.choice(n_produtos + 20, n_linhas, replace=False) + 1000
+    eans[rng.random(n_linhas) < 0.1] = eans[0]
+    precos = rng.uniform(1, 900, n_linhas).round(2)
+    # Alguns preços com três casas e alguns em texto no formato brasileiro
+    precos[::7] = rng.uniform(1, 900, len(precos[::7])).round(3)
+    quantidades = rng.integers(1, 60, n_linhas).astype(float)
+    if fracionario:
+        # Quantidade fracionária só em um EAN fora do Preço Final
+        eans[-1] = n_produtos + 1000 + 50
+        quantidades[-1] = 2.5
+    linhas = [[f'Capa {i}'] for i in range(9)] + [['EAN', 'VALOR SKU PAGO', 'QUANTIDADE']]
+    for i, (ean, preco, quantidade) in enumerate(zip(eans.tolist(), precos.tolist(), quantidades.tolist())):
+        valor = f'{preco:.3f}'.rstrip('0').replace('.', ',') if i % 3 == 0 else preco
+        linhas.append([str(ean), valor, quantidade])
+    # Linha sem EAN (ex.: total do Reppos): fica fora da apuração e do relatório de fora do Preço Final
+    linhas.insert(15, [None, 99.0, 3])
+    return _planilha(linhas)
+
+
+def _celulas(conteudo):
+    wb = openpyxl.load_workbook(BytesIO(conteudo))
+    return {
+        ws.title: [[(celula.value, celula.number_format) for celula in linha] for linha in ws.iter_rows()]
+        for ws in wb.worksheets
+    }
+
+
+@pytest.mark.parametrize('tamanho_bloco', [13, 64, 20_000])
+def test_relatorio_igual_ao_normal(tamanho_bloco):
+    rng = np.random.default_rng(7)
+    n_produtos = 150
+    preco = _preco_final(n_produtos, rng)
+    orcamentos = {
+        'orc1.xlsx': ler_orcamento(_orcamento(n_produtos, 60, rng)),
+        'orc2.xlsx': ler_orcamento(_orcamento(n_produtos, 90, rng, fracionario=True)),
+        'orc3.xlsx': ler_orcamento(_orcamento(n_produtos, 40, rng)),
+    }
+
+    df_preco = ler_preco_final(preco)
+    validar_colunas_preco_final(df_preco)
+    normal = processar_dados(df_preco, {nome: df.copy() for nome, df in orcamentos.items()})
+    assert normal.sucesso
+
+    saida = BytesIO()
+    blocos = apurar_em_blocos(preco, orcamentos, saida, 'REDE', DATA, tamanho_bloco=tamanho_bloco)
+    assert blocos.sucesso
+
+    esperado = converter_df_para_excel(normal.df_resultado, 'REDE', DATA, itens_fora_preco=normal.itens_fora_preco)
+    assert _celulas(saida.getvalue()) == _celulas(esperado)
+    assert blocos.estatisticas == normal.estatisticas
+    assert blocos.itens_fora_preco['EAN'].notna().all()
+    assert blocos.eans_fora_preco.sort_values('EAN').reset_index(drop=True).equals(
+        normal.eans_fora_preco.sort_values('EAN').reset_index(drop=True)
+    )
@@ -0,0 +1,55 @@
+"""
+Apuração em lote (apurador_cli): uma rede cuja apuração não é concluída
+leva o motivo (os erros dos diagnósticos) ao resumo.csv e ao código de saída,
+sem interromper as demais redes.
+"""
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from apurador_cli import apurar_rede, main
+
+
+def _planilha(caminho, linhas):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for linha in linhas:
+        ws.append(linha)
+    wb.save(caminho)
+
+
+def _rede(pasta, negociado_1001):
+    pasta.mkdir(parents=True)
+    _planilha(pasta / 'preco_final.xlsx', [
+        ['EAN', 'DESCRIÇÃO', 'VALOR NEGOCIADO'], ['1001', 'PRODUTO 1', negociado_1001], ['1002', 'PRODUTO 2', 20.0],
+    ])
+    _planilha(
+        pasta / 'loja 01.xlsx',
+        [[f'Capa {i}'] for i in range(9)]
+        + [['EAN', 'VALOR SKU PAGO', 'QUANTIDADE'], ['1001', 12.0, 2], ['1002', 25.0, 1]],
+    )
+
+
+@pytest.mark.parametrize('tamanho_bloco', [None, 10], ids=['normal', 'blocos'])
+def test_motivo_da_falha_no_resumo(tmp_path, tamanho_bloco):
+    _rede(tmp_path / 'entrada' / 'SEM PRECO', 0)
+    resumo = apurar_rede(
+        str(tmp_path / 'entrada' / 'SEM PRECO'), str(tmp_path), pd.Timestamp('2026-01-02'),
+        tamanho_bloco=tamanho_bloco
+    )
+    assert 'sem preço negociado' in resumo['erro']
+    assert '**' not in resumo['erro']
+
+
+def test_resumo_csv_e_codigo_de_saida(tmp_path, capsys):
+    _rede(tmp_path / 'entrada' / 'OK', 10.0)
+    _rede(tmp_path / 'entrada' / 'SEM PRECO', 0)
+    codigo = main([str(tmp_path / 'entrada'), str(tmp_path / 'saida'), '--data', '2026-01-02', '--processos', '1'])
+
+    assert codigo == 1
+    resumo = pd.read_csv(tmp_path / 'saida' / 'resumo.csv', sep=';', dtype=str, keep_default_na=False)
+    erros = dict(zip(resumo['Rede'], resumo['Erro']))
+    assert erros['OK'] == ''
+    assert 'sem preço negociado' in erros['SEM PRECO']
+    assert 'sem preço negociado' in capsys.readouterr().out
@@ -0,0 +1,46 @@
+"""
+consolidar_eans_duplicados: média ponderada só nos grupos repetidos; EANs
+únicos saem com o preço original, na ordem do orçamento.
+"""
+
+import numpy as np
+import pandas as pd
+
+from apurador_core import consolidar_eans_duplicados
+
+
+def _longo(linhas):
+    return pd.DataFrame(linhas, columns=['EAN', 'VALOR SKU PAGO', 'QUANTIDADE']).assign(loja=1)
+
+
+def test_sem_repetidos_devolve_o_proprio_frame():
+    df = _longo([['1', 1.1, 3], ['2', 2.2, 7]])
+    consolidado, relatorio = consolidar_eans_duplicados(df)
+    assert consolidado is df
+    assert relatorio == {}
+
+
+def test_unicos_mantem_preco_original():
+    # 0.03 * 11 / 11 = 0.029999999999999995: não pode aparecer nos EANs únicos
+    df = _longo([['1', 0.03, 11], ['2', 1.0, 10], ['2', 1.01, 20], ['3', 0.07, 3]])
+    consolidado, relatorio = consolidar_eans_duplicados(df)
+    assert consolidado['EAN'].tolist() == ['1', '2', '3']
+    assert consolidado['VALOR SKU PAGO'].iloc[0] == 0.03
+    assert consolidado['VALOR SKU PAGO'].iloc[2] == 0.07
+    assert relatorio == {1: (1, 1)}
+
+
+def test_media_ponderada_e_quantidade_somada():
+    df = _longo([['2', 1.0, 10], ['9', 5.0, 1], ['2', 1.01, 20], ['2', None, 4]])
+    consolidado, _ = consolidar_eans_duplicados(df)
+    linha = consolidado.set_index('EAN').loc['2']
+    assert np.isclose(linha['VALOR SKU PAGO'], (10 * 1.0 + 20 * 1.01) / 30)
+    assert linha['QUANTIDADE'] == 34
+    assert consolidado['EAN'].tolist() == ['2', '9']
+
+
+def test_sem_quantidade_usa_media_simples_e_quantidade_vazia():
+    df = _longo([['4', 2.0, np.nan], ['4', 3.0, np.nan]])
+    consolidado, _ = consolidar_eans_duplicados(df)
+    assert consolidado['VALOR SKU PAGO'].iloc[0] == 2.5
+    assert np.isnan(consolidado['QUANTIDADE'].iloc[0])
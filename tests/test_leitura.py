@@ -0,0 +1,38 @@
+"""
+ler_orcamento: EAN sempre como texto, mesmo com espaços no cabeçalho.
+"""
+
+from io import BytesIO
+
+import openpyxl
+import pytest
+
+from apurador_leitura import ler_orcamento
+
+
+def _orcamento(cabecalho, linha_cabecalho=9):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for i in range(linha_cabecalho):
+        ws.append([f'Capa {i}'])
+    ws.append(cabecalho)
+    ws.append([7890000000001, '12,50', 3])
+    ws.append(['7890000000002', 4.5, 1])
+    saida = BytesIO()
+    wb.save(saida)
+    return saida.getvalue()
+
+
+@pytest.mark.parametrize('coluna_ean', ['EAN', 'EAN ', ' EAN'])
+@pytest.mark.parametrize('header', ['auto', 9])
+def test_ean_como_texto(coluna_ean, header):
+    df = ler_orcamento(_orcamento([coluna_ean, 'VALOR SKU PAGO ', 'QUANTIDADE']), header=header)
+    assert list(df.columns) == ['EAN', 'VALOR SKU PAGO', 'QUANTIDADE']
+    assert df['EAN'].tolist() == ['7890000000001', '7890000000002']
+    assert df.attrs['linha_cabecalho'] == 10
+
+
+def test_cabecalho_fora_da_linha_padrao():
+    df = ler_orcamento(_orcamento(['EAN ', 'VALOR SKU PAGO', 'QUANTIDADE'], linha_cabecalho=3))
+    assert df.attrs['linha_cabecalho'] == 4
+    assert df['EAN'].tolist() == ['7890000000001', '7890000000002']
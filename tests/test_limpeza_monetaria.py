@@ -0,0 +1,85 @@
+"""
+Paridade entre limpar_valores_monetarios (vetorizada) e limpar_valor_monetario
+(célula a célula): mesmo valor para cada célula, NaN onde a versão por
+célula devolve None.
+"""
+
+import math
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from apurador_core import limpar_valor_monetario, limpar_valores_monetarios
+
+
+BRASILEIROS = ['R$ 1.234,56', '1234,56', '20,68', '1.234.567,89', 'R$1,00', 'r$ 3,5', ' 12,34 ', '-1.234,56', '0,99']
+AMERICANOS = ['1,234.56', '1234.56', '20.68', '1,234,567.89', '$ 12.50', '-1,234.56', '.5', '100']
+INVALIDOS = ['', 'abc', 'R$', '1,2,3,4x', 'N/A', '--', '12 34', 'R$ abc']
+NUMEROS = [0, 1, -5, 1234.56, 7.0, np.int64(3), np.float64(2.5), Decimal('10.25')]
+NULOS = [None, float('nan'), np.nan, pd.NA]
+BOOLEANOS = [True, False, np.bool_(True)]
+# Aceitos por float() mas não por pd.to_numeric: sublinhado entre dígitos e dígitos não ASCII
+SO_FLOAT = ['1_000', 'R$ 1_000', '1_000,50', '١٢٣', 'R$ ١٬٢٣٤', '１２３', '１２３,４５']
+
+
+def _esperado(valores):
+    return [limpar_valor_monetario(valor) for valor in valores]
+
+
+def _conferir(serie):
+    obtido = limpar_valores_monetarios(serie)
+    assert obtido.dtype == np.float64
+    assert obtido.index.equals(serie.index)
+    for celula, valor, esperado in zip(serie.tolist(), obtido.tolist(), _esperado(serie.tolist())):
+        if esperado is None:
+            assert math.isnan(valor), f"{celula!r}: esperado vazio, obtido {valor!r}"
+        else:
+            assert valor == esperado, f"{celula!r}: esperado {esperado!r}, obtido {valor!r}"
+
+
+@pytest.mark.parametrize('valor', BRASILEIROS + AMERICANOS + INVALIDOS + NUMEROS + NULOS + BOOLEANOS + SO_FLOAT)
+def test_celula_isolada(valor):
+    _conferir(pd.Series([valor], dtype=object))
+
+
+@pytest.mark.parametrize('valores', [
+    BRASILEIROS,
+    AMERICANOS,
+    INVALIDOS,
+    BRASILEIROS + AMERICANOS + INVALIDOS,
+    NUMEROS + BRASILEIROS,
+    NULOS + AMERICANOS,
+    BRASILEIROS + NUMEROS + NULOS + BOOLEANOS + INVALIDOS,
+    ['R$ 1,00', True],
+    [1.5, False, '2,50'],
+    BOOLEANOS,
+    SO_FLOAT,
+    SO_FLOAT + INVALIDOS + BRASILEIROS,
+], ids=['br', 'us', 'invalidos', 'texto_misto', 'numeros_e_texto', 'nulos', 'tudo', 'texto_e_bool',
+        'numero_bool_texto', 'so_booleanos', 'so_float', 'so_float_e_invalidos'])
+def test_coluna_mista(valores):
+    _conferir(pd.Series(valores, dtype=object))
+
+
+@pytest.mark.parametrize('serie', [
+    pd.Series([1, 2, 3]),
+    pd.Series([1.5, np.nan, 3.25]),
+    pd.Series([True, False]),
+    pd.Series(['1,50', None, '2.75'], dtype='string'),
+    pd.Series([], dtype=object),
+], ids=['int', 'float', 'bool', 'string', 'vazia'])
+def test_tipos_de_coluna(serie):
+    _conferir(serie)
+
+
+def test_indice_preservado():
+    serie = pd.Series(['R$ 1,00', 2, None, 'x'], index=[10, 5, 7, 3], dtype=object)
+    _conferir(serie)
+    assert limpar_valores_monetarios(serie).loc[10] == 1.0
+
+
+def test_exemplos_da_documentacao():
+    obtido = limpar_valores_monetarios(pd.Series(['R$ 1.234,56', '1234,56', '1234.56', '20,68', '20.68']))
+    assert obtido.tolist() == [1234.56, 1234.56, 1234.56, 20.68, 20.68]
@@ -0,0 +1,40 @@
+"""
+Verba Total e TT.Pedido: preços não são arredondados ao centavo antes da
+multiplicação e EANs repetidos somam linha a linha.
+"""
+
+import pandas as pd
+import pytest
+
+from apurador_core import processar_dados, somar_reais
+
+
+def _apurar(linhas_orcamento, negociado):
+    df_preco = pd.DataFrame({'EAN': ['1'], 'DESCRIÇÃO': ['Produto'], 'VALOR NEGOCIADO': [negociado]})
+    df_orc = pd.DataFrame(linhas_orcamento, columns=['EAN', 'VALOR SKU PAGO', 'QUANTIDADE'])
+    resultado = processar_dados(df_preco, {'orc': df_orc})
+    assert resultado.sucesso
+    linha = resultado.df_resultado.iloc[0]
+    return linha['TT.Pedido'], linha['Verba Total']
+
+
+def test_preco_com_mais_de_duas_casas_nao_e_arredondado():
+    assert _apurar([['1', '1,234', 1000]], 1.0) == (1234.0, 234.0)
+
+
+def test_repetidos_somam_as_linhas_originais():
+    pedido, verba = _apurar([['1', 1.0, 10], ['1', 1.01, 20]], 1.0)
+    assert (pedido, verba) == (30.2, 0.2)
+
+
+def test_centavos_inteiros_somam_sem_erro():
+    # 0,10 x 3 em ponto flutuante comum seria 0.30000000000000004
+    pedido, verba = _apurar([['1', '0,10', 3], ['1', '0,20', 1]], 0.05)
+    assert (pedido, verba) == (0.5, 0.3)
+
+
+@pytest.mark.parametrize('quantidade', [0.5, 2.25])
+def test_quantidade_fracionaria(quantidade):
+    pedido, verba = _apurar([['1', '10,00', quantidade]], 4.0)
+    assert somar_reais([pedido]) == 10.0 * quantidade
+    assert somar_reais([verba]) == 6.0 * quantidade